@@ -0,0 +1,53 @@
+"""
+Alembic environment for upgrading savegames
+
+The savegame schema is created dynamically by :func:`magnate.savegame.db.init_schema` so migrations
+are written by hand with ``op`` rather than autogenerated.
+"""
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+
+config = context.config
+
+
+def _savegame_url():
+    """Return the url of the savegame given on the alembic command line"""
+    return context.get_x_argument(as_dictionary=True)['url']
+
+
+def run_migrations_offline():
+    """Emit the SQL for the migrations without connecting to a savegame"""
+    context.configure(url=_savegame_url(), literal_binds=True,
+                      render_as_batch=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run the migrations against a savegame"""
+    # When the game upgrades a savegame, it hands us the connection to use
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        _run_migrations(connection)
+        return
+
+    connectable = create_engine(_savegame_url(), poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        _run_migrations(connection)
+
+
+def _run_migrations(connection):
+    """Run the migrations on an open connection"""
+    # SQLite cannot alter most things in place so use batch mode
+    context.configure(connection=connection, render_as_batch=True)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
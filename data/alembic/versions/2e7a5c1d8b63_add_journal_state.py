@@ -0,0 +1,30 @@
+"""Add the table which records how much of the order journal was applied
+
+Revision ID: 2e7a5c1d8b63
+Revises: 9c5d0e7b2f14
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e7a5c1d8b63'
+down_revision = '9c5d0e7b2f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Savegames created after the table was added to the schema already have it
+    op.create_table(
+        'journal_state',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('generation', sa.String, nullable=False),
+        sa.Column('applied', sa.Integer, nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('journal_state', if_exists=True)
@@ -0,0 +1,35 @@
+"""Add indexes for the savegame lookups the game makes
+
+Revision ID: 4b1e2d6f9a30
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1e2d6f9a30'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns).  These must match the indexes in magnate.savegame.db
+INDEXES = (
+    ('ix_commodity_location_id_price', 'commodity', ['location_id', 'price']),
+    ('ix_cargo_ship_id', 'cargo', ['ship_id']),
+    ('ix_ship_owner_id', 'ship', ['owner_id']),
+    ('ix_ship_location_id', 'ship', ['location_id']),
+    ('ix_ship_part_ship_id', 'ship_part', ['ship_id']),
+)
+
+
+def upgrade():
+    # Savegames created after the indexes were added to the schema already have them
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,37 @@
+"""Add the price history table
+
+Revision ID: 9c5d0e7b2f14
+Revises: 4b1e2d6f9a30
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5d0e7b2f14'
+down_revision = '4b1e2d6f9a30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Savegames created after the table was added to the schema already have it
+    op.create_table(
+        'price_history',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('location_id', sa.Integer, sa.ForeignKey('location_data.id'), nullable=False),
+        sa.Column('commodity_id', sa.Integer, sa.ForeignKey('commodity_data.id'), nullable=False),
+        sa.Column('first_time', sa.Integer, nullable=False),
+        sa.Column('last_time', sa.Integer, nullable=False),
+        sa.Column('count', sa.Integer, nullable=False),
+        sa.Column('data', sa.LargeBinary, nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index('ix_price_history_series', 'price_history',
+                    ['location_id', 'commodity_id', 'first_time'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_price_history_series', table_name='price_history', if_exists=True)
+    op.drop_table('price_history', if_exists=True)
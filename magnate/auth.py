@@ -0,0 +1,348 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Check the credentials of players logging in
+
+An auth provider has one coroutine, :meth:`AuthProvider.authenticate`, which the
+:class:`magnate.dispatcher.Dispatcher` awaits before logging a player in.
+
+Passwords are stored as salted hashes made by :func:`hash_password`.  Hashing is deliberately
+slow so :class:`HashingAuthProvider` does it in a thread pool instead of on the event loop.  Once
+a player has logged in, the fact that their password was right is remembered for a short time by
+a :class:`VerifiedCache` so that reconnecting does not hash the password again.
+"""
+import abc
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import sqlite3
+import time
+
+from .errors import MagnateAuthError
+from .logging import log
+
+
+mlog = log.fields(mod=__name__)
+
+#: Number of bytes of random salt for each password
+SALT_SIZE = 16
+#: Parameters of the scrypt hash: CPU/memory cost, block size, and parallelization
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+#: Iterations of the pbkdf2 hash
+PBKDF2_ITERATIONS = 600000
+#: Hash methods which :func:`hash_password` can use
+HASH_METHODS = ('scrypt', 'pbkdf2_sha256')
+#: Default hash method.  pbkdf2 is used if Python was built without scrypt support
+DEFAULT_HASH_METHOD = 'scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2_sha256'
+
+#: Default number of seconds that a verified password is remembered for
+DEFAULT_TTL = 300
+#: Default largest number of players that a :class:`VerifiedCache` remembers
+DEFAULT_CACHE_SIZE = 10000
+
+
+def _b64(data):
+    """Encode bytes for storing in a hash string"""
+    return base64.b64encode(data).decode('ascii')
+
+
+def hash_password(password, method=DEFAULT_HASH_METHOD, salt=None):
+    """
+    Hash a password for storing
+
+    :arg password: The password
+    :kwarg method: One of :data:`HASH_METHODS`
+    :kwarg salt: bytes of salt.  Defaults to :data:`SALT_SIZE` random bytes
+    :returns: A string holding the method, its parameters, the salt, and the hash, separated by
+        ``$``.  Pass it to :func:`verify_password` to check a password.
+    :raises ValueError: if the method is unknown
+    """
+    if salt is None:
+        salt = os.urandom(SALT_SIZE)
+    secret = password.encode('utf-8')
+    if method == 'scrypt':
+        digest = hashlib.scrypt(secret, salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+        params = '{}${}${}'.format(SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    elif method == 'pbkdf2_sha256':
+        digest = hashlib.pbkdf2_hmac('sha256', secret, salt, PBKDF2_ITERATIONS)
+        params = str(PBKDF2_ITERATIONS)
+    else:
+        raise ValueError('Unknown hash method: {}'.format(method))
+    return '{}${}${}${}'.format(method, params, _b64(salt), _b64(digest))
+
+
+def verify_password(password, hashed):
+    """
+    Check a password against a hash from :func:`hash_password`
+
+    The hash's own parameters are used so hashes made with older settings still verify.
+
+    :arg password: The password to check
+    :arg hashed: The stored hash
+    :returns: True if the password matches
+    :raises ValueError: if hashed is not a hash made by :func:`hash_password`
+    """
+    method, _, rest = hashed.partition('$')
+    fields = rest.split('$')
+    secret = password.encode('utf-8')
+    try:
+        if method == 'scrypt' and len(fields) == 5:
+            # Pass maxmem so that stored parameters larger than OpenSSL's default limit still work
+            n, r, p = (int(f) for f in fields[:3])
+            salt, expected = (base64.b64decode(f) for f in fields[3:])
+            digest = hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r,
+                                    dklen=len(expected))
+        elif method == 'pbkdf2_sha256' and len(fields) == 3:
+            iterations = int(fields[0])
+            salt, expected = (base64.b64decode(f) for f in fields[1:])
+            digest = hashlib.pbkdf2_hmac('sha256', secret, salt, iterations, len(expected))
+        else:
+            raise ValueError('Unknown password hash format')
+    except (TypeError, binascii.Error) as e:
+        raise ValueError('Invalid password hash: {}'.format(e))
+    return hmac.compare_digest(digest, expected)
+
+
+class VerifiedCache:
+    """
+    Remember for a short time which players gave the right password
+
+    Only a keyed digest of the password is kept, with a key which exists only in this process.
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_CACHE_SIZE):
+        """
+        :kwarg ttl: Number of seconds to remember a player for.  0 disables the cache
+        :kwarg max_size: Largest number of players to remember
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._key = os.urandom(32)
+        #: Mapping of username to the digest of the password and when it expires
+        self._verified = {}
+
+    def __len__(self):
+        return len(self._verified)
+
+    def _digest(self, password):
+        """Return the keyed digest of a password"""
+        return hmac.new(self._key, password.encode('utf-8'), hashlib.sha256).digest()
+
+    def check(self, username, password):
+        """
+        Check whether a player gave this password recently
+
+        :returns: True if the username and password were added within the ttl
+        """
+        try:
+            digest, expires = self._verified[username]
+        except KeyError:
+            return False
+        if expires < time.monotonic():
+            del self._verified[username]
+            return False
+        return hmac.compare_digest(digest, self._digest(password))
+
+    def add(self, username, password):
+        """Remember that a player's password was verified"""
+        if not self.ttl:
+            return
+        now = time.monotonic()
+        if len(self._verified) >= self.max_size:
+            self._verified = {name: entry for name, entry in self._verified.items()
+                              if entry[1] >= now}
+            if len(self._verified) >= self.max_size:
+                # Forget the player who has been remembered the longest
+                del self._verified[next(iter(self._verified))]
+        self._verified[username] = (self._digest(password), now + self.ttl)
+
+    def invalidate(self, username):
+        """Forget a player, for instance because their password changed"""
+        self._verified.pop(username, None)
+
+
+class AuthProvider(metaclass=abc.ABCMeta):
+    """
+    Decides whether a player may log in
+    """
+    @abc.abstractmethod
+    async def authenticate(self, username, password):
+        """
+        Check a player's credentials
+
+        :arg username: Name the player is logging in as
+        :arg password: Password the player gave
+        :returns: True if the player may log in
+        """
+
+
+class DemoAuthProvider(AuthProvider):
+    """
+    Lets in the demo account without checking passwords
+
+    This is the provider used when no credentials database is configured.
+    """
+    async def authenticate(self, username, password):
+        return 'toshio' in username.lower()
+
+
+class HashingAuthProvider(AuthProvider):
+    """
+    Base class of providers which store hashes made by :func:`hash_password`
+
+    Subclasses implement :meth:`load_hash` and :meth:`store_hash`.  Both are called in the thread
+    pool so they may block.
+    """
+    def __init__(self, method=DEFAULT_HASH_METHOD, ttl=DEFAULT_TTL, executor=None):
+        """
+        :kwarg method: Hash method for new passwords.  One of :data:`HASH_METHODS`
+        :kwarg ttl: Seconds that a verified password is remembered for.  0 disables the cache
+        :kwarg executor: The :class:`concurrent.futures.Executor` to hash in.  Defaults to the
+            event loop's default executor
+        """
+        if method not in HASH_METHODS:
+            raise ValueError('Unknown hash method: {}'.format(method))
+        self.method = method
+        self.executor = executor
+        self.cache = VerifiedCache(ttl)
+
+    @abc.abstractmethod
+    def load_hash(self, username):
+        """
+        Return the stored hash of a player's password
+
+        :returns: The hash or None if there is no such player
+        """
+
+    @abc.abstractmethod
+    def store_hash(self, username, hashed, create):
+        """
+        Store the hash of a player's password
+
+        :arg create: If True, the player must be new.  If False, the player must already exist
+        :raises MagnateAuthError: if the player does or does not exist, contrary to create
+        """
+
+    def _verify(self, username, password):
+        """Check a password against the stored hash.  This blocks"""
+        hashed = self.load_hash(username)
+        if hashed is None:
+            # Spend as long as for a real player so that timing does not reveal which names exist
+            verify_password(password, hash_password('', self.method, salt=b'\0' * SALT_SIZE))
+            return False
+        try:
+            return verify_password(password, hashed)
+        except ValueError:
+            mlog.fields(username=username).warning('Stored password hash is invalid')
+            return False
+
+    async def authenticate(self, username, password):
+        if self.cache.check(username, password):
+            return True
+        loop = asyncio.get_event_loop()
+        verified = await loop.run_in_executor(self.executor, self._verify, username, password)
+        if verified:
+            self.cache.add(username, password)
+        return verified
+
+    async def set_password(self, username, password, create=False):
+        """
+        Store a new password for a player
+
+        :arg username: Name of the player
+        :arg password: The new password
+        :kwarg create: If True, add a new player.  Otherwise change the password of an existing
+            player
+        :raises MagnateAuthError: if the player does or does not exist, contrary to create
+        """
+        loop = asyncio.get_event_loop()
+        hashed = await loop.run_in_executor(self.executor, hash_password, password, self.method)
+        await loop.run_in_executor(self.executor, self.store_hash, username, hashed, create)
+        self.cache.invalidate(username)
+
+
+class SQLiteAuthProvider(HashingAuthProvider):
+    """
+    Credentials kept in a local SQLite database
+    """
+    def __init__(self, path, **kwargs):
+        """
+        :arg path: Path to the database file.  It is created if it does not exist
+        :kwarg kwargs: Passed on to :class:`HashingAuthProvider`
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS credentials'
+                             ' (name TEXT PRIMARY KEY, password TEXT NOT NULL)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """
+        Open a connection to the database
+
+        Each call runs in whichever thread of the pool is free so each gets its own connection.
+        """
+        return sqlite3.connect(self.path)
+
+    def load_hash(self, username):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT password FROM credentials WHERE name = ?',
+                               (username,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row is not None else None
+
+    def store_hash(self, username, hashed, create):
+        conn = self._connect()
+        try:
+            with conn:
+                if create:
+                    try:
+                        conn.execute('INSERT INTO credentials (name, password) VALUES (?, ?)',
+                                     (username, hashed))
+                    except sqlite3.IntegrityError:
+                        raise MagnateAuthError('Player {} already exists'.format(username))
+                else:
+                    cursor = conn.execute('UPDATE credentials SET password = ? WHERE name = ?',
+                                          (hashed, username))
+                    if cursor.rowcount == 0:
+                        raise MagnateAuthError('No such player: {}'.format(username))
+        finally:
+            conn.close()
+
+
+def create_auth_provider(cfg):
+    """
+    Create the auth provider which the configuration asks for
+
+    :arg cfg: The game's configuration
+    :returns: A :class:`SQLiteAuthProvider` if ``auth_db`` is set.  Otherwise
+        a :class:`DemoAuthProvider`
+    """
+    if cfg.get('auth_db'):
+        return SQLiteAuthProvider(os.path.expanduser(cfg['auth_db']),
+                                  method=cfg.get('auth_hash', DEFAULT_HASH_METHOD),
+                                  ttl=cfg.get('auth_cache_ttl', DEFAULT_TTL))
+    return DemoAuthProvider()
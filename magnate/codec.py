@@ -0,0 +1,636 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Encode the arguments of events as bytes
+
+Values are encoded as a one byte tag followed by the value.  Besides the builtin types, values may
+be enums and instances of the classes in :data:`TYPES`.
+
+A :class:`Codec` has two ways to encode enums and classes.  The generic encoding sends the name of
+the class or enum along with the value so the two processes only have to share a little of this
+module.  The compact encoding (the default) sends instances of the classes in :data:`SCHEMAS` as
+their schema's number followed by the fields packed with :mod:`struct` in the schema's order, and
+enum members as the number of the enum and the position of the member.  Those numbers can change
+between releases so files which outlive the process use the generic encoding (see
+:data:`STORAGE_CODEC`).
+
+A Codec may also be given a table of names (commodities, locations, ...) which are sent often.
+Strings which are in the table are sent as their two byte position in the table instead of the
+whole string.  Both ends must use the same table.  The game server sends its table to each client
+when it connects.
+
+Decoding works on a :class:`memoryview` of the data so nothing is copied until the final values are
+created.  Byte strings inside the data are returned as memoryview slices of the data instead of
+being copied.
+"""
+import enum
+import math
+import struct
+from collections import OrderedDict
+from functools import lru_cache
+
+import attr
+
+from .market import Commodity, CommodityData, CommodityType, LocationType
+from .memory import ModuleMemory
+from .order import Order, OrderStatusType
+from .price_history import PriceBucket
+from .routes import TradeRoute
+from .ship import ManifestEntry
+from .travel import Route
+
+
+_LENGTH = struct.Struct('!I')
+_INT = struct.Struct('!q')
+_FLOAT = struct.Struct('!d')
+_NAME_ID = struct.Struct('!H')
+_ENUM_ID = struct.Struct('!BH')
+_SCHEMA_ID = struct.Struct('!B')
+
+_INT_MIN = -2 ** 63
+_INT_MAX = 2 ** 63 - 1
+
+#: Name id which means that the name was not in the table and is sent as a string after the fixed
+#: size fields
+NO_NAME = 0xFFFF
+#: Largest number of names a :class:`Codec` may hold
+MAX_NAMES = NO_NAME
+#: Deepest that containers and classes may be nested inside of each other when decoding.  This
+#: keeps hostile data from exhausting the stack
+MAX_DEPTH = 32
+
+# Kinds of fields in a schema
+#: Integer from -2**63 to 2**63 - 1
+INT = 'int'
+#: Float
+FLOAT = 'float'
+#: Boolean
+BOOL = 'bool'
+#: String which is usually in the name table
+NAME = 'name'
+#: Integer or None.  -2**63 cannot be sent
+OPTIONAL_INT = 'optional int'
+#: Float or None.  NaN cannot be sent
+OPTIONAL_FLOAT = 'optional float'
+#: Member of the field's enum
+ENUM = 'enum'
+#: Set of members of the field's enum.  The enum may have up to 64 members
+FLAGS = 'flags'
+#: Tuple of strings which are usually in the name table
+NAMES = 'names'
+#: Anything which can be encoded
+VALUE = 'value'
+
+#: struct format of the kinds of fields which have a fixed size
+_FIXED_FORMATS = {INT: 'q', FLOAT: 'd', BOOL: '?', NAME: 'H', OPTIONAL_INT: 'q',
+                  OPTIONAL_FLOAT: 'd', ENUM: 'H', FLAGS: 'Q'}
+
+
+class WireError(Exception):
+    """Raised when a value cannot be encoded or decoded"""
+
+
+@attr.s(frozen=True)
+class WireType:
+    """
+    How to send instances of a class
+
+    :cls: The class
+    :to_fields: Function which returns a tuple of the values to send for an instance
+    :from_fields: Function which creates an instance from those values
+    """
+    cls = attr.ib()
+    to_fields = attr.ib()
+    from_fields = attr.ib()
+
+
+@attr.s(frozen=True)
+class Field:
+    """
+    One field of a :class:`Schema`
+
+    :name: Name of the field.  This is only used in error messages
+    :kind: What the field holds.  One of :data:`INT`, :data:`FLOAT`, :data:`BOOL`, :data:`NAME`,
+        :data:`OPTIONAL_INT`, :data:`OPTIONAL_FLOAT`, :data:`ENUM`, :data:`FLAGS`, :data:`NAMES`,
+        or :data:`VALUE`
+    :enum: The enum for :data:`ENUM` and :data:`FLAGS` fields
+    """
+    name = attr.ib(validator=attr.validators.instance_of(str))
+    kind = attr.ib(validator=attr.validators.in_(tuple(_FIXED_FORMATS) + (NAMES, VALUE)))
+    enum = attr.ib(default=None)
+
+
+class Schema:
+    """
+    Fixed layout of the fields of a class
+
+    The fields with a fixed size are packed together with one :class:`struct.Struct`.  Names which
+    are not in the name table, :data:`NAMES` and :data:`VALUE` fields follow in the order of the
+    fields.
+    """
+    def __init__(self, wire_type, fields):
+        """
+        :arg wire_type: The :class:`WireType` of the class
+        :arg fields: Sequence of :class:`Field` in the order that to_fields returns them
+        """
+        self.wire_type = wire_type
+        self.fields = tuple(fields)
+        self.fixed = tuple(idx for idx, field in enumerate(self.fields)
+                           if field.kind in _FIXED_FORMATS)
+        self.variable = tuple(idx for idx, field in enumerate(self.fields)
+                              if field.kind not in _FIXED_FORMATS)
+        self.struct = struct.Struct('!' + ''.join(_FIXED_FORMATS[self.fields[idx].kind]
+                                                  for idx in self.fixed))
+
+        self._members = {}
+        self._ordinals = {}
+        for field in self.fields:
+            if field.kind in (ENUM, FLAGS):
+                members = tuple(field.enum)
+                if field.kind == FLAGS and len(members) > 64:
+                    raise ValueError('{} has too many members for a FLAGS field'
+                                     .format(field.enum.__name__))
+                self._members[field.enum] = members
+                self._ordinals[field.enum] = {m: idx for idx, m in enumerate(members)}
+
+
+#: Mapping of name to the :class:`WireType` of classes that may be sent
+TYPES = OrderedDict()
+_TYPE_NAMES = {}
+#: Mapping of name to the enums that may be sent
+ENUMS = OrderedDict()
+_ENUM_IDS = {}
+_ENUM_MEMBERS = []
+_ENUM_ORDINALS = {}
+#: Schemas of the classes which have a compact encoding.  The position in the list is the number
+#: the schema is sent as
+SCHEMAS = []
+_SCHEMA_IDS = {}
+
+
+def register_type(cls, name=None, to_fields=None, from_fields=None, fields=None):
+    """
+    Allow instances of a class to be sent
+
+    :arg cls: The class.  If to_fields and from_fields are not given, it must be an attrs class
+        which can be created by passing its attributes in order.
+    :kwarg name: Name to send the class as.  Defaults to the class's name
+    :kwarg to_fields: Function which returns a tuple of the values to send for an instance
+    :kwarg from_fields: Function which creates an instance from those values
+    :kwarg fields: Sequence of :class:`Field` describing the values which to_fields returns.  If
+        given, the class has a compact encoding.  Both processes must register the schemas in the
+        same order.
+    """
+    if name is None:
+        name = cls.__name__
+    if to_fields is None:
+        field_names = tuple(a.name for a in attr.fields(cls))
+
+        def to_fields(obj):
+            """Return the attributes of obj in the order they are defined"""
+            return tuple(getattr(obj, field) for field in field_names)
+    if from_fields is None:
+        def from_fields(values):
+            """Create an instance from its attributes"""
+            return cls(*values)
+    wire_type = TYPES[name] = WireType(cls, to_fields, from_fields)
+    _TYPE_NAMES[cls] = name
+
+    if fields is not None:
+        if len(SCHEMAS) > 0xFF:
+            raise ValueError('Too many schemas')
+        _SCHEMA_IDS[cls] = len(SCHEMAS)
+        SCHEMAS.append(Schema(wire_type, fields))
+
+
+def register_enum(enum_cls, name=None):
+    """
+    Allow the members of an enum to be sent
+
+    :arg enum_cls: The enum
+    :kwarg name: Name to send the enum as.  Defaults to the enum's name
+    """
+    if len(ENUMS) > 0xFF:
+        raise ValueError('Too many enums')
+    ENUMS[name or enum_cls.__name__] = enum_cls
+    _ENUM_IDS[enum_cls] = len(_ENUM_MEMBERS)
+    members = tuple(enum_cls)
+    _ENUM_MEMBERS.append(members)
+    _ENUM_ORDINALS[enum_cls] = {member: idx for idx, member in enumerate(members)}
+
+
+def _commodity_fields(commodity):
+    """Return the values to send for a Commodity"""
+    # pylint: disable=protected-access
+    data = commodity._commodity_data
+    return (data.name, data.type, data.mean_price, data.standard_deviation, data.depreciation_rate,
+            data.hold_space, commodity.price)
+
+
+@lru_cache(maxsize=1024)
+def _commodity_data(*values):
+    """
+    Return the CommodityData for the values sent for a Commodity
+
+    Markets send the same commodities over and over with only the price changing so the
+    CommodityData is shared just as it is in the backend.
+    """
+    return CommodityData(*values)
+
+
+def _commodity_from_fields(values):
+    """
+    Create a Commodity from the values sent for it
+
+    The Commodity is not attached to a PubPen and the price events are not sent.
+    """
+    commodity = Commodity(None, _commodity_data(*values[:6]))
+    commodity.price = values[6]
+    return commodity
+
+
+# The compact encoding identifies classes and enums by their position here.  Journals and
+# recordings outlive a release so only ever add new registrations at the end.
+for _enum_cls in (CommodityType, LocationType, OrderStatusType):
+    register_enum(_enum_cls)
+
+register_type(Commodity, to_fields=_commodity_fields, from_fields=_commodity_from_fields,
+              fields=(Field('name', NAME), Field('type', FLAGS, CommodityType),
+                      Field('mean_price', INT), Field('standard_deviation', INT),
+                      Field('depreciation_rate', FLOAT), Field('hold_space', INT),
+                      Field('price', OPTIONAL_INT)))
+register_type(ManifestEntry, fields=(Field('commodity', NAME), Field('quantity', INT),
+                                     Field('price_paid', FLOAT)))
+register_type(Order, fields=(Field('location', NAME), Field('commodity', NAME),
+                             Field('price', INT), Field('hold_quantity', INT),
+                             Field('warehouse_quantity', INT), Field('buy', BOOL),
+                             Field('status', ENUM, OrderStatusType)))
+register_type(PriceBucket, fields=(Field('start', INT), Field('end', INT),
+                                   Field('low', OPTIONAL_INT), Field('high', OPTIONAL_INT),
+                                   Field('mean', OPTIONAL_FLOAT), Field('count', INT)))
+register_type(Route, fields=(Field('path', NAMES), Field('distance', INT)))
+register_type(TradeRoute, fields=(Field('commodity', NAME), Field('origin', NAME),
+                                  Field('destination', NAME), Field('buy_price', INT),
+                                  Field('sell_price', INT), Field('quantity', INT),
+                                  Field('profit', INT)))
+register_type(ModuleMemory, fields=(Field('module', NAME), Field('size', INT), Field('count', INT),
+                                    Field('size_diff', INT)))
+
+
+def encode_str(value, out):
+    """
+    Append a length prefixed UTF-8 string
+
+    :arg value: The string
+    :arg out: bytearray to append to
+    """
+    data = value.encode('utf-8')
+    out += _LENGTH.pack(len(data))
+    out += data
+
+
+def decode_str(data, offset):
+    """
+    Decode a length prefixed UTF-8 string
+
+    :arg data: bytes-like object holding the string
+    :arg offset: Position of the string's length in data
+    :returns: A tuple of the string and the offset after it
+    """
+    length, = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    end = offset + length
+    if end > len(data):
+        raise WireError('String runs past the end of the data')
+    return str(data[offset:end], 'utf-8'), end
+
+
+class Codec:
+    """
+    Encoder and decoder of values
+    """
+    def __init__(self, names=(), compact=True):
+        """
+        :kwarg names: Sequence of strings to send as their position in the sequence.  Both ends
+            must use the same names
+        :kwarg compact: If False, enums and classes are sent by name instead of with their
+            schemas
+        :raises ValueError: if there are too many names
+        """
+        self.names = tuple(names)
+        if len(self.names) > MAX_NAMES:
+            raise ValueError('A name table holds at most {} names'.format(MAX_NAMES))
+        self._name_ids = {name: idx for idx, name in enumerate(self.names)}
+        self.compact = compact
+
+    def encode(self, value):
+        """
+        Encode a value
+
+        :arg value: The value to encode
+        :returns: bytes holding the encoded value
+        :raises WireError: if the value contains something which cannot be sent
+        """
+        out = bytearray()
+        self.encode_into(value, out)
+        return bytes(out)
+
+    def encode_into(self, value, out):
+        """
+        Append the encoding of a value to a bytearray
+
+        :arg value: The value to encode
+        :arg out: The bytearray to add to
+        :raises WireError: if the value contains something which cannot be sent
+        """
+        # bool is a subclass of int and enums may be, so check for them before int
+        if value is None:
+            out += b'N'
+        elif value is True:
+            out += b'T'
+        elif value is False:
+            out += b'F'
+        elif isinstance(value, str):
+            name_id = self._name_ids.get(value)
+            if name_id is not None:
+                out += b'n'
+                out += _NAME_ID.pack(name_id)
+            else:
+                out += b's'
+                encode_str(value, out)
+        elif isinstance(value, enum.Enum):
+            enum_cls = type(value)
+            if self.compact and enum_cls in _ENUM_IDS:
+                out += b'E'
+                out += _ENUM_ID.pack(_ENUM_IDS[enum_cls], _ENUM_ORDINALS[enum_cls][value])
+            else:
+                out += b'e'
+                encode_str(enum_cls.__name__, out)
+                encode_str(value.name, out)
+        elif isinstance(value, int):
+            if _INT_MIN <= value <= _INT_MAX:
+                out += b'i'
+                out += _INT.pack(value)
+            else:
+                out += b'I'
+                encode_str(str(value), out)
+        elif isinstance(value, float):
+            out += b'd'
+            out += _FLOAT.pack(value)
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            out += b'b'
+            out += _LENGTH.pack(len(value))
+            out += value
+        elif isinstance(value, (list, tuple, frozenset, set)):
+            out += {list: b'l', tuple: b't', frozenset: b'f', set: b'f'}.get(type(value), b'l')
+            out += _LENGTH.pack(len(value))
+            for item in value:
+                self.encode_into(item, out)
+        elif isinstance(value, dict):
+            out += b'm'
+            out += _LENGTH.pack(len(value))
+            for key, item in value.items():
+                self.encode_into(key, out)
+                self.encode_into(item, out)
+        else:
+            cls = type(value)
+            if self.compact and cls in _SCHEMA_IDS:
+                schema_id = _SCHEMA_IDS[cls]
+                out += b'S'
+                out += _SCHEMA_ID.pack(schema_id)
+                self._encode_schema(SCHEMAS[schema_id], value, out)
+                return
+            try:
+                name = _TYPE_NAMES[cls]
+            except KeyError:
+                raise WireError('Cannot send values of type {}'.format(cls.__name__))
+            out += b'o'
+            encode_str(name, out)
+            self.encode_into(TYPES[name].to_fields(value), out)
+
+    def _encode_schema(self, schema, value, out):
+        """Append the fields of value packed according to its schema"""
+        values = schema.wire_type.to_fields(value)
+        fields = schema.fields
+        packed = []
+        # Names missing from the table are sent after the fixed size fields
+        strings = []
+        for idx in schema.fixed:
+            field = fields[idx]
+            kind = field.kind
+            field_value = values[idx]
+            if kind == NAME:
+                name_id = self._name_ids.get(field_value, NO_NAME)
+                if name_id == NO_NAME:
+                    if not isinstance(field_value, str):
+                        raise WireError('{} must be a string'.format(field.name))
+                    strings.append(field_value)
+                packed.append(name_id)
+            elif kind == OPTIONAL_INT:
+                if field_value == _INT_MIN:
+                    raise WireError('{} cannot be {}'.format(field.name, _INT_MIN))
+                packed.append(_INT_MIN if field_value is None else field_value)
+            elif kind == OPTIONAL_FLOAT:
+                if field_value is not None and math.isnan(field_value):
+                    raise WireError('{} cannot be NaN'.format(field.name))
+                packed.append(math.nan if field_value is None else field_value)
+            elif kind == ENUM:
+                packed.append(schema._ordinals[field.enum][field_value])
+            elif kind == FLAGS:
+                ordinals = schema._ordinals[field.enum]
+                packed.append(sum(1 << ordinals[member] for member in field_value))
+            else:
+                packed.append(field_value)
+        try:
+            out += schema.struct.pack(*packed)
+        except struct.error as e:
+            raise WireError('Cannot send {}: {}'.format(type(value).__name__, e))
+
+        for string in strings:
+            encode_str(string, out)
+        for idx in schema.variable:
+            field_value = values[idx]
+            if fields[idx].kind == NAMES:
+                out += _LENGTH.pack(len(field_value))
+                for name in field_value:
+                    self.encode_into(name, out)
+            else:
+                self.encode_into(field_value, out)
+
+    def decode(self, data):
+        """
+        Decode a value created by :meth:`encode`
+
+        :arg data: bytes-like object to decode
+        :returns: The value
+        :raises WireError: if the data is not a valid value
+        """
+        data = memoryview(data)
+        try:
+            value, offset = self.decode_from(data, 0)
+        except (IndexError, KeyError, TypeError, ValueError, struct.error) as e:
+            raise WireError('Invalid value: {}'.format(e))
+        if offset != len(data):
+            raise WireError('{} extra bytes after the value'.format(len(data) - offset))
+        return value
+
+    def decode_from(self, data, offset, depth=0):
+        """
+        Decode one value
+
+        :arg data: :class:`memoryview` of the data
+        :arg offset: Position of the value in data
+        :kwarg depth: Number of containers and classes that the value is nested inside of
+        :returns: A tuple of the value and the offset of the next value
+        :raises WireError: if the data is not a valid value or is nested more than
+            :data:`MAX_DEPTH` deep.  Some invalid data raises :exc:`IndexError`, :exc:`KeyError`,
+            :exc:`TypeError`, :exc:`ValueError`, or :exc:`struct.error` instead; :meth:`decode`
+            turns those into WireError
+        """
+        if depth > MAX_DEPTH:
+            raise WireError('Value is nested more than {} deep'.format(MAX_DEPTH))
+        tag = data[offset]
+        offset += 1
+        if tag == 0x6e:  # n
+            name_id, = _NAME_ID.unpack_from(data, offset)
+            return self.names[name_id], offset + _NAME_ID.size
+        if tag == 0x53:  # S
+            schema_id, = _SCHEMA_ID.unpack_from(data, offset)
+            return self._decode_schema(SCHEMAS[schema_id], data, offset + _SCHEMA_ID.size,
+                                       depth + 1)
+        if tag == 0x4e:  # N
+            return None, offset
+        if tag == 0x54:  # T
+            return True, offset
+        if tag == 0x46:  # F
+            return False, offset
+        if tag == 0x69:  # i
+            return _INT.unpack_from(data, offset)[0], offset + _INT.size
+        if tag == 0x64:  # d
+            return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+        if tag == 0x73:  # s
+            return decode_str(data, offset)
+        if tag == 0x45:  # E
+            enum_id, ordinal = _ENUM_ID.unpack_from(data, offset)
+            return _ENUM_MEMBERS[enum_id][ordinal], offset + _ENUM_ID.size
+        if tag == 0x49:  # I
+            value, offset = decode_str(data, offset)
+            return int(value), offset
+        if tag == 0x62:  # b
+            length, = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            if offset + length > len(data):
+                raise WireError('Bytes run past the end of the data')
+            return data[offset:offset + length], offset + length
+        if tag in (0x6c, 0x74, 0x66):  # l t f
+            length, = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            items = []
+            for _ in range(length):
+                item, offset = self.decode_from(data, offset, depth + 1)
+                items.append(item)
+            if tag == 0x74:
+                return tuple(items), offset
+            if tag == 0x66:
+                return frozenset(items), offset
+            return items, offset
+        if tag == 0x6d:  # m
+            length, = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            mapping = OrderedDict()
+            for _ in range(length):
+                key, offset = self.decode_from(data, offset, depth + 1)
+                mapping[key], offset = self.decode_from(data, offset, depth + 1)
+            return mapping, offset
+        if tag == 0x65:  # e
+            enum_name, offset = decode_str(data, offset)
+            member, offset = decode_str(data, offset)
+            try:
+                return ENUMS[enum_name][member], offset
+            except KeyError:
+                raise WireError('Unknown enum value {}.{}'.format(enum_name, member))
+        if tag == 0x6f:  # o
+            name, offset = decode_str(data, offset)
+            values, offset = self.decode_from(data, offset, depth + 1)
+            try:
+                wire_type = TYPES[name]
+            except KeyError:
+                raise WireError('Unknown type {}'.format(name))
+            return wire_type.from_fields(values), offset
+        raise WireError('Unknown tag {!r} at offset {}'.format(bytes((tag,)), offset - 1))
+
+    def _decode_schema(self, schema, data, offset, depth):
+        """Decode the fields packed according to a schema and create the instance"""
+        packed = schema.struct.unpack_from(data, offset)
+        offset += schema.struct.size
+        fields = schema.fields
+        values = [None] * len(fields)
+        for idx, field_value in zip(schema.fixed, packed):
+            field = fields[idx]
+            kind = field.kind
+            if kind == NAME:
+                if field_value == NO_NAME:
+                    field_value, offset = decode_str(data, offset)
+                else:
+                    field_value = self.names[field_value]
+            elif kind == OPTIONAL_INT:
+                if field_value == _INT_MIN:
+                    field_value = None
+            elif kind == OPTIONAL_FLOAT:
+                if math.isnan(field_value):
+                    field_value = None
+            elif kind == ENUM:
+                field_value = schema._members[field.enum][field_value]
+            elif kind == FLAGS:
+                field_value = frozenset(member for bit, member
+                                        in enumerate(schema._members[field.enum])
+                                        if field_value & (1 << bit))
+            values[idx] = field_value
+
+        for idx in schema.variable:
+            if fields[idx].kind == NAMES:
+                length, = _LENGTH.unpack_from(data, offset)
+                offset += _LENGTH.size
+                names = []
+                for _ in range(length):
+                    name, offset = self.decode_from(data, offset, depth)
+                    names.append(name)
+                values[idx] = tuple(names)
+            else:
+                values[idx], offset = self.decode_from(data, offset, depth)
+        return schema.wire_type.from_fields(values), offset
+
+
+#: Codec without a name table.  Data encoded by it can be decoded by any Codec
+DEFAULT_CODEC = Codec()
+#: Codec for data which is written to disk.  Classes and enums are written by name so files do not
+#: depend on the order that schemas are registered in
+STORAGE_CODEC = Codec(compact=False)
+
+
+def game_names(magnate):
+    """
+    Return the names which are sent often in a game's events
+
+    :arg magnate: The :class:`magnate.magnate.Magnate` running the game
+    :returns: Tuple of the names of the commodities, locations, and ship types
+    """
+    names = list(magnate.commodity_data)
+    for system in magnate.system_data.values():
+        names.extend(system.locations)
+    names.extend(magnate.ship_data)
+    # Keep the first position of any name which is used for two things
+    return tuple(OrderedDict.fromkeys(names))
@@ -23,7 +23,7 @@ from collections.abc import MutableMapping
 
 import yaml
 from kitchen.iterutils import iterate
-from voluptuous import All, Length, Schema, MultipleInvalid
+from voluptuous import All, Any, Length, Range, Schema, MultipleInvalid
 
 from .errors import MagnateConfigError
 from .logging import log
@@ -57,6 +57,73 @@ ui_plugin: urwid
 # Whether to use uvloop instead of the stdlib asyncio event loop
 use_uvloop: False
 
+# Seed for the random numbers used by the game.  Games started with the same seed will see the same
+# prices.  If not set, a seed is chosen at random when the game starts.  That seed is logged at INFO
+# level so the game can be reproduced.
+world_seed: null
+
+# Random number generator to use for prices.  One of:
+# mersenne  Python's builtin generator.  Fastest.
+# pcg32     Slower but a seed reproduces the same prices on every version of Python.
+price_generator: mersenne
+
+# Number of seconds between updates of the prices in every market.  0 disables periodic updates so
+# prices only change when a ship arrives at a market.
+price_tick_interval: 0
+
+# Number of processes to spread the price updates of different stellar systems over.  0 updates all
+# of the systems in the main process.
+tick_workers: 0
+
+# Number of past prices to remember for each commodity in each market.  0 disables the price history.
+price_history_size: 1000
+
+# Whether to record statistics about the events passed between the user interface and the backend.
+# This slows the game down slightly.  The statistics are logged at INFO level when the game exits.
+event_stats: False
+
+# When event_stats is on, event handlers which take longer than this many milliseconds are logged
+event_handler_budget: 5
+
+# SQLite database of the players' hashed passwords.  If not set, anyone whose name contains
+# "toshio" may log in without a password.
+auth_db: null
+
+# Hash used for new passwords in auth_db.  One of:
+# scrypt         Memory hard.  Needs Python built against OpenSSL 1.1 or newer.
+# pbkdf2_sha256  Available everywhere.
+auth_hash: scrypt
+
+# Number of seconds that a player who logged in can log in again without their password being
+# hashed again.  0 hashes the password on every login.
+auth_cache_ttl: 300
+
+# File to record each trade and ship movement in as it happens so they are not lost if the game
+# crashes.  When a savegame is loaded, this journal is applied to it and emptied.  If not set,
+# trades are not journaled.
+order_journal: null
+
+# Number of seconds that a trade waits to be written to the order journal together with any others
+# made in that time.  Larger values write less often but lose more trades in a crash.
+journal_commit_delay: 0.005
+
+# File to record the world seed and every action of the players in so that the game can be replayed
+# with magnate-replay.  The file is overwritten each time the game starts.  If not set, the game is
+# not recorded.
+record_session: null
+
+# Whether to trace memory allocations and log how much memory each module of the game is using.
+# This slows the game down noticeably.  The report is logged at INFO level.
+profile_memory: False
+
+# When profile_memory is on, number of seconds between reports in the log.  0 only logs a report
+# when the game exits or when one is asked for with the query.debug.memory event.
+memory_report_interval: 60
+
+# Number of seconds that the CPU profiler runs for once it is turned on from the game menu or by
+# sending the process SIGUSR1.  Profiles are saved in state_dir.
+profile_duration: 30
+
 # Configuration of logging output.  This is given directly to twiggy.dict_cnfig()
 logging:
   version: "1.0"
@@ -93,6 +160,22 @@ CONFIG_SCHEMA = Schema({
     'state_dir': All(str, Length(min=1)),
     'ui_plugin': All(str, Length(min=1, max=128)),
     'use_uvloop': bool,
+    'world_seed': Any(None, All(int, Range(min=0))),
+    'price_generator': Any('mersenne', 'pcg32'),
+    'price_tick_interval': All(Any(int, float), Range(min=0)),
+    'tick_workers': All(int, Range(min=0)),
+    'price_history_size': All(int, Range(min=0)),
+    'event_stats': bool,
+    'event_handler_budget': All(Any(int, float), Range(min=0)),
+    'auth_db': Any(None, All(str, Length(min=1))),
+    'auth_hash': Any('scrypt', 'pbkdf2_sha256'),
+    'auth_cache_ttl': All(Any(int, float), Range(min=0)),
+    'order_journal': Any(None, All(str, Length(min=1))),
+    'journal_commit_delay': All(Any(int, float), Range(min=0)),
+    'record_session': Any(None, All(str, Length(min=1))),
+    'profile_memory': bool,
+    'memory_report_interval': All(Any(int, float), Range(min=0)),
+    'profile_duration': All(Any(int, float), Range(min=0, min_included=False)),
     # The logging param is passed directly to twiggy.dict_config() which does its own validation
     'logging': dict,
     }, required=False)
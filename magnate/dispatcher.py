@@ -16,12 +16,27 @@
 """
 Dispatcher manages the communication between the backend and various user
 interfaces.
+
+Each player has a :class:`magnate.session.Session`.  The dispatcher's handlers are subscribed once
+per session, in the session's namespace, so a player's actions only run that player's handlers.
+The local player uses :attr:`Dispatcher.default_session`, whose events are not namespaced.
 """
+from functools import partial
+
+import attr
 
+from .fleet import TradeOrder
+from .logging import log
 from .market import CommodityType
+from .order import Order
+from .routes import RouteTable
+from .session import Session, SessionRegistry
 from .ship import ManifestEntry
 
 
+mlog = log.fields(mod=__name__)
+
+
 class Dispatcher:
     """Manage the communication between the backend and frontends"""
 
@@ -29,21 +44,138 @@ class Dispatcher:
         self.magnate = magnate
         self.pubpen = magnate.pubpen
         self.markets = markets
-        self.user = None
 
-        self.pubpen.subscribe('action.ship.movement_attempt', self.handle_movement)
-        self.pubpen.subscribe('action.user.login_attempt', self.handle_login)
-        self.pubpen.subscribe('action.user.order', self.handle_order)
+        self.routes = RouteTable(self.pubpen, self.markets)
+
+        #: Sessions of the players connected from other processes
+        self.sessions = SessionRegistry()
+        #: Session of the player using the local user interface
+        self.default_session = Session(self.pubpen)
+        self._subscribe_session(self.default_session)
+        # Logins which are waiting for their credentials to be checked, by session
+        self._logins = {}
+
+    def _subscribe_session(self, session):
+        """Handle a session's actions and queries"""
+        for event, handler in (('action.fleet.buy_ships', self._buy_ships),
+                               ('action.fleet.create', self._create_fleet),
+                               ('action.fleet.order', self._fleet_order),
+                               ('action.ship.movement_attempt', self._movement),
+                               ('action.user.login_attempt', self._login),
+                               ('action.user.order', self._order),
+                               ('query.routes.best', self._best_routes)):
+            callback = partial(handler, session)
+            session.callbacks.append(callback)
+            session.pubpen.subscribe(event, callback)
+        if self.magnate.recorder is not None:
+            self.magnate.recorder.watch(session)
+
+    @property
+    def user(self):
+        """The user logged in to the :attr:`default_session`"""
+        return self.default_session.user
+
+    def open_session(self):
+        """
+        Start handling a new player's events
+
+        :returns: The new :class:`magnate.session.Session`
+        """
+        session = self.sessions.create(self.pubpen)
+        self._subscribe_session(session)
+        return session
+
+    def close_session(self, session_id):
+        """
+        Stop handling a player's events
+
+        :arg session_id: Id of the session to close
+        """
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.remove(session_id)
+            session.close()
 
-    def handle_login(self, username, password):
+    def handle_login(self, username, password, session=None):
         """
         Attempt to log the user into the game
 
         :arg username: User attempting to login
         :arg password: Password to authenticate with
+        :kwarg session: The :class:`magnate.session.Session` to log in to.  Defaults to
+            :attr:`default_session`
+        :returns: The :class:`asyncio.Task` which checks the credentials and logs the user in or
+            None if the attempt was refused
+        :event user.login_failure: Emitted when the session already has a user or is still
+            checking an earlier attempt
         """
-        user = self.magnate.login(username, password)
-        self.user = user
+        if session is None:
+            session = self.default_session
+        return self._login(session, username, password)
+
+    def _login(self, session, username, password):
+        """
+        Log a user into a session
+
+        Checking the password may take a while so it is done in a task.  The player is logged in
+        when the task finishes.  Only one attempt per session is checked at a time so a client
+        cannot tie up the password hashing threads.
+        """
+        if session.user is not None:
+            session.pubpen.publish('user.login_failure', 'Already logged in')
+            return None
+        if session in self._logins:
+            session.pubpen.publish('user.login_failure', 'A login is already in progress')
+            return None
+
+        task = self.pubpen.loop.create_task(self._authenticate(session, username, password))
+        self._logins[session] = task
+        task.add_done_callback(lambda _task: self._logins.pop(session, None))
+        return task
+
+    async def _authenticate(self, session, username, password):
+        """Check a user's credentials and log them into a session if they are right"""
+        try:
+            verified = await self.magnate.auth.authenticate(username, password)
+        except Exception:  # pylint: disable=broad-except
+            mlog.fields(func='Dispatcher._authenticate', username=username).trace(
+                'error').error('Could not check credentials')
+            verified = False
+
+        if session.closed:
+            # The player disconnected while their password was being checked
+            return
+        if not verified:
+            session.pubpen.publish('user.login_failure',
+                                   'Unknown account or wrong password: {}'.format(username))
+            return
+
+        # The local player's events are not namespaced so it uses the game's PubPen
+        pubpen = session.pubpen if session.session_id is not None else None
+        session.user = self.magnate.login(username, pubpen=pubpen)
+
+    def handle_best_routes(self, k=5, anywhere=False):
+        """
+        Find the most profitable trades for the user's ship
+
+        :kwarg k: Maximum number of routes to return
+        :kwarg anywhere: If True, return routes starting at any market.  Otherwise only return
+            routes which buy at the ship's current location
+        :event routes.best: Publishes a list of :class:`magnate.routes.TradeRoute` from most to
+            least profitable.  The list is empty if no user is logged in.
+        """
+        self._best_routes(self.default_session, k, anywhere)
+
+    def _best_routes(self, session, k=5, anywhere=False):
+        """Find the most profitable trades for a session's ship"""
+        routes = []
+        user = session.user
+        if user is not None:
+            ship = user.ship
+            origin = None if anywhere else ship.location.name
+            routes = self.routes.best(ship.holdspace - ship.filled_hold, user.cash, k=k,
+                                      origin=origin)
+        session.pubpen.publish('routes.best', routes)
 
     def handle_order(self, order):
         """
@@ -53,13 +185,48 @@ class Dispatcher:
             relevant information to buy or sell the commodity
         :event user.order_failure: Emitted when the order could not be processed
         """
+        self._order(self.default_session, order)
+
+    def _invalid_order(self, order):
+        """
+        Check an order for values which no player could legitimately send
+
+        Orders can come from remote clients so nothing in them can be trusted.
+
+        :arg order: The order to check
+        :returns: A message saying what is wrong with the order or None if it is well formed
+        """
+        if not isinstance(order, Order):
+            return 'Not an order'
+        if order.hold_quantity < 0 or order.warehouse_quantity < 0:
+            return 'Quantities on an order cannot be negative'
+        if order.hold_quantity == 0 and order.warehouse_quantity == 0:
+            return 'The order is for nothing'
+        if order.price <= 0:
+            return 'The price on an order must be positive'
+        market = self.markets.get(order.location)
+        if market is None or order.commodity not in market.commodities:
+            return 'Unknown location or commodity'
+        return None
+
+    def _order(self, session, order):
+        """Attempt to purchase or sell a commodity for a session's user"""
+        user = session.user
+        if user is None:
+            return
+        pubpen = session.pubpen
         fatal_error = False
 
+        msg = self._invalid_order(order)
+        if msg is not None:
+            pubpen.publish('user.order_failure', msg)
+            return
+
         # Check that the user is in the location
-        if order.location != self.user.ship.location.name:
+        if order.location != user.ship.location.name:
             fatal_error = True
-            self.pubpen.publish('user.order_failure',
-                                'Cannot process an order when the player is not at the location')
+            pubpen.publish('user.order_failure',
+                           'Cannot process an order when the player is not at the location')
 
         current_price = self.markets[order.location].commodities[order.commodity].price
         total_quantity = order.hold_quantity + order.warehouse_quantity
@@ -69,54 +236,55 @@ class Dispatcher:
             # Check that the price matches or is better
             if order.price < current_price:
                 fatal_error = True
-                self.pubpen.publish('user.order_failure',
-                                    "Current market price is higher than on the order."
-                                    "  Refresh prices and try again")
+                pubpen.publish('user.order_failure',
+                               "Current market price is higher than on the order."
+                               "  Refresh prices and try again")
 
             # Check that the user has enough cash
-            if total_sale > self.user.cash:
+            if total_sale > user.cash:
                 fatal_error = True
-                self.pubpen.publish("user.order_failure",
-                                    "Total amount of money for this sale exceeds the user's cash")
+                pubpen.publish("user.order_failure",
+                               "Total amount of money for this sale exceeds the user's cash")
 
             if fatal_error:
                 return
 
             # Purchase the commodity
-            new_cash = self.user.cash - total_sale
+            new_cash = user.cash - total_sale
             if CommodityType.cargo in self.markets[order.location].commodities[order.commodity].type:
                 # Buy cargo
                 new_cargo = ManifestEntry(order.commodity, order.hold_quantity, order.price)
                 try:
-                    self.user.ship.add_cargo(new_cargo)
+                    user.ship.add_cargo(new_cargo)
                 except ValueError:
-                    self.pubpen.publish("user.order_failure",
-                                        "Amount ordered, {}, will not fit into the"
-                                        " ship's hold".format(order.hold_quantity))
+                    pubpen.publish("user.order_failure",
+                                   "Amount ordered, {}, will not fit into the"
+                                   " ship's hold".format(order.hold_quantity))
                     return
                 ### FIXME: add to the user's warehouse space
                 pass
             else:
                 # Buy Equipment
                 if order.commodity.lower() == 'cargo module (100 units)':
-                    self.user.ship.holdspace += total_quantity * 100
-                    self.pubpen.publish('ship.equip.update', self.user.ship.holdspace)
+                    user.ship.holdspace += total_quantity * 100
+                    pubpen.publish('ship.equip.update', user.ship.holdspace)
                 else:
                     ### TODO: handle warheouse and lasers
                     pass
-                    self.pubpen.publish("user.order_failure",
-                                        "Backend doesn't yet support buying {}".format(order.commodity))
+                    pubpen.publish("user.order_failure",
+                                   "Backend doesn't yet support buying {}".format(order.commodity))
                     return
-            self.user.cash = new_cash
-            self.pubpen.publish('market.{}.purchased'.format(order.location),
-                                order.commodity, total_quantity)
+            user.cash = new_cash
+            self._journal_order(user, order, current_price)
+            purchased = session.publisher('market.{}.purchased', order.location)
+            purchased(order.commodity, total_quantity)
         else:
             # Check that the price matches or is better
             if order.price > current_price:
                 fatal_error = True
-                self.pubpen.publish('user.order_failure',
-                                    'Current market price is lower than on the order.'
-                                    ' Refresh prices and try again')
+                pubpen.publish('user.order_failure',
+                               'Current market price is lower than on the order.'
+                               ' Refresh prices and try again')
 
             if fatal_error:
                 return
@@ -125,11 +293,11 @@ class Dispatcher:
             if CommodityType.cargo in self.markets[order.location].commodities[order.commodity].type:
                 # Sell cargo
                 try:
-                    self.user.ship.remove_cargo(order.commodity, order.hold_quantity)
+                    user.ship.remove_cargo(order.commodity, order.hold_quantity)
                 except ValueError:
-                    self.pubpen.publish('user.order_failure',
-                                        'We do not have {} of {} on the ship to'
-                                        ' sell'.format(order.hold_quantity, order.commodity))
+                    pubpen.publish('user.order_failure',
+                                   'We do not have {} of {} on the ship to'
+                                   ' sell'.format(order.hold_quantity, order.commodity))
                     return
                 ### FIXME:  Deduct from the user's warehouse space
                 pass
@@ -137,23 +305,30 @@ class Dispatcher:
                 # Sell Equipment
                 if order.commodity.lower() == 'cargo module (100 units)':
                     try:
-                        self.user.ship.holdspace -= total_quantity * 100
+                        user.ship.holdspace -= total_quantity * 100
                     except ValueError:
                         fatal_error = True
-                        self.pubpen.publish('user.order_failure',
-                                            'We do not have {} of {} to'
-                                            ' sell'.format(total_quantity, order.commodity))
+                        pubpen.publish('user.order_failure',
+                                       'We do not have {} of {} to'
+                                       ' sell'.format(total_quantity, order.commodity))
                         return
-                    self.pubpen.publish('ship.equip.update', self.user.ship.holdspace)
+                    pubpen.publish('ship.equip.update', user.ship.holdspace)
                 else:
                     ### TODO: handle warehouse and lasers
                     pass
-                    self.pubpen.publish("user.order_failure",
-                                        "Backend doesn't yet support selling {}".format(order.commodity))
+                    pubpen.publish("user.order_failure",
+                                   "Backend doesn't yet support selling {}".format(order.commodity))
                     return
 
-            self.user.cash += total_sale
-            self.pubpen.publish('market.{}.sold'.format(order.location), order.commodity, total_quantity)
+            user.cash += total_sale
+            self._journal_order(user, order, current_price)
+            sold = session.publisher('market.{}.sold', order.location)
+            sold(order.commodity, total_quantity)
+
+    def _journal_order(self, user, order, price):
+        """Record an order which was applied in the game's order journal"""
+        if self.magnate.journal is not None:
+            self.magnate.journal.record_order(user.username, attr.evolve(order, price=price))
 
     def handle_movement(self, location):
         """Attempt to move the ship to a new location on user request
@@ -163,8 +338,122 @@ class Dispatcher:
             :msg: Unknown destination
             :msg: Ship too heavy
         """
+        self._movement(self.default_session, location)
+
+    def _movement(self, session, location):
+        """Attempt to move a session's ship to a new location"""
+        if session.user is None:
+            return
         try:
-            self.user.ship.location = self.magnate.markets[location]
+            session.user.ship.location = self.magnate.markets[location]
         except (ValueError, KeyError):
-            self.pubpen.publish('ship.movement_failure', 'Unknown destination')
+            session.pubpen.publish('ship.movement_failure', 'Unknown destination')
+            return
+        if self.magnate.journal is not None:
+            self.magnate.journal.record_move(session.user.username, location)
+        if session.session_id is not None:
+            # Markets only follow the unnamespaced ship.moved of the local player
+            self.markets[location].handle_movement(location)
+
+    def _fleets_cannot_move(self, session, failure):
+        """
+        Refuse a fleet action when the world does not tick
+
+        Fleets only fly and trade on :py:func:`world.tick`, which the game's
+        :class:`magnate.tick.PriceTicker` publishes.  Without one, fleets would never do anything.
+
+        :arg failure: Name of the failure event to publish
+        :returns: True if the action was refused
+        """
+        if self.magnate.price_ticker is not None:
+            return False
+        session.pubpen.publish(failure, 'Fleets need the world to tick.  Set price_tick_interval'
+                               ' in the configuration')
+        return True
+
+    def _create_fleet(self, session, name):
+        """
+        Create an empty fleet for a session's user
+
+        :arg name: Name of the new fleet
+        :event fleet.create_failure: Emitted when the fleet could not be created
+        :event fleet.{name}.info: Emitted with the new fleet's summary when it was created
+        """
+        user = session.user
+        if user is None or self._fleets_cannot_move(session, 'fleet.create_failure'):
+            return
+        if not isinstance(name, str) or not name or '.' in name:
+            session.pubpen.publish('fleet.create_failure', 'Invalid fleet name')
+            return
+        try:
+            fleet = self.magnate.create_fleet(name, user)
+        except ValueError as e:
+            session.pubpen.publish('fleet.create_failure', str(e))
+            return
+        fleet.handle_fleet_info()
+
+    def _buy_ships(self, session, name, ship_type, count=1):
+        """
+        Buy ships for one of a session's user's fleets
+
+        The ships are delivered to the location of the user's own ship.
+
+        :arg name: Name of the fleet
+        :arg ship_type: Type of ship to buy
+        :kwarg count: Number of ships to buy
+        :event fleet.purchase_failure: Emitted when the ships could not be bought
+        :event fleet.{name}.info: Emitted with the fleet's summary when the ships were bought
+        """
+        user = session.user
+        if user is None or self._fleets_cannot_move(session, 'fleet.purchase_failure'):
+            return
+        pubpen = session.pubpen
+        fleet = user.fleets.get(name) if isinstance(name, str) else None
+        if fleet is None:
+            pubpen.publish('fleet.purchase_failure', 'Unknown fleet')
             return
+        ship_data = self.magnate.ship_data.get(ship_type) if isinstance(ship_type, str) else None
+        if ship_data is None:
+            pubpen.publish('fleet.purchase_failure', 'Unknown type of ship')
+            return
+        if not isinstance(count, int) or isinstance(count, bool) or count <= 0:
+            pubpen.publish('fleet.purchase_failure', 'The number of ships must be positive')
+            return
+
+        ### FIXME: Ships are sold at their mean price until there is a market for them
+        total_price = ship_data.mean_price * count
+        if total_price > user.cash:
+            pubpen.publish('fleet.purchase_failure',
+                           "Total price of the ships exceeds the user's cash")
+            return
+
+        user.cash -= total_price
+        fleet.add_ships(ship_data, user.ship.location.name, count)
+        fleet.handle_fleet_info()
+
+    def _fleet_order(self, session, name, commodity, buy_at, sell_at):
+        """
+        Give one of a session's user's fleets a standing trade order
+
+        :arg name: Name of the fleet
+        :arg commodity: Name of the commodity to trade
+        :arg buy_at: Location to buy the commodity at
+        :arg sell_at: Location to sell the commodity at
+        :event fleet.order_failure: Emitted when the order could not be given
+        """
+        user = session.user
+        if user is None or self._fleets_cannot_move(session, 'fleet.order_failure'):
+            return
+        fleet = user.fleets.get(name) if isinstance(name, str) else None
+        if fleet is None:
+            session.pubpen.publish('fleet.order_failure', 'Unknown fleet')
+            return
+        try:
+            order = TradeOrder(commodity, buy_at, sell_at)
+        except TypeError:
+            session.pubpen.publish('fleet.order_failure', 'Invalid trade order')
+            return
+        try:
+            fleet.give_order(order)
+        except ValueError as e:
+            session.pubpen.publish('fleet.order_failure', str(e))
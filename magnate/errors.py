@@ -41,3 +41,13 @@ class MagnateNoSaveGame(MagnateSaveError):
 class MagnateInvalidSaveGame(MagnateSaveError):
     """Raised when a save game file is invalid"""
     pass
+
+
+class MagnateInvalidJournal(MagnateSaveError):
+    """Raised when an order journal has a complete record which cannot be read"""
+    pass
+
+
+class MagnateAuthError(MagnateError):
+    """Raised when player credentials cannot be stored"""
+    pass
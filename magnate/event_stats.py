@@ -0,0 +1,211 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Collect statistics about the events passing through the :class:`pubmarine.PubPen`
+
+This is opt-in (see the ``event_stats`` config option) as timing every handler adds overhead to
+every event.
+"""
+import bisect
+from collections import defaultdict
+from functools import partial
+from time import perf_counter
+
+import attr
+from pubmarine import EventNotFoundError, PubPen
+
+from .logging import log
+
+
+mlog = log.fields(mod=__name__)
+
+#: Default number of milliseconds a handler may run before it is logged as slow
+DEFAULT_BUDGET = 5.0
+
+#: Upper bounds (in milliseconds) of the buckets in the handler latency histograms.  The last bucket
+#: holds everything slower than the last bound.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100)
+
+
+def _handler_name(func):
+    """Return a human readable name for an event handler"""
+    while isinstance(func, partial):
+        func = func.func
+    return getattr(func, '__qualname__', repr(func))
+
+
+@attr.s
+class TopicStats:
+    """
+    Statistics about a single event
+
+    :publishes: Number of times the event was published
+    :deliveries: Total number of handlers invoked for the event
+    :max_fanout: Largest number of handlers invoked for a single publish
+    :subscriptions: Number of times something subscribed to the event
+    """
+    publishes = attr.ib(default=0)
+    deliveries = attr.ib(default=0)
+    max_fanout = attr.ib(default=0)
+    subscriptions = attr.ib(default=0)
+
+    @property
+    def mean_fanout(self):
+        """Average number of handlers invoked per publish"""
+        if not self.publishes:
+            return 0.0
+        return self.deliveries / self.publishes
+
+
+@attr.s
+class HandlerStats:
+    """
+    Timing statistics for one handler of one event
+
+    :calls: Number of times the handler was invoked
+    :total_time: Seconds spent in the handler
+    :max_time: Longest single invocation in seconds
+    :slow_calls: Number of invocations which went over budget
+    :histogram: Count of invocations in each of the :data:`LATENCY_BUCKETS`
+    """
+    calls = attr.ib(default=0)
+    total_time = attr.ib(default=0.0)
+    max_time = attr.ib(default=0.0)
+    slow_calls = attr.ib(default=0)
+    histogram = attr.ib(default=attr.Factory(lambda: [0] * (len(LATENCY_BUCKETS) + 1)))
+
+    def record(self, elapsed, slow=False):
+        """Record one invocation which took elapsed seconds"""
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if slow:
+            self.slow_calls += 1
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, elapsed * 1000)] += 1
+
+
+class InstrumentedPubPen(PubPen):
+    """
+    A :class:`pubmarine.PubPen` which records what passes through it
+
+    It keeps count of how often each event is published and how many handlers each publish reaches,
+    and times each invocation of a handler.  Handlers that take longer than the budget are logged.
+
+    The statistics can be requested while the game is running by publishing
+    ``query.debug.event_stats``.
+
+    .. note:: Publishes made through a :class:`magnate.events.Publisher` are only counted if
+        something is subscribed to the event.
+    """
+    def __init__(self, loop, event_list=None, budget=DEFAULT_BUDGET):
+        """
+        :arg loop: Event loop (asyncio compatible) to use.
+        :kwarg event_list: If given, the list of allowed event names
+        :kwarg budget: Number of milliseconds a handler can run before it is logged as slow
+        """
+        super().__init__(loop, event_list=event_list)
+        self.budget = budget / 1000
+        self.topics = defaultdict(TopicStats)
+        self.handlers = defaultdict(HandlerStats)
+
+        self.subscribe('query.debug.event_stats', self.handle_event_stats)
+
+    def subscribe(self, event, callback):
+        sub_id = super().subscribe(event, callback)
+        self.topics[event].subscriptions += 1
+        return sub_id
+
+    def publish(self, event, *args, **kwargs):
+        if self._event_list and event not in self._event_list:
+            raise EventNotFoundError('{} is not a registered event'.format(event))
+
+        stats = self.topics[event]
+        stats.publishes += 1
+
+        handlers = self._event_handlers.get(event)
+        if not handlers:
+            return
+
+        fanout = 0
+        removed_sub_ids = []
+        for sub_id, handler in handlers.items():
+            func = handler()
+            if func is None:
+                removed_sub_ids.append(sub_id)
+                continue
+            fanout += 1
+            self.loop.call_soon(self._timed_call, event, func, args, kwargs)
+
+        stats.deliveries += fanout
+        if fanout > stats.max_fanout:
+            stats.max_fanout = fanout
+
+        for sub_id in removed_sub_ids:
+            del handlers[sub_id]
+            self._subscriptions.pop(sub_id, None)
+
+    def _timed_call(self, event, func, args, kwargs):
+        """Invoke an event handler, recording how long it takes"""
+        start = perf_counter()
+        try:
+            func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            name = _handler_name(func)
+            slow = elapsed > self.budget
+            self.handlers[(event, name)].record(elapsed, slow=slow)
+            if slow:
+                mlog.fields(event=event, handler=name,
+                            ms=round(elapsed * 1000, 3)).warning('Event handler exceeded budget')
+
+    def summary(self):
+        """
+        Return the collected statistics as text
+
+        Events are sorted by number of publishes and handlers by the total time spent in them.
+        """
+        lines = ['Events:', '  {:>8} {:>7} {:>6}  event'.format('publish', 'fanout', 'max')]
+        for event, stats in sorted(self.topics.items(), key=lambda t: t[1].publishes,
+                                   reverse=True):
+            if not stats.publishes:
+                continue
+            lines.append('  {:>8} {:>7.2f} {:>6}  {}'.format(stats.publishes, stats.mean_fanout,
+                                                            stats.max_fanout, event))
+
+        lines.append('Handlers:')
+        lines.append('  {:>8} {:>10} {:>9} {:>9} {:>5}  handler [event]'.format(
+            'calls', 'total ms', 'mean ms', 'max ms', 'slow'))
+        for (event, name), stats in sorted(self.handlers.items(),
+                                           key=lambda h: h[1].total_time, reverse=True):
+            lines.append('  {:>8} {:>10.3f} {:>9.3f} {:>9.3f} {:>5}  {} [{}]'.format(
+                stats.calls, stats.total_time * 1000, stats.total_time * 1000 / stats.calls,
+                stats.max_time * 1000, stats.slow_calls, name, event))
+
+        return '\n'.join(lines)
+
+    def log_summary(self):
+        """Write the collected statistics to the log"""
+        mlog.info('Event statistics:\n{}', self.summary())
+
+    def handle_event_stats(self):
+        """
+        Log the event statistics and publish them
+
+        :event debug.event_stats: Published with the statistics gathered so far
+        """
+        self.log_summary()
+        self.publish('debug.event_stats', dict(self.topics), dict(self.handlers))
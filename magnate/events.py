@@ -0,0 +1,104 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Helpers for publishing events on a :class:`pubmarine.PubPen` efficiently
+
+Many of our events have the name of a location or other game object embedded in the event name
+(``market.{location}.update``).  Building those strings every time the event is published and then
+having the PubPen hash them to look up the subscribers adds up in code that publishes often.  This
+module lets the event names be constructed once, when the publishing object is set up, and then
+reused.
+"""
+import sys
+from functools import lru_cache
+
+from pubmarine import EventNotFoundError
+
+
+@lru_cache(maxsize=1024)
+def topic(template, *args):
+    """
+    Return the interned name of an event
+
+    :arg template: A :meth:`str.format` template for the event name.  For instance,
+        ``'market.{}.update'``
+    :arg args: Values to substitute into the template
+    :returns: The event name.  The same string object is returned each time the same event name is
+        requested so comparing event names is an identity check rather than a string comparison.
+    """
+    return sys.intern(template.format(*args))
+
+
+class Publisher:
+    """
+    Callable which publishes a single event
+
+    Create one of these when an object is set up and then call it instead of
+    :meth:`pubmarine.PubPen.publish`.  When nothing is subscribed to the event, calling the
+    Publisher returns immediately without constructing the callbacks.
+
+    .. note:: This relies on :class:`pubmarine.PubPen` storing the subscribers of an event in
+        a dictionary which lives for as long as the PubPen.
+    """
+    __slots__ = ('pubpen', 'event', '_handlers')
+
+    def __init__(self, pubpen, event):
+        """
+        :arg pubpen: The :class:`pubmarine.PubPen` to publish on
+        :arg event: The name of the event to publish
+        :raises pubmarine.EventNotFoundError: if the PubPen restricts the events that may be
+            published and this event is not one of them.
+        """
+        # A magnate.session.ScopedPubPen renames a player's events.  Publish the renamed event
+        # straight to the PubPen it wraps.
+        scope = getattr(pubpen, 'scope', None)
+        if scope is not None:
+            event = scope(event)
+            pubpen = pubpen.pubpen
+
+        # pylint: disable=protected-access
+        if pubpen._event_list and event not in pubpen._event_list:
+            raise EventNotFoundError('{} is not a registered event'.format(event))
+
+        self.pubpen = pubpen
+        self.event = sys.intern(event)
+        self._handlers = pubpen._event_handlers[self.event]
+        # pylint: enable=protected-access
+
+    def __call__(self, *args, **kwargs):
+        """Publish the event with the given arguments if anything is subscribed to it"""
+        if self._handlers:
+            self.pubpen.publish(self.event, *args, **kwargs)
+
+    def __repr__(self):
+        return '<Publisher {}>'.format(self.event)
+
+    @property
+    def has_subscribers(self):
+        """True if anything is subscribed to the event"""
+        return bool(self._handlers)
+
+
+def publisher(pubpen, template, *args):
+    """
+    Create a :class:`Publisher` for an event
+
+    :arg pubpen: The :class:`pubmarine.PubPen` to publish on
+    :arg template: A :meth:`str.format` template for the event name
+    :arg args: Values to substitute into the template
+    :returns: A :class:`Publisher` for the event
+    """
+    return Publisher(pubpen, topic(template, *args))
@@ -0,0 +1,307 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Fleets of ships which trade on their own
+
+A :class:`Fleet` does not create a :class:`magnate.ship.Ship` for each of its ships.  Instead, it
+stores each attribute of its ships in one array with an entry per ship: the location, the hold
+space, the filled hold, and the quantity and price paid of each cargo commodity.  A ship is just an
+index into those arrays.
+
+A fleet is given a standing order which it carries out once every :py:func:`world.tick`.  All of the
+ships are handled in a single pass over the arrays and the owner's cash is changed once for the
+whole fleet, so a fleet of any size is a handful of Python objects and event subscriptions.
+
+Ships fly between markets along the routes of the game's :class:`magnate.travel.TravelGraph`,
+covering :data:`SPEED` of distance each tick.  A ship only trades while it is docked.
+"""
+from array import array
+
+import attr
+
+from .events import publisher, topic
+from .market import CommodityType
+from .ship import ManifestEntry
+
+
+#: Distance a ship flies in one tick
+SPEED = 1
+
+
+@attr.s(frozen=True)
+class TradeOrder:
+    """
+    Standing order to carry one commodity between two markets
+
+    Empty ships fly to buy_at and fill their hold with the commodity.  Loaded ships fly to
+    sell_at and sell all of it.
+
+    :commodity: Name of the commodity to trade
+    :buy_at: Location to buy the commodity at
+    :sell_at: Location to sell the commodity at
+    """
+    commodity = attr.ib(validator=attr.validators.instance_of(str))
+    buy_at = attr.ib(validator=attr.validators.instance_of(str))
+    sell_at = attr.ib(validator=attr.validators.instance_of(str))
+
+
+class Fleet:
+    """
+    A group of ships which are given orders together
+    """
+    def __init__(self, magnate, name, owner, pubpen=None):
+        """
+        :arg magnate: The :class:`magnate.magnate.Magnate` which owns the markets and the
+            travel graph
+        :arg name: Name of the fleet.  This is used in the fleet's event topics
+        :arg owner: The :class:`magnate.magnate.User` whose cash the fleet trades with
+        :kwarg pubpen: The PubPen for the fleet's events.  Defaults to the magnate's PubPen
+        """
+        self.pubpen = magnate.pubpen if pubpen is None else pubpen
+        self.markets = magnate.markets
+        self.name = name
+        self.owner = owner
+        self.order = None
+
+        self.locations = list(self.markets)
+        self._location_idx = {location: idx for idx, location in enumerate(self.locations)}
+        #: _distances[location][other] is the distance between two markets or -1 if there is no
+        #: route between them
+        self._distances = []
+        for location in self.locations:
+            distances = (magnate.travel_graph.distance(location, other)
+                         for other in self.locations)
+            self._distances.append(array('q', (-1 if d is None else d for d in distances)))
+
+        self.commodities = []
+        hold_space = []
+        for market in self.markets.values():
+            for commodity in market.commodities.values():
+                if CommodityType.cargo in commodity.type and \
+                        commodity.name not in self.commodities:
+                    self.commodities.append(commodity.name)
+                    hold_space.append(commodity.hold_space)
+        self._commodity_idx = {name: idx for idx, name in enumerate(self.commodities)}
+        #: Hold space taken by one unit of each commodity
+        self.hold_space = array('q', hold_space)
+
+        #: The ShipData of each type of ship in the fleet
+        self.ship_types = []
+        #: One entry per ship.  Index into ship_types
+        self.ship_type = array('q')
+        #: One entry per ship.  Index into locations of where the ship is docked or, while it is
+        #: flying, where it left from
+        self.location = array('q')
+        #: One entry per ship.  Index into locations of where the ship is flying to
+        self.destination = array('q')
+        #: One entry per ship.  Distance left to fly.  0 when the ship is docked
+        self.remaining = array('q')
+        #: One entry per ship.  Total hold space of the ship
+        self.holdspace = array('q')
+        #: One entry per ship.  Hold space used by cargo
+        self.filled_hold = array('q')
+        #: cargo[commodity][ship] is the quantity of a commodity in the hold
+        self.cargo = [array('q') for _ in self.commodities]
+        #: price_paid[commodity][ship] is the average price paid for the commodity in the hold
+        self.price_paid = [array('d') for _ in self.commodities]
+
+        self._publish_info = publisher(self.pubpen, 'fleet.{}.info', name)
+        self._publish_traded = publisher(self.pubpen, 'fleet.{}.traded', name)
+
+        self._sub_ids = [
+            self.pubpen.subscribe(topic('query.fleet.{}.info', name), self.handle_fleet_info),
+            self.pubpen.subscribe('world.tick', self.handle_tick),
+        ]
+
+    def __len__(self):
+        return len(self.location)
+
+    def close(self):
+        """Stop responding to events"""
+        for sub_id in self._sub_ids:
+            self.pubpen.unsubscribe(sub_id)
+        self._sub_ids = []
+
+    def add_ships(self, ship_data, location, count=1):
+        """
+        Add new ships to the fleet
+
+        :arg ship_data: The :class:`magnate.ship.ShipData` for the type of ship
+        :arg location: Name of the location the ships start at
+        :kwarg count: Number of ships to add
+        :returns: range of the indexes of the new ships
+        """
+        try:
+            type_idx = self.ship_types.index(ship_data)
+        except ValueError:
+            type_idx = len(self.ship_types)
+            self.ship_types.append(ship_data)
+
+        first = len(self)
+        self.ship_type.extend([type_idx] * count)
+        location_idx = self._location_idx[location]
+        self.location.extend([location_idx] * count)
+        self.destination.extend([location_idx] * count)
+        self.remaining.extend([0] * count)
+        self.holdspace.extend([ship_data.holdspace] * count)
+        self.filled_hold.extend([0] * count)
+        for cargo in self.cargo:
+            cargo.extend([0] * count)
+        for price_paid in self.price_paid:
+            price_paid.extend([0.0] * count)
+        return range(first, len(self))
+
+    def manifest(self, ship):
+        """
+        Return what one ship is carrying
+
+        :arg ship: Index of the ship
+        :returns: dict mapping commodity names to :class:`magnate.ship.ManifestEntry`
+        """
+        return {name: ManifestEntry(name, self.cargo[idx][ship], self.price_paid[idx][ship])
+                for idx, name in enumerate(self.commodities) if self.cargo[idx][ship]}
+
+    def give_order(self, order):
+        """
+        Set the standing order for the fleet
+
+        :arg order: A :class:`TradeOrder` or None to stop trading
+        :raises ValueError: when the order names an unknown commodity or location or there is no
+            route between its locations
+        """
+        if order is not None:
+            if order.commodity not in self._commodity_idx:
+                raise ValueError('Fleets cannot trade {}'.format(order.commodity))
+            for location in (order.buy_at, order.sell_at):
+                if location not in self._location_idx:
+                    raise ValueError('Unknown location: {}'.format(location))
+            if self._distances[self._location_idx[order.buy_at]][
+                    self._location_idx[order.sell_at]] < 0:
+                raise ValueError('No route from {} to {}'.format(order.buy_at, order.sell_at))
+        self.order = order
+
+    def tick(self):
+        """
+        Move the fleet's ships and carry out the standing order
+
+        Ships which are flying get :data:`SPEED` closer to their destination and dock when they
+        reach it.  Docked ships sell at sell_at and buy at buy_at.  Then every docked ship which is
+        not where it should be sets off: loaded ships to sell_at and empty ones to buy_at.
+
+        :event fleet.{name}.traded: Emitted when the fleet bought or sold anything
+            :arg int bought: Quantity bought
+            :arg int sold: Quantity sold
+            :arg int profit: Change in the owner's cash
+        """
+        location = self.location
+        destination = self.destination
+        remaining = self.remaining
+        for ship, left in enumerate(remaining):
+            if left:
+                left = max(0, left - SPEED)
+                remaining[ship] = left
+                if not left:
+                    location[ship] = destination[ship]
+
+        order = self.order
+        if order is None or not len(self):
+            return
+
+        com_idx = self._commodity_idx[order.commodity]
+        buy_idx = self._location_idx[order.buy_at]
+        sell_idx = self._location_idx[order.sell_at]
+        unit_space = self.hold_space[com_idx]
+        cargo = self.cargo[com_idx]
+        price_paid = self.price_paid[com_idx]
+        filled_hold = self.filled_hold
+        ship_ids = range(len(self))
+
+        # Sell everything that the ships at sell_at are carrying
+        sellers = [ship for ship, docked_at, left, quantity
+                   in zip(ship_ids, location, remaining, cargo)
+                   if docked_at == sell_idx and not left and quantity]
+        sold = 0
+        for ship in sellers:
+            sold += cargo[ship]
+            filled_hold[ship] -= cargo[ship] * unit_space
+            cargo[ship] = 0
+            price_paid[ship] = 0.0
+        revenue = sold * self.markets[order.sell_at].commodities[order.commodity].price
+
+        # Fill the holds of the ships at buy_at for as long as the money lasts
+        buy_price = self.markets[order.buy_at].commodities[order.commodity].price
+        cash = self.owner.cash + revenue
+        affordable = cash // buy_price if buy_price > 0 else 0
+        bought = 0
+        if affordable:
+            for ship, docked_at, left, space, used in zip(ship_ids, location, remaining,
+                                                          self.holdspace, filled_hold):
+                if docked_at != buy_idx or left:
+                    continue
+                quantity = (space - used) // unit_space if unit_space else affordable
+                quantity = min(quantity, affordable - bought)
+                if quantity <= 0:
+                    continue
+                price_paid[ship] = (price_paid[ship] * cargo[ship] + buy_price * quantity) \
+                    / (cargo[ship] + quantity)
+                cargo[ship] += quantity
+                filled_hold[ship] += quantity * unit_space
+                bought += quantity
+                if bought >= affordable:
+                    break
+        cost = bought * buy_price
+
+        # Loaded ships set off to sell and empty ones to buy
+        for ship, docked_at, left, quantity in zip(ship_ids, location, remaining, cargo):
+            if left:
+                continue
+            target = sell_idx if quantity else buy_idx
+            distance = self._distances[docked_at][target]
+            if distance > 0:
+                destination[ship] = target
+                remaining[ship] = distance
+
+        if sold or bought:
+            # market.{location}.purchased and .sold are not published because the user's order
+            # dialogs take them as confirmation of the user's own orders
+            self.owner.cash = cash - cost
+            self._publish_traded(bought, sold, revenue - cost)
+
+    def handle_tick(self, tick_count):
+        """Carry out the standing order once per tick"""
+        self.tick()
+
+    def handle_fleet_info(self):
+        """
+        Publish a summary of the fleet
+
+        :event fleet.{name}.info: The summary
+            :arg int ships: Number of ships in the fleet
+            :arg dict locations: Mapping of location name to the number of ships docked there
+            :arg int flying: Number of ships which are flying between locations
+            :arg dict cargo: Mapping of commodity name to the quantity carried by the fleet
+        """
+        counts = [0] * len(self.locations)
+        flying = 0
+        for location, left in zip(self.location, self.remaining):
+            if left:
+                flying += 1
+            else:
+                counts[location] += 1
+        locations = {self.locations[idx]: count for idx, count in enumerate(counts) if count}
+        cargo = {name: sum(self.cargo[idx]) for idx, name in enumerate(self.commodities)
+                 if any(self.cargo[idx])}
+        self._publish_info(len(self), locations, flying, cargo)
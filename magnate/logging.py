@@ -15,9 +15,22 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 :mod:`logging` holds a twiggy Logger object which controls logging for the application
+
+Binding fields to a twiggy logger copies the logger and its fields each time, whether or not the
+message it is used for is written.  Code which runs often (validators, per-item loops) should log
+through :data:`lazy_log` instead.  It has the same ``fields().debug()`` interface but does nothing
+until a message at that level would be written somewhere::
+
+    mlog = lazy_log.fields(mod=__name__)
+    mlog.fields(value=value, data=partial(pprint.pformat, data)).debug('validating')
+
+twiggy calls field values which are callable when it writes the message so expensive values can be
+passed as a :func:`functools.partial` to only compute them when they are needed.  (This also
+means that classes and other callables have to be logged by name.)
 """
 
 import twiggy
+from twiggy import levels
 
 
 # Temporarily setup twiggy logging with defaults until we can get real configuration.
@@ -28,5 +41,104 @@ twiggy.quick_setup()
 #: the name, the module name is in the `mod` field.
 log = twiggy.log.name('stellarmagnate.magnate')
 
+
+def enabled_for(level, logger=log):
+    """
+    Return whether a message would be written anywhere
+
+    The emitters are checked each time as :func:`twiggy.dict_config` can replace them at any time.
+
+    :arg level: A :mod:`twiggy.levels` level
+    :kwarg logger: The twiggy logger the message would be sent through
+    :returns: True if some emitter would write a message at this level
+    """
+    if level < logger.min_level:
+        return False
+    for emitter in logger._emitters.values():  # pylint: disable=protected-access
+        if level >= emitter.min_level:
+            return True
+    return False
+
+
+class LazyLogger:
+    """
+    Logger which only binds fields for messages at levels that are being written
+
+    Binding fields records them without copying anything.  They are given to the twiggy logger
+    only when a message is emitted at an enabled level.
+    """
+    __slots__ = ('_logger', '_parent', '_fields')
+
+    def __init__(self, logger, parent=None, fields=None):
+        """
+        :arg logger: The twiggy logger to send messages through
+        :kwarg parent: The :class:`LazyLogger` this one added fields to
+        :kwarg fields: Fields added by this logger
+        """
+        self._logger = logger
+        self._parent = parent
+        self._fields = fields
+
+    def fields(self, **kwargs):
+        """Bind fields for structured logging"""
+        return LazyLogger(self._logger, self, kwargs)
+
+    def enabled_for(self, level):
+        """Return whether a message at level would be written.  See :func:`enabled_for`"""
+        return enabled_for(level, self._logger)
+
+    def _bound_fields(self):
+        """Return the fields of this logger and its parents"""
+        chain = []
+        node = self
+        while node is not None:
+            if node._fields:
+                chain.append(node._fields)
+            node = node._parent
+
+        fields = {}
+        for node_fields in reversed(chain):
+            fields.update(node_fields)
+        return fields
+
+    def _emit(self, method, format_spec, args, kwargs):
+        """Send a message to the twiggy logger with the bound fields"""
+        logger = self._logger.fields_dict(self._bound_fields())
+        getattr(logger, method)(format_spec, *args, **kwargs)
+
+    def debug(self, format_spec='', *args, **kwargs):
+        """Log a message at DEBUG level"""
+        if enabled_for(levels.DEBUG, self._logger):
+            self._emit('debug', format_spec, args, kwargs)
+
+    def info(self, format_spec='', *args, **kwargs):
+        """Log a message at INFO level"""
+        if enabled_for(levels.INFO, self._logger):
+            self._emit('info', format_spec, args, kwargs)
+
+    def notice(self, format_spec='', *args, **kwargs):
+        """Log a message at NOTICE level"""
+        if enabled_for(levels.NOTICE, self._logger):
+            self._emit('notice', format_spec, args, kwargs)
+
+    def warning(self, format_spec='', *args, **kwargs):
+        """Log a message at WARNING level"""
+        if enabled_for(levels.WARNING, self._logger):
+            self._emit('warning', format_spec, args, kwargs)
+
+    def error(self, format_spec='', *args, **kwargs):
+        """Log a message at ERROR level"""
+        if enabled_for(levels.ERROR, self._logger):
+            self._emit('error', format_spec, args, kwargs)
+
+    def critical(self, format_spec='', *args, **kwargs):
+        """Log a message at CRITICAL level"""
+        if enabled_for(levels.CRITICAL, self._logger):
+            self._emit('critical', format_spec, args, kwargs)
+
+
+#: The magnate log for code which runs often.  See :class:`LazyLogger`
+lazy_log = LazyLogger(log)
+
 mlog = log.fields(mod=__name__)
 mlog.debug('logging loaded')
@@ -35,13 +35,26 @@ try:
 except ImportError:
     from yaml import Loader
 
+from .auth import create_auth_provider
+from .codec import game_names
 from .config import read_config
 from .dispatcher import Dispatcher
+from .event_stats import InstrumentedPubPen
+from .events import publisher
+from .fleet import Fleet
 from .logging import log
 from .market import CommodityData, LocationData, SystemData
 from .market import Commodity, Market
+from .memory import MemoryProfiler, start_tracing
+from .price_history import PriceHistory
+from .profiler import CPUProfiler
 from .release import __version__
+from .replay import Recorder
+from .savegame.journal import OrderJournal
+from .rng import RandomSource
 from .ship import ShipData, Ship
+from .tick import PriceTicker
+from .travel import TravelGraph
 from .ui.api import UserInterface
 #from .user import User
 
@@ -56,6 +69,9 @@ class User:
         self.username = username
         self._cash = 500
         self.ship = None
+        self.fleets = OrderedDict()
+
+        self._publish_cash_update = publisher(self.pubpen, 'user.cash.update')
 
         self.pubpen.subscribe('query.user.info', self.handle_user_info)
 
@@ -84,7 +100,7 @@ class User:
 
         old_cash = self._cash
         self._cash = new_cash
-        self.pubpen.publish('user.cash.update', new_cash, old_cash)
+        self._publish_cash_update(new_cash, old_cash)
 
 
 def _parse_args(args=tuple(sys.argv)):
@@ -98,6 +114,17 @@ def _parse_args(args=tuple(sys.argv)):
                         ' arguments conflict with stellar magnate arguments.  Specify this for each extra arg')
     parser.add_argument('--use-uvloop', dest='uvloop', action='store_true', default=False,
                         help='Enable use of uvloop instead of the default asyncio event loop.')
+    parser.add_argument('--world-seed', dest='world_seed', action='store', type=int, default=None,
+                        help='Seed for the random numbers used by the game.  Use this to'
+                        ' reproduce a previous game')
+    parser.add_argument('--event-stats', dest='event_stats', action='store_true', default=False,
+                        help='Record statistics about events and log event handlers which are slow')
+    parser.add_argument('--profile-memory', dest='profile_memory', action='store_true',
+                        default=False,
+                        help='Trace memory allocations and log the memory used by each module')
+    parser.add_argument('--record', dest='record_session', action='store', default=None,
+                        help='Record the world seed and the players\' actions to this file so the'
+                        ' game can be replayed with magnate-replay')
     parser.add_argument('--_testing-configuration', dest='test_cfg', action='store_true',
                         help='Overrides data file locations for running from a source checkout.'
                              ' For development only')
@@ -140,6 +167,18 @@ class Magnate:
         if args.uvloop:
             self.cfg['use_uvloop'] = True
 
+        if args.world_seed is not None:
+            self.cfg['world_seed'] = args.world_seed
+
+        if args.event_stats:
+            self.cfg['event_stats'] = True
+
+        if args.profile_memory:
+            self.cfg['profile_memory'] = True
+
+        if args.record_session:
+            self.cfg['record_session'] = args.record_session
+
         if args.ui_plugin:
             self.cfg['ui_plugin'] = args.ui_plugin
 
@@ -150,6 +189,15 @@ class Magnate:
         #
         self.pubpen = None
         self.dispatcher = None
+        self.auth = None
+        self.journal = None
+        self.recorder = None
+        self.memory_profiler = None
+        self.cpu_profiler = None
+        self.random_source = None
+        self.price_history = None
+        self.price_ticker = None
+        self.travel_graph = None
 
         # Instantiated attributes
         self.user = None
@@ -177,9 +225,15 @@ class Magnate:
             self.system_data[system['name']] = SystemData(system['name'], None)
 
             locations = OrderedDict()
-            for loc in system['location']:
-                locations[loc['name']] = LocationData(loc['name'], loc['type'], self.system_data[system['name']])
+            # The locations are listed outwards from the star so their position is their orbit
+            for orbit, loc in enumerate(system['location']):
+                locations[loc['name']] = LocationData(loc['name'], loc['type'],
+                                                      self.system_data[system['name']], orbit)
             self.system_data[system['name']].locations = locations
+        self.travel_graph = TravelGraph.from_systems(self.system_data)
+        for system in self.system_data.values():
+            for loc in system.locations.values():
+                loc.destinations = self.travel_graph.destinations(loc.name)
 
         # Commodities are anything that may be bought or sold at a particular
         # location.  The UI may separate these out into separate pieces.
@@ -225,9 +279,17 @@ class Magnate:
                                            ship['weaponmount'])
         self.ship_data = ships
 
+    @property
+    def journal_path(self):
+        """Path of the order journal set in the config or None if trades are not journaled"""
+        if not self.cfg['order_journal']:
+            return None
+        return os.path.expanduser(self.cfg['order_journal'])
+
     def _load_save(self):
         """Load a save file"""
-        ### FIXME: Need to load game from save file
+        ### FIXME: Need to load game from save file.  Pass journal=self.journal_path to
+        # magnate.savegame.load.init_game() so the journal this game writes is the one replayed
         pass
 
     def _setup_markets(self):
@@ -239,42 +301,129 @@ class Magnate:
             market = Market(self, loc, commodities)
             self.markets[loc.name] = market
 
-    def create_ship(self, ship_type, location):
+    def create_ship(self, ship_type, location, pubpen=None):
         """
         Create a new instance of a ship type
 
         :arg ship_type: The class name of the ship to create
+        :kwarg pubpen: The PubPen for the ship's events.  Defaults to the game's PubPen
         :return: a new :class:`magnate.ship.Ship`
         """
-        return Ship(self, self.ship_data[ship_type], self.markets[location])
+        return Ship(self, self.ship_data[ship_type], self.markets[location], pubpen=pubpen)
 
-    def login(self, username, password):
-        """Log a user into the game"""
+    def create_fleet(self, name, user=None):
+        """
+        Create a new, empty fleet for a user
 
-        if 'toshio' in username.lower():
-            # Game can begin in earnest now
-            self.user = User(self.pubpen, username)
-            self.user.ship = self.create_ship('Passenger', 'Earth')
+        :arg name: The name of the fleet
+        :kwarg user: The :class:`User` who owns the fleet.  Defaults to the local user
+        :return: a new :class:`magnate.fleet.Fleet`
+        :raises ValueError: when the user already has a fleet with that name
+        """
+        if user is None:
+            user = self.user
+        if name in user.fleets:
+            raise ValueError('A fleet named {} already exists'.format(name))
+        fleet = Fleet(self, name, user, pubpen=user.pubpen)
+        user.fleets[name] = fleet
+        return fleet
+
+    def login(self, username, pubpen=None):
+        """
+        Log a user into the game
 
-            self.pubpen.publish('user.login_success', username)
-            return self.user
-        else:
-            self.pubpen.publish('user.login_failure',
-                                'Unknown account: {}'.format(username))
+        The user's credentials must already have been checked by :attr:`auth`.
 
-    def run(self):
-        """
-        Run the program.  This is the main entrypoint to the magnate client
+        :arg username: User who logged in
+        :kwarg pubpen: The PubPen of the player's :class:`magnate.session.Session`.  If None, the
+            user is the local player and becomes :attr:`user`
+        :returns: The new :class:`User`
         """
+        session_pubpen = self.pubpen if pubpen is None else pubpen
+
+        # Game can begin in earnest now
+        user = User(session_pubpen, username)
+        user.ship = self.create_ship('Passenger', 'Earth', pubpen=pubpen)
+        if pubpen is None:
+            self.user = user
+
+        session_pubpen.publish('user.login_success', username)
+        return user
+
+    def setup(self):
+        """Create the state directory, start logging, and load the base game data"""
         # Create the statedir if it doesn't exist
         if not os.path.exists(self.cfg['state_dir']):
             os.makedirs(self.cfg['state_dir'])
 
         twiggy.dict_config(self.cfg['logging'])
 
+        if self.cfg['profile_memory']:
+            # Start before the game data is loaded so that it is accounted for
+            start_tracing()
+
         # Base data attributes
         self._load_data_definitions()
 
+    def start_backend(self, loop):
+        """
+        Create the game world and start responding to events
+
+        :arg loop: The asyncio event loop to run on
+        """
+        if self.cfg['event_stats']:
+            self.pubpen = InstrumentedPubPen(loop, budget=self.cfg['event_handler_budget'])
+        else:
+            self.pubpen = PubPen(loop)
+        if self.cfg['profile_memory']:
+            start_tracing()
+            self.memory_profiler = MemoryProfiler(self.pubpen,
+                                                  interval=self.cfg['memory_report_interval'])
+            self.memory_profiler.start()
+        self.cpu_profiler = CPUProfiler(self.pubpen, os.path.expanduser(self.cfg['state_dir']),
+                                        duration=self.cfg['profile_duration'])
+        self.cpu_profiler.install_signal_handler()
+        self.random_source = RandomSource(self.cfg['world_seed'], self.cfg['price_generator'])
+        self.auth = create_auth_provider(self.cfg)
+        if self.journal_path is not None:
+            self.journal = OrderJournal(self.journal_path, loop,
+                                        commit_delay=self.cfg['journal_commit_delay'])
+        if self.cfg['price_history_size']:
+            self.price_history = PriceHistory(self.cfg['price_history_size'])
+        self._setup_markets()
+        if self.cfg['record_session']:
+            self.recorder = Recorder(os.path.expanduser(self.cfg['record_session']),
+                                     self.random_source.world_seed, self.cfg['price_generator'],
+                                     game_names(self))
+        self.dispatcher = Dispatcher(self, self.markets)
+
+        if self.cfg['price_tick_interval']:
+            self.price_ticker = PriceTicker(self, self.markets, workers=self.cfg['tick_workers'])
+            self.price_ticker.start(self.cfg['price_tick_interval'])
+            if self.recorder is not None:
+                self.recorder.ticker = self.price_ticker
+
+    def stop_backend(self):
+        """Stop the parts of the backend which run on their own"""
+        if self.price_ticker is not None:
+            self.price_ticker.stop()
+        if self.journal is not None:
+            self.journal.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.memory_profiler is not None:
+            self.memory_profiler.stop()
+        if self.cpu_profiler is not None:
+            self.cpu_profiler.close()
+        if isinstance(self.pubpen, InstrumentedPubPen):
+            self.pubpen.log_summary()
+
+    def run(self):
+        """
+        Run the program.  This is the main entrypoint to the magnate client
+        """
+        self.setup()
+
         ui_plugins = load('magnate.ui', subclasses=UserInterface)
         for UIClass in ui_plugins:  #pylint: disable=invalid-name
             if UIClass.__module__.startswith('magnate.ui.{}'.format(self.cfg['ui_plugin'])):
@@ -295,9 +444,10 @@ class Magnate:
                 print('Could not set uvloop to be the event loop.  Falling back on asyncio event loop')
 
         loop = asyncio.get_event_loop()
-        self.pubpen = PubPen(loop)
-        self._setup_markets()
-        self.dispatcher = Dispatcher(self, self.markets)
+        if UIClass.needs_backend:  # pylint: disable=undefined-loop-variable
+            self.start_backend(loop)
+        else:
+            self.pubpen = PubPen(loop)
 
         # UIClass is always available because we'd have already returned (via
         # the for-else) if UIClass was not defined
@@ -307,3 +457,5 @@ class Magnate:
         except Exception as e:
             mlog.trace('error').error('Exception raised while running the user interface')
             raise
+        finally:
+            self.stop_backend()
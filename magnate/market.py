@@ -17,13 +17,14 @@
 Classes to model the Location and Markets in Stellar Magnate
 """
 
-from collections import abc
+import time
+from collections import OrderedDict, abc
 from enum import Enum
 from functools import partial
-import random
 
 import attr
 
+from .events import publisher, topic
 from .utils.attrs import (container_converter, container_validator,
                           enum_converter, enum_validator, sequence_of_type)
 
@@ -71,6 +72,137 @@ LocationType = Enum('LocationType', ('star', 'planet', 'moon',
 #pylint: enable=invalid-name
 
 
+def draw_price(rng, mean_price, std_dev, sale_adjustments, shortage_adjustments,
+               choose_percentage, price_decrease):
+    """
+    Draw a new price for a commodity
+
+    This is the pricing algorithm described in :meth:`Market._calculate_price`.  It only deals in
+    numbers so that it can be run away from the :class:`Market` objects (for instance, in another
+    process).
+
+    :arg rng: :class:`magnate.rng.RandomStream` to draw from
+    :arg mean_price: The average price of the commodity
+    :arg std_dev: One standard deviation of the price of the commodity
+    :arg sale_adjustments: Sequence of how far below the price range each of the commodity's sale
+        events drops the price
+    :arg shortage_adjustments: Sequence of how far above the price range each of the commodity's
+        shortage events raises the price
+    :arg choose_percentage: Number from 1-100 which selects the price band
+    :arg price_decrease: Whether the price is below the mean
+    :returns: A tuple of the new price, the type of event which set it, and the index of the event
+        in sale_adjustments or shortage_adjustments.  The event type is None for an ordinary price
+        change, ``sale`` or ``shortage`` for an event, or ``error`` if the commodity has no events
+        of the type that was chosen.
+    """
+    event_type = None
+    event_idx = 0
+    if choose_percentage >= 1 and choose_percentage <= 68:
+        adjustment = rng.randint(0, std_dev)
+    elif choose_percentage >= 69 and choose_percentage <= 95:
+        adjustment = rng.randint(std_dev, std_dev * 2)
+    else:
+        if price_decrease:
+            event_type = 'sale'
+            adjustments = sale_adjustments
+        else:
+            event_type = 'shortage'
+            adjustments = shortage_adjustments
+
+        if not adjustments:
+            event_type = 'error'
+            adjustment = 0
+        else:
+            if len(adjustments) > 1:
+                event_idx = rng.randint(0, len(adjustments) - 1)
+            adjustment = 2 * std_dev + adjustments[event_idx]
+
+    if price_decrease:
+        adjustment = -adjustment
+    price = mean_price + adjustment
+
+    # Make sure price has a minimum value of 1
+    if price < 1:
+        price = 1
+
+    return price, event_type, event_idx
+
+
+@attr.s
+class PriceEvent:
+    """
+    An event which pushes the price of a commodity outside of its normal range
+
+    :msg: Message telling the user what happened
+    :adjustment: How far beyond two standard deviations from the mean the event moves the price.
+        This is always positive.  Whether the price rises or falls depends on whether this is
+        a sale or a shortage.
+    """
+    msg = attr.ib(validator=attr.validators.instance_of(str))
+    adjustment = attr.ib(validator=attr.validators.instance_of(int))
+
+
+@attr.s
+class PriceEvents:
+    """
+    All of the events which can affect the price of a single commodity
+
+    These are resolved once, when the game data is loaded, so that pricing does not have to search
+    for applicable events.
+
+    :sales: Tuple of :class:`PriceEvent` which lower the price
+    :shortages: Tuple of :class:`PriceEvent` which raise the price
+    :sale_adjustments: Tuple of the adjustment of each of the sales
+    :shortage_adjustments: Tuple of the adjustment of each of the shortages
+    """
+    sales = attr.ib(default=(), convert=tuple)
+    shortages = attr.ib(default=(), convert=tuple)
+    sale_adjustments = attr.ib(init=False)
+    shortage_adjustments = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        self.sale_adjustments = tuple(e.adjustment for e in self.sales)
+        self.shortage_adjustments = tuple(e.adjustment for e in self.shortages)
+
+    @classmethod
+    def from_event_list(cls, events):
+        """
+        Create PriceEvents from the list of events in a commodity's data file entry
+
+        :arg events: List of dicts with ``type`` (``sale`` or ``shortage``), ``adjustment``, and
+            ``msg`` keys
+        """
+        sales = []
+        shortages = []
+        for event in events:
+            price_event = PriceEvent(event['msg'], abs(event['adjustment']))
+            if event['type'] == 'sale':
+                sales.append(price_event)
+            elif event['type'] == 'shortage':
+                shortages.append(price_event)
+        return cls(sales, shortages)
+
+    def get(self, event_type, event_idx):
+        """
+        Return one of the events
+
+        :arg event_type: ``sale`` or ``shortage``
+        :arg event_idx: Index of the event as returned by :func:`draw_price`
+        :returns: The :class:`PriceEvent` or None if there is no such event
+        """
+        if event_type == 'sale':
+            events = self.sales
+        elif event_type == 'shortage':
+            events = self.shortages
+        else:
+            return None
+
+        try:
+            return events[event_idx]
+        except IndexError:
+            return None
+
+
 @attr.s
 class CommodityData:
     """
@@ -85,6 +217,8 @@ class CommodityData:
         non-perishable goods
     :hold_space: How much hold space the item takes up
     :events: a list of special events that affect the pricing of this item
+    :price_events: :class:`PriceEvents` which affect the pricing of this item.  If not given, these
+        are created from events
     """
     name = attr.ib(validator=attr.validators.instance_of(str))
     type = attr.ib(validator=partial(container_validator, abc.Set,
@@ -98,6 +232,13 @@ class CommodityData:
     hold_space = attr.ib(convert=int, validator=attr.validators.instance_of(int))
     events = attr.ib(default=attr.Factory(list),
                      validator=attr.validators.optional(attr.validators.instance_of(list)))
+    price_events = attr.ib(default=None,
+                           validator=attr.validators.optional(
+                               attr.validators.instance_of(PriceEvents)))
+
+    def __attrs_post_init__(self):
+        if self.price_events is None:
+            self.price_events = PriceEvents.from_event_list(self.events or [])
 
 
 class Commodity:
@@ -142,11 +283,16 @@ class LocationData:
     :name: The name of the location
     :type: The type of location this is.  These can be any of :class:`LocationType`
     :system: The stellar system which the location is within
+    :orbit: Position from the system's primary.  Used to find the distance between locations
+    :destinations: Tuple of the names of the locations which a ship can travel to from here.  This
+        is set once, when the system is constructed, and shared by every ship at the location.
     """
     name = attr.ib(validator=attr.validators.instance_of(str))
     type = attr.ib(validator=partial(enum_validator, LocationType),
                    convert=partial(enum_converter, LocationType))
     system = attr.ib(validator=attr.validators.instance_of(SystemData))
+    orbit = attr.ib(default=0, validator=attr.validators.instance_of(int))
+    destinations = attr.ib(default=(), validator=attr.validators.instance_of(tuple))
 
     #def __attrs_post_init__(self, pubpen):
     #    pass
@@ -156,17 +302,50 @@ class Market:
     """
     Location at which :class:`Commodities` can be bought and sold.
     """
-    def __init__(self, magnate, location_data, commodity_data):
+    def __init__(self, magnate, location_data, commodity_data, rng=None, price_history=None):
+        """
+        :arg magnate: The :class:`magnate.magnate.Magnate` which owns this market
+        :arg location_data: The :class:`LocationData` for this market
+        :arg commodity_data: Mapping of commodity names to the :class:`Commodity` sold here
+        :kwarg rng: The :class:`magnate.rng.RandomStream` used to set prices.  Defaults to
+            a stream from the magnate's random_source
+        :kwarg price_history: The :class:`magnate.price_history.PriceHistory` to record prices in.
+            Defaults to the magnate's price_history.  If that is None, prices are not recorded.
+        """
         self.magnate = magnate
         self.pubpen = magnate.pubpen
         self.location = location_data
         self.commodities = commodity_data
+        if rng is None:
+            rng = magnate.random_source.stream('market', self.location.name)
+        self.rng = rng
+        if price_history is None:
+            price_history = magnate.price_history
+        self.price_history = price_history
 
         # Will be used for cyclic pricing
         #self.price_time = datetime.datetime.utcnow()
 
+        #: Increases by one every time a price in this market changes
+        self.version = 0
+        # Mapping of commodity name to the version at which its price last changed.  Ordered from
+        # the oldest change to the newest so the changes since a version are found without looking
+        # at the commodities which did not change.
+        self._changed_at = OrderedDict()
+
+        self._publish_info = publisher(self.pubpen, 'market.{}.info', self.location.name)
+        self._publish_changes = publisher(self.pubpen, 'market.{}.changes', self.location.name)
+        self._publish_update = publisher(self.pubpen, 'market.{}.update', self.location.name)
+        self._publish_event = publisher(self.pubpen, 'market.event')
+        self._publish_price_history = publisher(self.pubpen, 'market.{}.price_history',
+                                                self.location.name)
+
         self.recalculate_prices()
-        self.pubpen.subscribe('query.market.{}.info'.format(self.location.name), self.handle_market_info)
+        self.pubpen.subscribe(topic('query.market.{}.info', self.location.name), self.handle_market_info)
+        self.pubpen.subscribe(topic('query.market.{}.changes', self.location.name),
+                              self.handle_market_changes)
+        self.pubpen.subscribe(topic('query.market.{}.price_history', self.location.name),
+                              self.handle_price_history)
         self.pubpen.subscribe('ship.moved', self.handle_movement)
 
     def __getattr__(self, key):
@@ -180,9 +359,56 @@ class Market:
         Publish information about current prices
 
         :event market.{location}.info: Publishes the information about the
-            current prices in the market
+            current prices in the market and the market's :attr:`version`
+        """
+        self._publish_info(self.commodities, self.version)
+
+    def changes(self, since):
+        """
+        Return the prices which changed after a version
+
+        :arg since: A :attr:`version` of this market
+        :returns: OrderedDict mapping the name of each commodity whose price changed after since
+            to its current price.  If since is newer than the current version, every price is
+            returned.
+        """
+        if since > self.version:
+            return OrderedDict((name, commodity.price)
+                               for name, commodity in self.commodities.items())
+        changed = []
+        for name in reversed(self._changed_at):
+            if self._changed_at[name] <= since:
+                break
+            changed.append(name)
+        return OrderedDict((name, self.commodities[name].price) for name in reversed(changed))
+
+    def handle_market_changes(self, since):
+        """
+        Publish the prices which changed after a version
+
+        :arg since: The version from a previous :py:func:`market.{location}.info` or
+            :py:func:`market.{location}.changes` event
+        :event market.{location}.changes: Publishes the current :attr:`version` and the prices
+            returned by :meth:`changes`
+        """
+        self._publish_changes(self.version, self.changes(since))
+
+    def handle_price_history(self, commodity, num_buckets, start=None, end=None):
+        """
+        Publish a summary of the past prices of a commodity
+
+        :arg commodity: The name of the commodity
+        :arg num_buckets: Maximum number of buckets to summarize the prices into
+        :kwarg start: Earliest time to summarize.  Defaults to the oldest recorded price
+        :kwarg end: Latest time to summarize.  Defaults to the newest recorded price
+        :event market.{location}.price_history: Publishes the commodity name and a list of
+            :class:`magnate.price_history.PriceBucket`
         """
-        self.pubpen.publish('market.{}.info'.format(self.location.name), self.commodities)
+        buckets = []
+        if self.price_history is not None:
+            buckets = self.price_history.downsample(self.location.name, commodity, num_buckets,
+                                                    start, end)
+        self._publish_price_history(commodity, buckets)
 
     def handle_movement(self, new_location, *args):
         """Recalculate prices when the ship arrives at this location
@@ -194,14 +420,22 @@ class Market:
 
     def recalculate_prices(self):
         """Set new prices for all the commodities in the market"""
-        for commodity in self.commodities:
-            self._calculate_price(commodity)
-
-    def _calculate_price(self, commodity):
+        num_commodities = len(self.commodities)
+        percentages = self.rng.randints(1, 100, num_commodities)
+        decreases = self.rng.randints(0, 1, num_commodities)
+        for commodity, choose_percentage, price_decrease in zip(self.commodities, percentages,
+                                                                decreases):
+            self._calculate_price(commodity, choose_percentage, bool(price_decrease))
+
+    def _calculate_price(self, commodity, choose_percentage=None, price_decrease=None):
         """
         Calculates a new price for a commodity
 
         :arg commodity: The name of the commodity.
+        :kwarg choose_percentage: Number from 1-100 which selects the price band.  If None, one is
+            drawn from :attr:`rng`
+        :kwarg price_decrease: Whether the price is below the mean.  If None, it is drawn from
+            :attr:`rng`
 
         Current, random price algorithm is based on a normal distribution:
 
@@ -248,46 +482,66 @@ class Market:
 
         #now = datetime.datetime.utcnow()
 
-        std_dev = self.commodities[commodity].standard_deviation
-        mean_price = self.commodities[commodity].mean_price
+        commodity_data = self.commodities[commodity]
 
-        choose_percentage = random.randint(1, 100)
-        price_decrease = bool(random.randint(0, 1))
+        if choose_percentage is None:
+            choose_percentage = self.rng.randint(1, 100)
+        if price_decrease is None:
+            price_decrease = bool(self.rng.randint(0, 1))
 
-        is_event = False
-        if choose_percentage >= 1 and choose_percentage <= 68:
-            adjustment = random.randint(0, std_dev)
-        elif choose_percentage >= 69 and choose_percentage <= 95:
-            adjustment = random.randint(std_dev, std_dev * 2)
-        else:
-            is_event = True
-            for event in self.commodities[commodity].events:
-                if price_decrease and event['type'] == 'sale':
-                    price = mean_price - 2 * std_dev - event['adjustment']
-                    break
-                elif not price_decrease and event['type'] == 'shortage':
-                    price = mean_price + 2 * std_dev + event['adjustment']
-                    break
-            else:
-                # Our data is supposed to have a positive and negative event
-                # for everything.  But handle this case in case our data is
-                # bad.  User won't see a traceback but if we notice we can fix
-                # it.
-                price = mean_price
-                event = {'type':  'error',
-                         'adjustment': 0,
-                         'msg': 'Production levels for {} were right on target'.format(commodity)
-                        }
-            self.pubpen.publish('market.event', self.location.name, commodity, price, event['msg'])
-
-        if not is_event:
-            if price_decrease:
-                adjustment = -adjustment
-            price = mean_price + adjustment
-
-        # Make sure price has a minimum value of 1
-        if price < 1:
-            price = 1
-
-        self.commodities[commodity].price = price
-        self.pubpen.publish('market.{}.update'.format(self.location.name), self.commodities[commodity])
+        price_events = commodity_data.price_events
+        price, event_type, event_idx = draw_price(self.rng, commodity_data.mean_price,
+                                                  commodity_data.standard_deviation,
+                                                  price_events.sale_adjustments,
+                                                  price_events.shortage_adjustments,
+                                                  choose_percentage, price_decrease)
+
+        self.apply_price(commodity, price, event_type, event_idx)
+
+    def event_msg(self, commodity, event_type, event_idx=0):
+        """
+        Return the message describing an event for a commodity
+
+        :arg commodity: The name of the commodity
+        :arg event_type: The type of event (``sale``, ``shortage``, or ``error``) as returned by
+            :func:`draw_price`
+        :kwarg event_idx: The index of the event as returned by :func:`draw_price`
+        """
+        event = self.commodities[commodity].price_events.get(event_type, event_idx)
+        if event is not None:
+            return event.msg
+
+        # Our data is supposed to have a positive and negative event
+        # for everything.  But handle this case in case our data is
+        # bad.  User won't see a traceback but if we notice we can fix
+        # it.
+        return 'Production levels for {} were right on target'.format(commodity)
+
+    def apply_price(self, commodity, price, event_type=None, event_idx=0):
+        """
+        Set the price of a commodity in this market
+
+        :arg commodity: The name of the commodity
+        :arg price: The new price
+        :kwarg event_type: If the price was set by an event, the type of event as returned by
+            :func:`draw_price`
+        :kwarg event_idx: If the price was set by an event, the index of the event as returned by
+            :func:`draw_price`
+        :event market.event: Published if the price was set by an event
+        :event market.{location}.update: Published if the price changed
+
+        Changed prices are recorded in :attr:`price_history` and increase the market's
+        :attr:`version`.
+        """
+        if event_type is not None:
+            self._publish_event(self.location.name, commodity, price,
+                                self.event_msg(commodity, event_type, event_idx))
+
+        if self.commodities[commodity].price != price:
+            self.commodities[commodity].price = price
+            self.version += 1
+            self._changed_at[commodity] = self.version
+            self._changed_at.move_to_end(commodity)
+            if self.price_history is not None:
+                self.price_history.record(self.location.name, commodity, int(time.time()), price)
+            self._publish_update(self.commodities[commodity])
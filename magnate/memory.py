@@ -0,0 +1,193 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Account for the memory used by each part of the game
+
+This is opt-in (see the ``profile_memory`` config option) as :mod:`tracemalloc` slows down every
+allocation and uses memory of its own.  Memory is attributed to the module which allocated it.
+Modules of the game are reported by name (``magnate.market``, ``magnate.ui.urwid.message_win``)
+and other code by its top level package (``sqlalchemy``, ``urwid``).
+
+Each report also has the change in each module's memory since the last report so a leak shows up
+as a module which keeps growing.
+"""
+import os.path
+import tracemalloc
+
+import attr
+
+from .logging import log
+
+
+mlog = log.fields(mod=__name__)
+
+#: Default number of seconds between reports in the log
+DEFAULT_INTERVAL = 60
+#: Default number of modules in each report
+DEFAULT_TOP = 10
+
+#: Directory which the game's modules are in
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+#: Directory which the standard library is in
+_STDLIB_DIR = os.path.dirname(os.path.abspath(os.__file__))
+
+#: Allocations made by the profiler itself are not reported
+_IGNORED = (tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'))
+
+
+@attr.s
+class ModuleMemory:
+    """
+    Memory allocated by one module
+
+    :module: Name of the module or package
+    :size: Bytes which are allocated
+    :count: Number of allocations
+    :size_diff: Change in size since the previous report
+    """
+    module = attr.ib(validator=attr.validators.instance_of(str))
+    size = attr.ib(validator=attr.validators.instance_of(int))
+    count = attr.ib(validator=attr.validators.instance_of(int))
+    size_diff = attr.ib(validator=attr.validators.instance_of(int), default=0)
+
+
+def module_name(filename):
+    """
+    Return the name that memory allocated in a file is reported under
+
+    :arg filename: Path of the source file
+    :returns: The dotted name of the module for files of the game.  The top level package for
+        installed packages.  ``stdlib`` for the standard library and ``other`` for anything else
+    """
+    filename = os.path.abspath(filename)
+    if filename.startswith(_PACKAGE_DIR + os.sep):
+        relative = os.path.relpath(os.path.splitext(filename)[0], os.path.dirname(_PACKAGE_DIR))
+        name = relative.replace(os.sep, '.')
+        if name.endswith('.__init__'):
+            name = name[:-len('.__init__')]
+        return name
+
+    for packages_dir in ('site-packages', 'dist-packages'):
+        _, found, rest = filename.partition(os.sep + packages_dir + os.sep)
+        if found:
+            return os.path.splitext(rest.split(os.sep, 1)[0])[0]
+
+    if filename.startswith(_STDLIB_DIR + os.sep):
+        return 'stdlib'
+    return 'other'
+
+
+def start_tracing(frames=1):
+    """
+    Start tracing allocations
+
+    Call this as early as possible as memory allocated before tracing starts is not accounted for.
+
+    :kwarg frames: Number of frames of traceback to keep for each allocation.  Only the innermost
+        is used to attribute the memory but more can be useful when inspecting a snapshot by hand
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+class MemoryProfiler:
+    """
+    Report the memory used by each module of the game
+
+    Reports are written to the log every interval seconds and published in response to
+    ``query.debug.memory``.
+    """
+    def __init__(self, pubpen, interval=DEFAULT_INTERVAL, top=DEFAULT_TOP):
+        """
+        :arg pubpen: The :class:`pubmarine.PubPen` to answer queries on
+        :kwarg interval: Seconds between reports in the log.  0 only reports when asked
+        :kwarg top: Number of modules to report, largest first
+        """
+        self.pubpen = pubpen
+        self.loop = pubpen.loop
+        self.interval = interval
+        self.top = top
+        self._previous = {}
+        self._timer = None
+        self.pubpen.subscribe('query.debug.memory', self.handle_memory)
+
+    def report(self, top=None):
+        """
+        Measure the memory used by each module
+
+        :kwarg top: Number of modules to return.  Defaults to :attr:`top`.  None returns all of them
+        :returns: List of :class:`ModuleMemory`, largest first.  The size_diff is relative to the
+            previous report
+        """
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+        sizes = {}
+        counts = {}
+        for stat in snapshot.statistics('filename'):
+            name = module_name(stat.traceback[0].filename)
+            sizes[name] = sizes.get(name, 0) + stat.size
+            counts[name] = counts.get(name, 0) + stat.count
+
+        modules = sorted((ModuleMemory(name, size, counts[name],
+                                       size - self._previous.get(name, 0))
+                          for name, size in sizes.items()),
+                         key=lambda m: m.size, reverse=True)
+        self._previous = sizes
+        return modules[:top or self.top]
+
+    def log_report(self):
+        """Write a report of the largest modules to the log"""
+        current, peak = tracemalloc.get_traced_memory()
+        lines = ['Memory: {:.1f} KiB traced, {:.1f} KiB peak'.format(current / 1024, peak / 1024),
+                 '  {:>10} {:>10} {:>8}  module'.format('KiB', 'change', 'blocks')]
+        for usage in self.report():
+            lines.append('  {:>10.1f} {:>+10.1f} {:>8}  {}'.format(
+                usage.size / 1024, usage.size_diff / 1024, usage.count, usage.module))
+        mlog.info('\n'.join(lines))
+
+    def handle_memory(self, top=None):
+        """
+        Publish a report of the memory used by each module
+
+        :kwarg top: Number of modules to report.  Defaults to :attr:`top`
+        :event debug.memory: Published with the report
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        self.pubpen.publish('debug.memory', current, peak, self.report(top))
+
+    def _run_report(self):
+        """Log a report and schedule the next one"""
+        self.log_report()
+        self._timer = self.loop.call_later(self.interval, self._run_report)
+
+    def start(self):
+        """Start logging a report every interval seconds"""
+        if self.interval:
+            self._timer = self.loop.call_later(self.interval, self._run_report)
+
+    def stop(self):
+        """Log a final report and stop tracing allocations"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if tracemalloc.is_tracing():
+            self.log_report()
+            tracemalloc.stop()
@@ -0,0 +1,431 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Record the history of prices in every market
+
+Each (location, commodity) has its own append-only :class:`PriceSeries` of (time, price) samples.
+A sample is recorded whenever the price changes; the price holds until the next sample.
+
+Recent samples are kept in plain arrays.  Once there are ``chunk_size`` of them they are sealed
+into a :class:`PriceChunk` which stores the difference between each sample and the one before it
+as zigzag encoded varints.  Prices move a little at a time and samples are close together so most
+samples take two or three bytes instead of the sixteen of a pair of 64 bit integers.  Each chunk
+knows the first and last time in it so a range read only decodes the chunks which overlap the
+range.  When a series holds more than its retention, the oldest chunks are dropped.
+"""
+import bisect
+from array import array
+from collections import deque
+
+import attr
+
+
+#: Default number of samples to keep for each (location, commodity)
+DEFAULT_RETENTION = 1000
+
+#: Default number of samples to store in each chunk
+DEFAULT_CHUNK_SIZE = 128
+
+
+def _encode_varint(value, out):
+    """Append a zigzag encoded signed integer to a bytearray"""
+    value = (value << 1) if value >= 0 else ((-value << 1) - 1)
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_samples(times, prices):
+    """
+    Delta encode a run of samples
+
+    :arg times: Sequence of integer times in ascending order
+    :arg prices: Sequence of integer prices, one for each time
+    :returns: bytes holding the difference of each time and price from the previous one.  The
+        first sample is the difference from zero.
+    """
+    out = bytearray()
+    last_time = 0
+    last_price = 0
+    for sample_time, price in zip(times, prices):
+        _encode_varint(sample_time - last_time, out)
+        _encode_varint(price - last_price, out)
+        last_time = sample_time
+        last_price = price
+    return bytes(out)
+
+
+def decode_samples(data):
+    """
+    Decode samples encoded by :func:`encode_samples`
+
+    :arg data: bytes-like object holding the encoded samples
+    :returns: Tuple of an array of times and an array of prices
+    """
+    times = array('q')
+    prices = array('q')
+    # Alternate between decoding a time delta and a price delta
+    totals = [0, 0]
+    which = 0
+    value = 0
+    shift = 0
+    for byte in memoryview(data):
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        totals[which] += (value >> 1) if not value & 1 else -((value + 1) >> 1)
+        if which:
+            times.append(totals[0])
+            prices.append(totals[1])
+        which ^= 1
+        value = 0
+        shift = 0
+    return times, prices
+
+
+@attr.s(frozen=True)
+class PriceChunk:
+    """
+    A sealed run of samples
+
+    :first_time: Time of the first sample in the chunk
+    :last_time: Time of the last sample in the chunk
+    :count: Number of samples in the chunk
+    :data: The samples encoded by :func:`encode_samples`
+    :low: Lowest price in the chunk
+    :high: Highest price in the chunk
+    :total: Sum of the prices in the chunk
+    :last_price: Price of the last sample in the chunk
+
+    The summary of the prices lets :meth:`PriceSeries.downsample` use a chunk without decoding it.
+    """
+    first_time = attr.ib(validator=attr.validators.instance_of(int))
+    last_time = attr.ib(validator=attr.validators.instance_of(int))
+    count = attr.ib(validator=attr.validators.instance_of(int))
+    data = attr.ib(validator=attr.validators.instance_of(bytes))
+    low = attr.ib(validator=attr.validators.instance_of(int))
+    high = attr.ib(validator=attr.validators.instance_of(int))
+    total = attr.ib(validator=attr.validators.instance_of(int))
+    last_price = attr.ib(validator=attr.validators.instance_of(int))
+
+    @classmethod
+    def from_samples(cls, times, prices, data=None):
+        """
+        Create a chunk from arrays of times and prices
+
+        :kwarg data: The samples already encoded by :func:`encode_samples`.  If not given, they are
+            encoded.
+        """
+        if data is None:
+            data = encode_samples(times, prices)
+        return cls(times[0], times[-1], len(times), data, min(prices), max(prices), sum(prices),
+                   prices[-1])
+
+    @classmethod
+    def from_data(cls, data):
+        """Create a chunk from samples encoded by :func:`encode_samples`"""
+        times, prices = decode_samples(data)
+        return cls.from_samples(times, prices, data=data)
+
+    def samples(self):
+        """Return a tuple of an array of the times and an array of the prices in the chunk"""
+        return decode_samples(self.data)
+
+
+@attr.s(frozen=True)
+class PriceBucket:
+    """
+    Summary of the prices during a span of time
+
+    :start: First time in the bucket
+    :end: First time after the bucket
+    :low: Lowest price during the bucket
+    :high: Highest price during the bucket
+    :mean: Mean of the prices recorded during the bucket
+    :count: Number of prices recorded during the bucket.  If this is 0, the price did not change
+        during the bucket and low, high, and mean are all the price from before the bucket (or None
+        if there is no earlier price).
+    """
+    start = attr.ib()
+    end = attr.ib()
+    low = attr.ib()
+    high = attr.ib()
+    mean = attr.ib()
+    count = attr.ib()
+
+
+class PriceSeries:
+    """
+    Append-only history of the price of one commodity in one market
+    """
+    def __init__(self, retention=DEFAULT_RETENTION, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :kwarg retention: Number of samples to keep.  Samples are dropped a chunk at a time so up to
+            ``chunk_size`` more samples than this may be kept.
+        :kwarg chunk_size: Number of samples to store in each :class:`PriceChunk`
+        """
+        self.retention = retention
+        self.chunk_size = chunk_size
+        self.chunks = deque()
+        self._times = array('q')
+        self._prices = array('q')
+        self._chunked = 0
+
+    def __len__(self):
+        return self._chunked + len(self._times)
+
+    @property
+    def first_time(self):
+        """The time of the oldest sample or None if there are no samples"""
+        if self.chunks:
+            return self.chunks[0].first_time
+        if self._times:
+            return self._times[0]
+        return None
+
+    @property
+    def last_time(self):
+        """The time of the most recent sample or None if there are no samples"""
+        if self._times:
+            return self._times[-1]
+        if self.chunks:
+            return self.chunks[-1].last_time
+        return None
+
+    def append(self, sample_time, price):
+        """
+        Record a price
+
+        :arg sample_time: Integer time at which the price was set
+        :arg price: The new price
+        :raises ValueError: if sample_time is earlier than the last sample
+        """
+        last_time = self.last_time
+        if last_time is not None and sample_time < last_time:
+            raise ValueError('Price history is append-only: {} is before {}'.format(
+                sample_time, last_time))
+        self._times.append(sample_time)
+        self._prices.append(price)
+
+        if len(self._times) >= self.chunk_size:
+            chunk = PriceChunk.from_samples(self._times, self._prices)
+            self._times = array('q')
+            self._prices = array('q')
+            self.add_chunk(chunk)
+
+    def add_chunk(self, chunk):
+        """
+        Append a sealed chunk of samples and drop old chunks which are beyond the retention
+
+        :arg chunk: The :class:`PriceChunk` to add.  It must not overlap the samples already in
+            the series.
+        """
+        self.chunks.append(chunk)
+        self._chunked += chunk.count
+        while self.chunks and len(self) - self.chunks[0].count >= self.retention:
+            self._chunked -= self.chunks.popleft().count
+
+    def seal(self):
+        """
+        Return every sample as a sequence of :class:`PriceChunk`
+
+        The unsealed samples are encoded into a final chunk.  This is used when saving the history.
+        """
+        chunks = list(self.chunks)
+        if self._times:
+            chunks.append(PriceChunk.from_samples(self._times, self._prices))
+        return chunks
+
+    def range(self, start=None, end=None):
+        """
+        Return the samples between two times
+
+        :kwarg start: Earliest time to return.  If None, start with the oldest sample
+        :kwarg end: Latest time to return.  If None, end with the newest sample
+        :returns: Tuple of an array of the times and an array of the prices
+        """
+        times = array('q')
+        prices = array('q')
+        for chunk in self.chunks:
+            if start is not None and chunk.last_time < start:
+                continue
+            if end is not None and chunk.first_time > end:
+                break
+            chunk_times, chunk_prices = chunk.samples()
+            times.extend(chunk_times)
+            prices.extend(chunk_prices)
+        times.extend(self._times)
+        prices.extend(self._prices)
+
+        # Trim the samples in the partially overlapping chunks at either end
+        first = 0 if start is None else bisect.bisect_left(times, start)
+        last = len(times) if end is None else bisect.bisect_right(times, end)
+        return times[first:last], prices[first:last]
+
+    def downsample(self, num_buckets, start=None, end=None):
+        """
+        Summarize the samples between two times into a fixed number of buckets
+
+        :arg num_buckets: Maximum number of buckets to return.  For a chart, this is the number of
+            columns it has to draw in.
+        :kwarg start: Earliest time to summarize.  If None, start with the oldest sample
+        :kwarg end: Latest time to summarize.  If None, end with the newest sample
+        :returns: List of :class:`PriceBucket` covering equal spans of time from start to end.
+            Empty if there are no samples.
+
+        This is min-max downsampling.  Chunks which fit entirely inside a bucket are summarized
+        without being decoded so the cost depends on the number of chunks rather than the number of
+        samples.
+        """
+        if not len(self):
+            return []
+        if start is None:
+            start = self.first_time
+        if end is None:
+            end = self.last_time
+        if end < start or num_buckets < 1:
+            return []
+
+        span = end - start + 1
+        width = -(-span // num_buckets)
+        num_buckets = -(-span // width)
+
+        lows = [None] * num_buckets
+        highs = [None] * num_buckets
+        totals = [0] * num_buckets
+        counts = [0] * num_buckets
+        lasts = [None] * num_buckets
+        # Price at the start of the range
+        carried = None
+
+        def add(idx, low, high, total, count, last):
+            """Merge prices into a bucket"""
+            if counts[idx]:
+                lows[idx] = min(lows[idx], low)
+                highs[idx] = max(highs[idx], high)
+            else:
+                lows[idx] = low
+                highs[idx] = high
+            totals[idx] += total
+            counts[idx] += count
+            lasts[idx] = last
+
+        def add_samples(times, prices):
+            """Add each sample to its bucket"""
+            nonlocal carried
+            for sample_time, price in zip(times, prices):
+                if sample_time < start:
+                    carried = price
+                elif sample_time <= end:
+                    add((sample_time - start) // width, price, price, price, 1, price)
+
+        for chunk in self.chunks:
+            if chunk.last_time < start:
+                carried = chunk.last_price
+                continue
+            if chunk.first_time > end:
+                break
+            first_idx = (chunk.first_time - start) // width
+            if (chunk.first_time >= start and chunk.last_time <= end
+                    and first_idx == (chunk.last_time - start) // width):
+                add(first_idx, chunk.low, chunk.high, chunk.total, chunk.count, chunk.last_price)
+            else:
+                add_samples(*chunk.samples())
+        add_samples(self._times, self._prices)
+
+        buckets = []
+        price = carried
+        for idx in range(num_buckets):
+            bucket_start = start + idx * width
+            bucket_end = min(bucket_start + width, end + 1)
+            if counts[idx]:
+                buckets.append(PriceBucket(bucket_start, bucket_end, lows[idx], highs[idx],
+                                           totals[idx] / counts[idx], counts[idx]))
+                price = lasts[idx]
+            else:
+                buckets.append(PriceBucket(bucket_start, bucket_end, price, price, price, 0))
+        return buckets
+
+
+class PriceHistory:
+    """
+    The price history of every commodity in every market
+    """
+    def __init__(self, retention=DEFAULT_RETENTION, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :kwarg retention: Number of samples to keep for each (location, commodity)
+        :kwarg chunk_size: Number of samples to store in each :class:`PriceChunk`
+        """
+        self.retention = retention
+        self.chunk_size = chunk_size
+        self._series = {}
+
+    def __iter__(self):
+        return iter(self._series)
+
+    def series(self, location, commodity):
+        """
+        Return the :class:`PriceSeries` for a commodity in a market, creating it if needed
+
+        :arg location: The name of the market's location
+        :arg commodity: The name of the commodity
+        """
+        key = (location, commodity)
+        try:
+            return self._series[key]
+        except KeyError:
+            series = self._series[key] = PriceSeries(self.retention, self.chunk_size)
+            return series
+
+    def record(self, location, commodity, sample_time, price):
+        """
+        Record a new price
+
+        :arg location: The name of the market's location
+        :arg commodity: The name of the commodity
+        :arg sample_time: Integer time at which the price was set.  If the clock has gone backwards
+            (for instance, NTP stepped it) the sample is recorded at the time of the last sample
+        :arg price: The new price
+        """
+        series = self.series(location, commodity)
+        last_time = series.last_time
+        if last_time is not None and sample_time < last_time:
+            sample_time = last_time
+        series.append(sample_time, price)
+
+    def range(self, location, commodity, start=None, end=None):
+        """
+        Return the prices of a commodity in a market between two times
+
+        See :meth:`PriceSeries.range` for the arguments and return value
+        """
+        series = self._series.get((location, commodity))
+        if series is None:
+            return array('q'), array('q')
+        return series.range(start, end)
+
+    def downsample(self, location, commodity, num_buckets, start=None, end=None):
+        """
+        Summarize the prices of a commodity in a market into a fixed number of buckets
+
+        See :meth:`PriceSeries.downsample` for the arguments and return value
+        """
+        series = self._series.get((location, commodity))
+        if series is None:
+            return []
+        return series.downsample(num_buckets, start, end)
@@ -0,0 +1,171 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Profile the CPU time used by a running game
+
+The profiler costs nothing until it is turned on so it is always available.  It is toggled by the
+``action.debug.profile`` event (the urwid interface sends this from its game menu) or by sending
+the process :data:`PROFILE_SIGNAL`::
+
+    kill -USR1 $(pidof magnate-server)
+
+Profiling stops on its own after ``profile_duration`` seconds.  The profile is saved in the
+state directory in :mod:`pstats` format and can be browsed with ``python -m pstats FILE`` or
+a viewer such as snakeviz.  The functions with the highest cumulative time are also logged.
+
+Only the thread running the event loop is profiled.  Price ticks run in worker processes (see the
+``tick_workers`` config option) are not included.
+"""
+import cProfile
+import io
+import os.path
+import pstats
+import signal
+import time
+
+from .logging import log
+
+
+mlog = log.fields(mod=__name__)
+
+#: Default number of seconds to profile for
+DEFAULT_DURATION = 30
+#: Signal which toggles the profiler.  None on platforms without it
+PROFILE_SIGNAL = getattr(signal, 'SIGUSR1', None)
+#: Number of functions listed in the log when a profile is saved
+LOGGED_FUNCTIONS = 15
+
+
+class CPUProfiler:
+    """
+    Run :mod:`cProfile` over the event loop for a bounded length of time
+    """
+    def __init__(self, pubpen, directory, duration=DEFAULT_DURATION):
+        """
+        :arg pubpen: The :class:`pubmarine.PubPen` to listen for toggles on
+        :arg directory: Directory to save profiles in.  It is created if it does not exist
+        :kwarg duration: Seconds to profile for before stopping on its own
+        """
+        self.pubpen = pubpen
+        self.loop = pubpen.loop
+        self.directory = directory
+        self.duration = duration
+        self._profile = None
+        self._timer = None
+        self._signal = None
+        self.pubpen.subscribe('action.debug.profile', self.toggle)
+
+    @property
+    def running(self):
+        """Whether a profile is being recorded"""
+        return self._profile is not None
+
+    def start(self, duration=None):
+        """
+        Start profiling
+
+        :kwarg duration: Seconds to profile for.  Defaults to :attr:`duration`
+        :event debug.profile_started: Published with the number of seconds the profile will run for
+        """
+        if self.running:
+            return
+        duration = duration or self.duration
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler (or a debugger) already has the hook
+            mlog.fields(error=str(e)).warning('Could not start the CPU profiler')
+            return
+        self._profile = profile
+        self._timer = self.loop.call_later(duration, self.stop)
+        mlog.fields(duration=duration).info('Started the CPU profiler')
+        self.pubpen.publish('debug.profile_started', duration)
+
+    def stop(self):
+        """
+        Stop profiling and save the profile
+
+        :returns: The path the profile was saved to or None if the profiler was not running
+        :event debug.profile_saved: Published with the path of the saved profile
+        """
+        if not self.running:
+            return None
+        self._profile.disable()
+        profile = self._profile
+        self._profile = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        path = self._save(profile)
+        self.pubpen.publish('debug.profile_saved', path)
+        return path
+
+    def toggle(self, duration=None):
+        """
+        Start profiling if the profiler is stopped, otherwise stop it and save the profile
+
+        :kwarg duration: Seconds to profile for if the profiler is started
+        """
+        if self.running:
+            self.stop()
+        else:
+            self.start(duration)
+
+    def _save(self, profile):
+        """Write a profile to the directory and log a summary of it"""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, 'profile-{}.pstats'.format(stamp))
+        count = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, 'profile-{}-{}.pstats'.format(stamp, count))
+            count += 1
+        profile.dump_stats(path)
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats('cumulative').print_stats(LOGGED_FUNCTIONS)
+        # The summary has braces in it so it cannot be part of the format string
+        mlog.fields(path=path).info('Saved a CPU profile\n{}', summary.getvalue())
+        return path
+
+    def install_signal_handler(self, signum=PROFILE_SIGNAL):
+        """
+        Toggle the profiler when the process receives a signal
+
+        :kwarg signum: The signal to listen for
+        :returns: True if the handler was installed.  False if the platform or event loop cannot
+            handle signals
+        """
+        if signum is None:
+            return False
+        try:
+            self.loop.add_signal_handler(signum, self.toggle)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Windows and loops running outside of the main thread cannot handle signals
+            mlog.fields(signal=signum).debug('Could not listen for the profiler signal')
+            return False
+        self._signal = signum
+        return True
+
+    def close(self):
+        """Save any profile being recorded and stop listening for the signal"""
+        self.stop()
+        if self._signal is not None:
+            self.loop.remove_signal_handler(self._signal)
+            self._signal = None
@@ -0,0 +1,304 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Record the players' actions in a game and replay them
+
+Everything random in a game is derived from the world seed (see :mod:`magnate.rng`) so a game can
+be reproduced from its seed and the actions that its players took.  A :class:`Recorder` writes the
+seed and each ``action.*`` event, along with the number of price ticks that had happened, to
+a binary log.  A :class:`Replayer` feeds the log to the :class:`magnate.dispatcher.Dispatcher` of
+a game without a user interface as fast as it can.
+
+The log starts with :data:`MAGIC` and the format version.  Then each record is its length followed
+by a value encoded with :mod:`magnate.codec`.  Classes and enums are encoded by name rather than
+by their schema number so recordings can be replayed by later releases.  The first record holds
+the world seed, the price generator, and the table of names that the rest of the records are
+encoded with.  The others are ``(tick, session_id, event, args, kwargs)``.  The session id of the
+local player is 0.  The last record has an event of None and marks how many ticks the game ran for.
+
+Ticks are only recorded as the number which had happened when each action was taken so the
+replayer runs them between actions, after everything caused by the previous action has finished.
+Actions which are taken faster than a person could, so that a tick lands in the middle of the
+events caused by an action, may not replay exactly.
+
+Passwords are never recorded.  A login is recorded when it succeeds and the replayer lets it in
+without checking a password.
+"""
+import argparse
+import asyncio
+import struct
+import sys
+import time
+from functools import partial
+
+import attr
+
+from .auth import AuthProvider
+from .codec import STORAGE_CODEC, Codec
+from .logging import log
+from .tick import PriceTicker
+
+
+mlog = log.fields(mod=__name__)
+
+#: Start of every recording
+MAGIC = b'SMRL'
+#: Version of the recording format
+FORMAT_VERSION = 1
+
+#: Events which change the game and so are recorded, besides logins
+RECORDED_EVENTS = ('action.fleet.buy_ships', 'action.fleet.create', 'action.fleet.order',
+                   'action.ship.movement_attempt', 'action.user.order')
+#: Event which is replayed for a login
+LOGIN_EVENT = 'action.user.login_attempt'
+
+#: Number of times the replayer lets the event loop run after each action.  This lets the events
+#: which the action causes (for instance, the market reacting to a ship arriving) finish before the
+#: next action
+SETTLE_STEPS = 4
+
+_LENGTH = struct.Struct('!I')
+
+
+@attr.s
+class Recording:
+    """
+    A recorded game
+
+    * :py:attr:`world_seed`: Seed of the game's :class:`magnate.rng.RandomSource`
+    * :py:attr:`price_generator`: Name of the random number generator for prices
+    * :py:attr:`names`: Table of names the records were encoded with
+    * :py:attr:`records`: List of ``(tick, session_id, event, args, kwargs)`` tuples
+    """
+    world_seed = attr.ib(validator=attr.validators.instance_of(int))
+    price_generator = attr.ib(validator=attr.validators.instance_of(str))
+    names = attr.ib(convert=tuple, default=())
+    records = attr.ib(default=attr.Factory(list))
+
+    @property
+    def ticks(self):
+        """Number of price ticks the game ran for"""
+        return self.records[-1][0] if self.records else 0
+
+
+class Recorder:
+    """
+    Write the actions of the players in a game to a log
+    """
+    def __init__(self, path, world_seed, price_generator, names=()):
+        """
+        :arg path: File to write the log to.  It is overwritten if it exists
+        :arg world_seed: Seed of the game's :class:`magnate.rng.RandomSource`
+        :arg price_generator: Name of the random number generator for prices
+        :kwarg names: Names to encode as their position in this sequence.  See
+            :func:`magnate.codec.game_names`
+        """
+        self.path = path
+        self.codec = Codec(names, compact=False)
+        #: The game's :class:`magnate.tick.PriceTicker`, if it has one
+        self.ticker = None
+        #: Number of actions recorded
+        self.records = 0
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + bytes((FORMAT_VERSION,)))
+        self._write(STORAGE_CODEC, (world_seed, price_generator, tuple(names)))
+
+    @property
+    def tick(self):
+        """Number of price ticks which have happened"""
+        return self.ticker.tick_count if self.ticker is not None else 0
+
+    def _write(self, codec, value):
+        """Append one record to the log"""
+        data = codec.encode(value)
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+
+    def watch(self, session):
+        """
+        Record the actions of a session's player
+
+        :arg session: The :class:`magnate.session.Session`
+        """
+        session_id = session.session_id or 0
+        for event in RECORDED_EVENTS:
+            callback = partial(self._record, session_id, event)
+            session.callbacks.append(callback)
+            session.pubpen.subscribe(event, callback)
+        callback = partial(self._record_login, session_id)
+        session.callbacks.append(callback)
+        session.pubpen.subscribe('user.login_success', callback)
+
+    def _record(self, session_id, event, *args, **kwargs):
+        """Record an action"""
+        if self._file is None:
+            return
+        self._write(self.codec, (self.tick, session_id, event, args, kwargs or None))
+        self.records += 1
+
+    def _record_login(self, session_id, username):
+        """Record a successful login without its password"""
+        self._record(session_id, LOGIN_EVENT, username)
+
+    def close(self):
+        """Mark the end of the game and close the log"""
+        if self._file is None:
+            return
+        self._write(self.codec, (self.tick, 0, None, (), None))
+        self._file.close()
+        self._file = None
+        mlog.fields(path=self.path, records=self.records, ticks=self.tick).info(
+            'Recorded the game')
+
+
+def read_recording(path):
+    """
+    Read a log written by :class:`Recorder`
+
+    :arg path: The log file
+    :returns: A :class:`Recording`
+    :raises ValueError: if the file is not a recording
+    """
+    with open(path, 'rb') as f:
+        data = memoryview(f.read())
+
+    header_size = len(MAGIC) + 1
+    if bytes(data[:len(MAGIC)]) != MAGIC or len(data) < header_size:
+        raise ValueError('{} is not a recorded game'.format(path))
+    if data[len(MAGIC)] != FORMAT_VERSION:
+        raise ValueError('Unsupported recording version: {}'.format(data[len(MAGIC)]))
+
+    values = []
+    offset = header_size
+    while offset + _LENGTH.size <= len(data):
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        values.append(data[offset:offset + length])
+        offset += length
+    if not values:
+        raise ValueError('{} is not a recorded game'.format(path))
+
+    world_seed, price_generator, names = STORAGE_CODEC.decode(values[0])
+    codec = Codec(names)
+    records = [codec.decode(value) for value in values[1:]]
+    return Recording(world_seed, price_generator, names, records)
+
+
+class _AdmitAll(AuthProvider):
+    """Lets every recorded login in since only logins which succeeded were recorded"""
+    async def authenticate(self, username, password):
+        return True
+
+
+class Replayer:
+    """
+    Feed a recording to a game's dispatcher
+    """
+    def __init__(self, magnate):
+        """
+        :arg magnate: The :class:`magnate.magnate.Magnate`, with its backend started, to replay
+            into.  It must have been started with the recording's world seed and price generator
+        """
+        self.magnate = magnate
+        self.dispatcher = magnate.dispatcher
+        if magnate.price_ticker is None:
+            # The replayer ticks the world itself.  The game needs to know that it ticks so that
+            # fleets can be used
+            magnate.price_ticker = PriceTicker(magnate, magnate.markets)
+        self.ticker = magnate.price_ticker
+        magnate.auth = _AdmitAll()
+        self.sessions = {0: self.dispatcher.default_session}
+        #: Number of actions replayed
+        self.events = 0
+
+    def _session(self, session_id):
+        """Return the session for a recorded session id, opening sessions to reach it"""
+        while session_id not in self.sessions:
+            session = self.dispatcher.open_session()
+            self.sessions[session.session_id] = session
+        return self.sessions[session_id]
+
+    async def run(self, records):
+        """
+        Replay recorded actions
+
+        :arg records: The records of a :class:`Recording`
+        """
+        for tick, session_id, event, args, kwargs in records:
+            while self.ticker.tick_count < tick:
+                await self.ticker.tick()
+                await _settle()
+            if event is None:
+                continue
+
+            session = self._session(session_id)
+            if event == LOGIN_EVENT:
+                await self.dispatcher.handle_login(args[0], '', session=session)
+            else:
+                session.pubpen.publish(event, *args, **(kwargs or {}))
+            await _settle()
+            self.events += 1
+
+
+async def _settle():
+    """Let the callbacks of the events published so far run"""
+    for _ in range(SETTLE_STEPS):
+        await asyncio.sleep(0)
+
+
+def _parse_args(args):
+    """Parse the command line arguments which are specific to the replayer"""
+    parser = argparse.ArgumentParser(prog='magnate-replay', add_help=False)
+    parser.add_argument('recording', action='store',
+                        help='Game recorded with magnate --record FILE')
+    args, _ = parser.parse_known_args(args)
+    return args
+
+
+def main():
+    """Replay a recorded game without a user interface.  The entrypoint for magnate-replay"""
+    # magnate.magnate imports this module to record games
+    from .magnate import Magnate
+
+    magnate = Magnate()
+    args = _parse_args(magnate.cfg['ui_args'])
+    recording = read_recording(args.recording)
+    magnate.cfg.update({'world_seed': recording.world_seed,
+                        'price_generator': recording.price_generator,
+                        'price_tick_interval': 0, 'record_session': None,
+                        'order_journal': None})
+    magnate.setup()
+
+    loop = asyncio.get_event_loop()
+    magnate.start_backend(loop)
+    replayer = Replayer(magnate)
+    start = time.perf_counter()
+    loop.run_until_complete(replayer.run(recording.records))
+    elapsed = time.perf_counter() - start
+    magnate.stop_backend()
+
+    print('Replayed {} actions and {} ticks in {:.3f}s'.format(replayer.events,
+                                                              replayer.ticker.tick_count, elapsed))
+    for session_id, session in sorted(replayer.sessions.items()):
+        if session.user is not None:
+            print('{} {}: cash {}, at {}'.format(session_id, session.user.username,
+                                                 session.user.cash,
+                                                 session.user.ship.location.name))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
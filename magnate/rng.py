@@ -0,0 +1,188 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Sources of random numbers for the game
+
+Everything random in a game is drawn from streams which are derived from a single world seed.  Each
+consumer (for instance, each :class:`magnate.market.Market`) gets its own stream so that the numbers
+one consumer draws do not depend on how many numbers another consumer has drawn.  Given the same
+world seed, a game will see the same sequence of prices in each market.
+"""
+import hashlib
+import random
+from abc import ABCMeta, abstractmethod
+
+from .logging import log
+
+
+mlog = log.fields(mod=__name__)
+
+_MASK32 = 0xffffffff
+_MASK64 = 0xffffffffffffffff
+
+
+def derive_seed(world_seed, *names):
+    """
+    Derive the seed for a stream from the world seed
+
+    :arg world_seed: The integer seed for the whole game
+    :arg names: Strings which identify the stream.  For instance, ``('market', 'Earth')``
+    :returns: A 64 bit integer seed
+
+    This does not use :func:`hash` as that is randomized between runs of the interpreter.
+    """
+    hasher = hashlib.blake2b(digest_size=8)
+    hasher.update(str(world_seed).encode('utf-8'))
+    for name in names:
+        hasher.update(b'\0')
+        hasher.update(name.encode('utf-8'))
+    return int.from_bytes(hasher.digest(), 'little')
+
+
+class RandomStream(metaclass=ABCMeta):
+    """A seeded stream of random numbers"""
+
+    @abstractmethod
+    def __init__(self, seed):
+        """
+        :arg seed: A 64 bit integer to seed the stream with
+        """
+        pass
+
+    @abstractmethod
+    def randint(self, low, high):
+        """Return a random integer N such that ``low <= N <= high``"""
+        pass
+
+    def randints(self, low, high, count):
+        """
+        Return a list of count random integers, each of which is between low and high inclusive
+
+        This is faster than calling :meth:`randint` repeatedly.
+        """
+        return [self.randint(low, high) for _ in range(count)]
+
+
+class MersenneStream(RandomStream):
+    """
+    Random stream using the stdlib's Mersenne Twister
+
+    This is the fastest generator but its output for a given seed may change between versions of
+    Python.
+    """
+    def __init__(self, seed):  # pylint: disable=super-init-not-called
+        self._random = random.Random(seed)
+
+    def randint(self, low, high):
+        return self._random.randint(low, high)
+
+    def randints(self, low, high, count):
+        randint = self._random.randint
+        return [randint(low, high) for _ in range(count)]
+
+
+class PCG32Stream(RandomStream):
+    """
+    Random stream using the PCG32 (XSH RR) generator
+
+    Slower than :class:`MersenneStream` but its output only depends on the seed, so a recorded seed
+    reproduces the same game on any version of Python.
+    """
+    _MULTIPLIER = 6364136223846793005
+
+    def __init__(self, seed, sequence=0):  # pylint: disable=super-init-not-called
+        """
+        :arg seed: A 64 bit integer to seed the stream with
+        :kwarg sequence: Selects one of 2**63 distinct sequences for the same seed
+        """
+        self._increment = ((sequence << 1) | 1) & _MASK64
+        self._state = 0
+        self._next32()
+        self._state = (self._state + seed) & _MASK64
+        self._next32()
+
+    def _next32(self):
+        """Advance the generator and return the next 32 bit output"""
+        old = self._state
+        self._state = (old * self._MULTIPLIER + self._increment) & _MASK64
+        xorshifted = (((old >> 18) ^ old) >> 27) & _MASK32
+        rot = old >> 59
+        return ((xorshifted >> rot) | (xorshifted << ((-rot) & 31))) & _MASK32
+
+    def randint(self, low, high):
+        return self.randints(low, high, 1)[0]
+
+    def randints(self, low, high, count):
+        span = high - low + 1
+        if span < 1 or span > _MASK32 + 1:
+            raise ValueError('Range {}-{} is not supported by PCG32Stream'.format(low, high))
+
+        # Reject the values at the bottom of the 32 bit range which would bias the modulus
+        threshold = (_MASK32 + 1 - span) % span
+
+        mult = self._MULTIPLIER
+        inc = self._increment
+        state = self._state
+        results = []
+        while len(results) < count:
+            old = state
+            state = (old * mult + inc) & _MASK64
+            xorshifted = (((old >> 18) ^ old) >> 27) & _MASK32
+            rot = old >> 59
+            value = ((xorshifted >> rot) | (xorshifted << ((-rot) & 31))) & _MASK32
+            if value >= threshold:
+                results.append(low + value % span)
+        self._state = state
+
+        return results
+
+
+#: Mapping of the names that can be used in the ``price_generator`` config option to the
+#: :class:`RandomStream` they select
+GENERATORS = {'mersenne': MersenneStream,
+              'pcg32': PCG32Stream,
+             }
+
+
+class RandomSource:
+    """Hands out independent :class:`RandomStream`s derived from a single world seed"""
+
+    def __init__(self, world_seed=None, generator='mersenne'):
+        """
+        :kwarg world_seed: Integer to derive all of the streams from.  If None, a seed is chosen
+            at random and logged so that the game can be reproduced.
+        :kwarg generator: Name of the :class:`RandomStream` to use from :data:`GENERATORS`
+        """
+        if world_seed is None:
+            world_seed = random.SystemRandom().getrandbits(64)
+        self.world_seed = world_seed
+
+        try:
+            self.stream_class = GENERATORS[generator]
+        except KeyError:
+            raise ValueError('Unknown random number generator: {}'.format(generator))
+
+        mlog.fields(world_seed=world_seed, generator=generator).info('Random source created')
+
+    def stream(self, *names):
+        """
+        Create the random stream for a consumer
+
+        :arg names: Strings which identify the consumer.  For instance, ``('market', 'Earth')``
+        :returns: A :class:`RandomStream`.  Asking for the same names returns a new stream which
+            starts from the beginning of the sequence.
+        """
+        return self.stream_class(derive_seed(self.world_seed, *names))
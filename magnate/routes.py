@@ -0,0 +1,244 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Find the most profitable trade routes between markets
+
+A trade route is buying a commodity at one market and selling it at another in the same stellar
+system.  :class:`RouteTable` keeps the price of every cargo commodity in every market in one array
+per commodity, along with the markets of each system sorted from the highest price to the lowest.
+The best place to sell a commodity bought anywhere is then the first entry in that order, so finding
+the best routes only has to look at each (market, commodity) once instead of at every pair of
+markets.  When a market's prices change, only the orders for that market's system are updated.
+"""
+import heapq
+from array import array
+from collections import OrderedDict
+
+import attr
+
+from .events import topic
+from .market import CommodityType
+
+
+@attr.s(frozen=True)
+class TradeRoute:
+    """
+    Buying a commodity in one market and selling it in another
+
+    :commodity: Name of the commodity to trade
+    :origin: Location to buy the commodity at
+    :destination: Location to sell the commodity at
+    :buy_price: Price of one unit at the origin
+    :sell_price: Price of one unit at the destination
+    :quantity: Number of units that the hold and cash allow buying
+    :profit: Total profit from buying quantity units at the origin and selling them at the
+        destination
+    """
+    commodity = attr.ib()
+    origin = attr.ib()
+    destination = attr.ib()
+    buy_price = attr.ib()
+    sell_price = attr.ib()
+    quantity = attr.ib()
+    profit = attr.ib()
+
+
+class RouteTable:
+    """
+    Prices of every cargo commodity in every market, arranged for finding trade routes
+    """
+    def __init__(self, pubpen, markets):
+        """
+        :arg pubpen: The :class:`pubmarine.PubPen` to listen for price changes on
+        :arg markets: Mapping of location name to :class:`magnate.market.Market`
+        """
+        self.pubpen = pubpen
+        self.locations = list(markets)
+        self._location_idx = {name: idx for idx, name in enumerate(self.locations)}
+
+        commodities = OrderedDict()
+        for market in markets.values():
+            for name, commodity in market.commodities.items():
+                if CommodityType.cargo in commodity.type:
+                    commodities.setdefault(name, commodity.hold_space)
+        self.commodities = list(commodities)
+        self._commodity_idx = {name: idx for idx, name in enumerate(self.commodities)}
+        #: Hold space taken by one unit of each commodity
+        self.hold_space = array('q', commodities.values())
+
+        systems = OrderedDict()
+        for idx, market in enumerate(markets.values()):
+            systems.setdefault(market.location.system.name, []).append(idx)
+        #: Indexes of the locations in each system
+        self.systems = list(systems.values())
+        self._system_of = array('q', [0] * len(self.locations))
+        for system_idx, members in enumerate(self.systems):
+            for idx in members:
+                self._system_of[idx] = system_idx
+
+        #: prices[commodity][location].  0 if the commodity is not sold at the location
+        self.prices = [array('q', [0] * len(self.locations)) for _ in self.commodities]
+        # market.{location}.update only sends the Commodity.  Each market has its own Commodity
+        # objects so they tell us which location the update is for.
+        self._location_of = {}
+        for loc_idx, market in enumerate(markets.values()):
+            for name, commodity in market.commodities.items():
+                com_idx = self._commodity_idx.get(name)
+                if com_idx is None:
+                    continue
+                self._location_of[commodity] = self.locations[loc_idx]
+                if commodity.price is not None:
+                    self.prices[com_idx][loc_idx] = commodity.price
+
+        #: _sell_order[system][commodity] is the locations of the system from highest price to
+        #: lowest
+        self._sell_order = [[None] * len(self.commodities) for _ in self.systems]
+        #: _margins[commodity][location] is the profit per unit of buying at the location and
+        #: selling at the best other location in its system.  0 if there is no profitable sale.
+        self._margins = [array('q', [0] * len(self.locations)) for _ in self.commodities]
+        for system_idx in range(len(self.systems)):
+            for com_idx in range(len(self.commodities)):
+                self._sort(system_idx, com_idx)
+
+        self._sub_ids = [self.pubpen.subscribe(topic('market.{}.update', location),
+                                               self.handle_price_update)
+                         for location in self.locations]
+
+    def _sort(self, system_idx, com_idx):
+        """Reorder the locations in a system by their price for a commodity"""
+        prices = self.prices[com_idx]
+        order = sorted(self.systems[system_idx], key=prices.__getitem__, reverse=True)
+        self._sell_order[system_idx][com_idx] = order
+
+        # Only the two highest prices are needed: the best place to sell is the highest priced
+        # location unless that is where the commodity was bought.
+        margins = self._margins[com_idx]
+        highest = prices[order[0]]
+        second = prices[order[1]] if len(order) > 1 else 0
+        for loc_idx in order:
+            buy_price = prices[loc_idx]
+            sell_price = second if loc_idx == order[0] else highest
+            if buy_price > 0 and sell_price > buy_price:
+                margins[loc_idx] = sell_price - buy_price
+            else:
+                margins[loc_idx] = 0
+
+    def close(self):
+        """Stop following price changes"""
+        for sub_id in self._sub_ids:
+            self.pubpen.unsubscribe(sub_id)
+        self._sub_ids = []
+
+    def update(self, location, commodity, price):
+        """
+        Record a new price
+
+        :arg location: The name of the market's location
+        :arg commodity: The name of the commodity
+        :arg price: The new price
+        """
+        com_idx = self._commodity_idx.get(commodity)
+        if com_idx is None:
+            return
+        loc_idx = self._location_idx[location]
+        if self.prices[com_idx][loc_idx] != price:
+            self.prices[com_idx][loc_idx] = price
+            self._sort(self._system_of[loc_idx], com_idx)
+
+    def handle_price_update(self, commodity, *args):
+        """Record the new price of a commodity when a market publishes it"""
+        location = self._location_of.get(commodity)
+        if location is not None:
+            self.update(location, commodity.name, commodity.price)
+
+    def _candidate(self, loc_idx, com_idx, rank, holdspace, cash):
+        """
+        Return the route for buying a commodity at a location and selling it at the rank'th best
+        location in the same system
+
+        :returns: A (negated profit, loc_idx, com_idx, rank, quantity, dest_idx) tuple for a heap
+            or None if there is no profitable route
+        """
+        buy_price = self.prices[com_idx][loc_idx]
+        if buy_price <= 0:
+            return None
+        quantity = cash // buy_price
+        if self.hold_space[com_idx]:
+            quantity = min(quantity, holdspace // self.hold_space[com_idx])
+        if quantity <= 0:
+            return None
+
+        order = self._sell_order[self._system_of[loc_idx]][com_idx]
+        # The origin is not a destination.  It is somewhere in order so skip over it.
+        while rank < len(order) and order[rank] == loc_idx:
+            rank += 1
+        if rank >= len(order):
+            return None
+        dest_idx = order[rank]
+        margin = self.prices[com_idx][dest_idx] - buy_price
+        if margin <= 0:
+            return None
+        return (-quantity * margin, loc_idx, com_idx, rank, quantity, dest_idx)
+
+    def _best_origins(self, com_idx, holdspace, cash, k):
+        """
+        Return the k locations where buying a commodity makes the most profit
+
+        Every route from a location makes at most as much as selling at the best other location
+        in its system so the top k routes for a commodity can only start at these locations.
+        """
+        margins = self._margins[com_idx]
+        max_quantity = holdspace // self.hold_space[com_idx] if self.hold_space[com_idx] else cash
+        profits = [min(max_quantity, cash // price) * margin if margin else 0
+                   for price, margin in zip(self.prices[com_idx], margins)]
+        return [idx for idx in heapq.nlargest(k, range(len(profits)), key=profits.__getitem__)
+                if profits[idx] > 0]
+
+    def best(self, holdspace, cash, k=5, origin=None):
+        """
+        Return the most profitable trade routes
+
+        :arg holdspace: Free hold space on the ship
+        :arg cash: Cash available to buy cargo with
+        :kwarg k: Maximum number of routes to return
+        :kwarg origin: Only return routes starting at this location.  If None, return routes
+            starting anywhere
+        :returns: List of up to k :class:`TradeRoute` from most to least profitable
+        """
+        heap = []
+        for com_idx in range(len(self.commodities)):
+            if origin is None:
+                origins = self._best_origins(com_idx, holdspace, cash, k)
+            else:
+                origins = (self._location_idx[origin],)
+            for loc_idx in origins:
+                candidate = self._candidate(loc_idx, com_idx, 0, holdspace, cash)
+                if candidate is not None:
+                    heap.append(candidate)
+        heapq.heapify(heap)
+
+        routes = []
+        while heap and len(routes) < k:
+            neg_profit, loc_idx, com_idx, rank, quantity, dest_idx = heapq.heappop(heap)
+            routes.append(TradeRoute(self.commodities[com_idx], self.locations[loc_idx],
+                                     self.locations[dest_idx], self.prices[com_idx][loc_idx],
+                                     self.prices[com_idx][dest_idx], quantity, -neg_profit))
+            # The next best destination for the same purchase may also be in the top k
+            candidate = self._candidate(loc_idx, com_idx, rank + 1, holdspace, cash)
+            if candidate is not None:
+                heapq.heappush(heap, candidate)
+
+        return routes
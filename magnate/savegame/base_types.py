@@ -28,10 +28,11 @@ try:  # pragma: no cover
 except ImportError:  # pragma: no cover
     from yaml import SafeLoader as Loader
 
-from ..logging import log
+from ..logging import lazy_log
 
 
-mlog = log.fields(mod=__name__)
+# The validators run for every value in the data files so they log through the lazy logger
+mlog = lazy_log.fields(mod=__name__)
 
 # Enums that are created at runtime and then used with the database.  See the
 # data/base/stellar-types.yml file if you suspect this list is out of date
@@ -62,10 +63,13 @@ def type_name(value):
     return value
 
 
+_validator_log = mlog.fields(func='_generic_types_validator')
+
+
 def _generic_types_validator(type_enum, value):
     """Validate that a string is valid in a :class:`enum.Enum` and transform it into the enum"""
-    flog = mlog.fields(func=f'_generic_types_validator', type_enum=type_enum)
-    flog.fields(type_enum=type_enum, value=value).debug('validate and transform into an enum value')
+    flog = _validator_log.fields(type_enum=type_enum.__name__)
+    flog.fields(value=value).debug('validate and transform into an enum value')
 
     try:
         enum_value = type_enum[value]
@@ -21,14 +21,14 @@ import os
 from alembic.config import Config
 from alembic import command
 from sqlalchemy import create_engine
-from sqlalchemy import Column, Enum, ForeignKey, Integer, String
+from sqlalchemy import Column, Enum, ForeignKey, Index, Integer, LargeBinary, String
 from sqlalchemy import UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy_repr import RepresentableBase
 
-from ..errors import MagnateNoSaveGame
+from ..errors import MagnateInvalidSaveGame, MagnateNoSaveGame
 from ..logging import log
 from . import base_types
 from . import data_def
@@ -67,7 +67,7 @@ class PricedItem:
 SCHEMA_NAMES = ('SystemData', 'CelestialData', 'LocationData', 'Commodity', 'CommodityData',
                 'CommodityCategory', 'Ship', 'ShipData', 'Cargo', 'Property', 'PropertyData',
                 'ShipPart', 'ShipPartData', 'EventData', 'EventCondition', 'ConditionCategory',
-                'Player', 'World',)
+                'PriceHistoryChunk', 'Player', 'World', 'JournalState',)
 
 
 # Give the Schemas an initial value of None
@@ -179,7 +179,9 @@ def init_schema(datadir):
         location = relationship('LocationData', back_populates='commodities')
         price = Column(Integer, nullable=False)
         last_update = Column(Integer, nullable=False)
-        __table_args__ = (UniqueConstraint('info_id', 'location_id', name='commodity_unique'),)
+        __table_args__ = (UniqueConstraint('info_id', 'location_id', name='commodity_unique'),
+                          # The market at a location lists its commodities ordered by price
+                          Index('ix_commodity_location_id_price', 'location_id', 'price'),)
 
     class CommodityData(PricedItem, Base):  # pylint: disable=unused-variable
         """
@@ -229,9 +231,9 @@ def init_schema(datadir):
         info_id = Column(Integer, ForeignKey('ship_data.id'))
         info = relationship('ShipData', backref='ships')
         condition = Column(Integer, nullable=False)
-        owner_id = Column(Integer, ForeignKey('player.id'), nullable=False)
+        owner_id = Column(Integer, ForeignKey('player.id'), nullable=False, index=True)
         owner = relationship('Player', backref='ships')
-        location_id = Column(Integer, ForeignKey('location_data.id'), nullable=False)
+        location_id = Column(Integer, ForeignKey('location_data.id'), nullable=False, index=True)
         location = relationship('LocationData', backref='ships')
 
     class ShipData(PricedItem, Base):  # pylint: disable=unused-variable
@@ -263,7 +265,7 @@ def init_schema(datadir):
         """
         __tablename__ = 'cargo'
         id = Column(Integer, primary_key=True)
-        ship_id = Column(Integer, ForeignKey('ship.id'))
+        ship_id = Column(Integer, ForeignKey('ship.id'), index=True)
         ship = relationship('Ship', backref='cargo')
         commodity_id = Column(Integer, ForeignKey('commodity_data.id'))
         commodity = relationship('CommodityData')
@@ -315,7 +317,7 @@ def init_schema(datadir):
         info_id = Column(Integer, ForeignKey('ship_part_data.id'))
         info = relationship('ShipPartData', backref='ship_parts')
         condition = Column(Integer, nullable=False)
-        ship_id = Column(Integer, ForeignKey('ship.id'))
+        ship_id = Column(Integer, ForeignKey('ship.id'), index=True)
         ship = relationship('Ship', backref='ship_parts')
 
     class ShipPartData(PricedItem, Base):  # pylint: disable=unused-variable
@@ -384,6 +386,32 @@ def init_schema(datadir):
         __table_args__ = (UniqueConstraint('condition_id', 'category',
                                            name='condition_category_unique'),)
 
+    class PriceHistoryChunk(Base):  # pylint: disable=unused-variable
+        """
+        A run of past prices of a Commodity at a Location
+
+        See :mod:`magnate.price_history` for the format of the data.
+
+        :location: Location whose market the prices were in
+        :commodity: CommodityData for the Commodity which was priced
+        :first_time: Timestamp of the first price in the run
+        :last_time: Timestamp of the last price in the run
+        :count: Number of prices in the run
+        :data: The delta encoded timestamps and prices
+        """
+        __tablename__ = 'price_history'
+        id = Column(Integer, primary_key=True)
+        location_id = Column(Integer, ForeignKey('location_data.id'), nullable=False)
+        location = relationship('LocationData')
+        commodity_id = Column(Integer, ForeignKey('commodity_data.id'), nullable=False)
+        commodity = relationship('CommodityData')
+        first_time = Column(Integer, nullable=False)
+        last_time = Column(Integer, nullable=False)
+        count = Column(Integer, nullable=False)
+        data = Column(LargeBinary, nullable=False)
+        __table_args__ = (Index('ix_price_history_series', 'location_id', 'commodity_id',
+                                'first_time'),)
+
     class Player(Base):  # pylint: disable=unused-variable
         """
         Player data
@@ -410,6 +438,21 @@ def init_schema(datadir):
         id = Column(Integer, primary_key=True)
         time = Column(Integer, unique=True, nullable=False)
 
+    class JournalState(Base):  # pylint: disable=unused-variable
+        """
+        How much of the order journal has been applied to the savegame
+
+        See :mod:`magnate.savegame.journal`.
+
+        :generation: Id written at the start of the journal.  The journal gets a new one each time
+            it is emptied
+        :applied: Number of records from that journal which have been applied
+        """
+        __tablename__ = 'journal_state'
+        id = Column(Integer, primary_key=True)
+        generation = Column(String, nullable=False)
+        applied = Column(Integer, nullable=False)
+
     # pylint: enable=too-few-public-methods
 
     flog.debug('Saving dynamic Schema to the global level')
@@ -580,6 +623,35 @@ def create_savegame(savegame, datadir):
     return engine
 
 
+def upgrade_savegame(savegame_engine, datadir):
+    """
+    Upgrade a savegame to the schema of this version of Stellar Magnate
+
+    :arg savegame_engine: SQLAlchemy engine refering to the savegame file
+    :arg datadir: Directory where Stellar Magnates data files are located.  The Alembic files used
+        to upgrade savegames are located here.  If there are none, the savegame is left alone.
+    :raises MagnateInvalidSaveGame: If the savegame cannot be upgraded
+    """
+    flog = mlog.fields(func='upgrade_savegame')
+    flog.fields(datadir=datadir).debug('Entering upgrade_savegame')
+
+    alembic_ini = os.path.join(datadir, 'alembic.ini')
+    if not os.path.exists(alembic_ini):
+        flog.debug('No savegame upgrade scripts in the datadir')
+        return
+
+    alembic_cfg = Config(alembic_ini)
+    try:
+        with savegame_engine.begin() as connection:
+            alembic_cfg.attributes['connection'] = connection
+            command.upgrade(alembic_cfg, 'head')
+    except Exception:
+        flog.trace('error').fields(savegame=savegame_engine.url).error('Savegame file was invalid')
+        raise MagnateInvalidSaveGame(f'{savegame_engine.url.database} is not a valid save file')
+
+    flog.debug('Leaving upgrade_savegame')
+
+
 def load_savegame(savegame, datadir):
     """
     Load a game from a savegame file
@@ -606,15 +678,7 @@ def load_savegame(savegame, datadir):
     engine = create_engine(savegame_uri)
 
     # All save games get upgraded to the latest version on load
-    '''
-    alembic_cfg = Config(os.path.join(datadir, "alembic.ini"))
-    alembic_cfg.set_main_option('sqlalchemy.url', savegame)
-    try:
-        alembic.upgrade(alembic_cfg)
-    except Exception as e:
-        flog.trace('error').fields(savegame=savegame).error('Savegame file was invalid')
-        raise MagnateInvalidSaveGame(f'{savegame} is not a valid save file')
-    '''
+    upgrade_savegame(engine, datadir)
 
     flog.debug('Returning engine')
     return engine
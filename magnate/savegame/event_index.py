@@ -0,0 +1,176 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Match events to the commodities they affect
+
+An event affects a commodity when every category of any one of the event's
+:class:`~magnate.savegame.db.EventCondition` is a category of the commodity.  Asking the ORM
+that question means walking the ``categories`` association proxies of every condition for every
+commodity.  :class:`EventIndex` loads all of the conditions once and turns each set of categories
+into a bitmask with one bit per :class:`~magnate.savegame.base_types.CommodityType` so that the
+subset test becomes ``condition & ~commodity == 0``.
+"""
+from collections import OrderedDict
+
+from . import base_types
+from . import db
+from ..logging import log
+
+
+mlog = log.fields(mod=__name__)
+
+
+def category_bit(category):
+    """
+    Return the bit which represents a single category
+
+    :arg category: A :class:`~magnate.savegame.base_types.CommodityType` or the name of one
+    :returns: An int with a single bit set
+    """
+    if isinstance(category, str):
+        category = base_types.CommodityType[category]
+    return 1 << (category.value - 1)
+
+
+def category_mask(categories):
+    """
+    Return the bitmask which represents a set of categories
+
+    :arg categories: Iterable of :class:`~magnate.savegame.base_types.CommodityType` or names of
+        them
+    :returns: An int with one bit set for each category
+    """
+    mask = 0
+    for category in categories:
+        mask |= category_bit(category)
+    return mask
+
+
+def mask_categories(mask):
+    """
+    Return the categories in a bitmask
+
+    :arg mask: Bitmask as returned by :func:`category_mask`
+    :returns: frozenset of :class:`~magnate.savegame.base_types.CommodityType`
+    """
+    return frozenset(c for c in base_types.CommodityType if mask & category_bit(c))
+
+
+class EventIndex:
+    """
+    In memory index of which events affect which commodities
+
+    Events are identified by whatever keys are passed in.  When loaded from a savegame with
+    :meth:`from_session`, they are the ids of the :class:`~magnate.savegame.db.EventData`.
+    """
+    def __init__(self, commodities, events):
+        """
+        :arg commodities: Mapping of commodity name to an iterable of the commodity's categories
+        :arg events: Mapping of event key to an iterable of the event's conditions.  Each condition
+            is an iterable of categories.
+        """
+        self.commodity_masks = OrderedDict((name, category_mask(categories))
+                                           for name, categories in commodities.items())
+
+        self.event_masks = OrderedDict()
+        # Events are grouped by condition mask as many events share the same conditions
+        self._mask_events = OrderedDict()
+        for key, conditions in events.items():
+            masks = []
+            for condition in conditions:
+                mask = category_mask(condition)
+                if mask not in masks:
+                    masks.append(mask)
+                    self._mask_events.setdefault(mask, []).append(key)
+            self.event_masks[key] = tuple(masks)
+
+        self._event_order = {key: idx for idx, key in enumerate(self.event_masks)}
+
+    @classmethod
+    def from_session(cls, session):
+        """
+        Load the index from a savegame
+
+        :arg session: A session on the savegame's database
+        :returns: An EventIndex keyed by the ids of the events
+
+        This takes three queries no matter how many commodities and events there are.
+        """
+        flog = mlog.fields(func='EventIndex.from_session')
+        flog.debug('Entered EventIndex.from_session')
+
+        commodities = OrderedDict()
+        query = session.query(db.CommodityData.name, db.CommodityCategory.category) \
+            .outerjoin(db.CommodityCategory) \
+            .order_by(db.CommodityData.id)
+        for name, category in query:
+            categories = commodities.setdefault(name, set())
+            if category is not None:
+                categories.add(category)
+
+        events = OrderedDict((event_id, OrderedDict()) for event_id,
+                             in session.query(db.EventData.id).order_by(db.EventData.id))
+        query = session.query(db.EventCondition.event_id, db.EventCondition.id,
+                              db.ConditionCategory.category) \
+            .outerjoin(db.ConditionCategory) \
+            .order_by(db.EventCondition.event_id, db.EventCondition.id)
+        for event_id, condition_id, category in query:
+            condition = events[event_id].setdefault(condition_id, set())
+            if category is not None:
+                condition.add(category)
+
+        flog.fields(commodities=len(commodities),
+                    events=len(events)).debug('Leaving EventIndex.from_session')
+        return cls(commodities, OrderedDict((event_id, conditions.values())
+                                            for event_id, conditions in events.items()))
+
+    def events_matching(self, categories):
+        """
+        Return the events which affect a commodity with the given categories
+
+        :arg categories: Iterable of categories or a bitmask from :func:`category_mask`
+        :returns: List of event keys in the order the events were given to the index
+        """
+        if not isinstance(categories, int):
+            categories = category_mask(categories)
+
+        matches = set()
+        for mask, keys in self._mask_events.items():
+            if not mask & ~categories:
+                matches.update(keys)
+        return sorted(matches, key=self._event_order.__getitem__)
+
+    def events_for(self, commodity):
+        """
+        Return the events which affect a commodity
+
+        :arg commodity: Name of the commodity
+        :returns: List of event keys in the order the events were given to the index
+        :raises KeyError: if the commodity is not in the index
+        """
+        return self.events_matching(self.commodity_masks[commodity])
+
+    def commodities_for(self, event):
+        """
+        Return the commodities which an event affects
+
+        :arg event: Key of the event
+        :returns: List of commodity names
+        :raises KeyError: if the event is not in the index
+        """
+        masks = self.event_masks[event]
+        return [name for name, commodity_mask in self.commodity_masks.items()
+                if any(not mask & ~commodity_mask for mask in masks)]
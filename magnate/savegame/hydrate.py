@@ -0,0 +1,109 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Load the state of a savegame in a fixed number of queries
+
+The relationships in :mod:`magnate.savegame.db` are lazy so walking from a location to its
+commodities or from a ship to its cargo issues one query per object visited.  The functions here
+tell SQLAlchemy up front which relationships are going to be used so that each relationship is
+loaded for every object with a single query.  Many-to-one relationships are joined into the query
+for their parent (:func:`~sqlalchemy.orm.joinedload`) while one-to-many relationships are loaded
+with one extra ``SELECT ... WHERE parent_id IN (...)`` (:func:`~sqlalchemy.orm.selectinload`).
+"""
+import attr
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+
+from ..logging import log
+from . import db
+
+
+mlog = log.fields(mod=__name__)
+
+
+@attr.s
+class GameState:
+    """
+    Everything in a savegame that a player can see
+
+    :locations: List of :class:`~magnate.savegame.db.LocationData` with their celestial, system,
+        and commodities loaded
+    :players: List of :class:`~magnate.savegame.db.Player` with their ships, cargo, ship parts,
+        and properties loaded
+    :world: The :class:`~magnate.savegame.db.World` record or None if it has not been created
+    """
+    locations = attr.ib(validator=attr.validators.instance_of(list))
+    players = attr.ib(validator=attr.validators.instance_of(list))
+    world = attr.ib(default=None)
+
+
+def location_query(session):
+    """
+    Query for every location along with its market
+
+    :arg session: A session on the savegame's database
+    :returns: A query for :class:`~magnate.savegame.db.LocationData`
+    """
+    return session.query(db.LocationData).options(
+        joinedload(db.LocationData.celestial).joinedload(db.CelestialData.system),
+        selectinload(db.LocationData.commodities).joinedload(db.Commodity.info)
+        .selectinload(db.CommodityData.categories),
+    ).order_by(db.LocationData.id)
+
+
+def player_query(session):
+    """
+    Query for players along with everything that they own
+
+    :arg session: A session on the savegame's database
+    :returns: A query for :class:`~magnate.savegame.db.Player`
+    """
+    # The ships, cargo, ship_parts, and properties relationships are backrefs which only exist
+    # once the mappers have been configured
+    configure_mappers()
+
+    ships = selectinload(db.Player.ships)
+    return session.query(db.Player).options(
+        ships.joinedload(db.Ship.info),
+        ships.joinedload(db.Ship.location),
+        ships.selectinload(db.Ship.cargo).joinedload(db.Cargo.commodity),
+        ships.selectinload(db.Ship.ship_parts).joinedload(db.ShipPart.info),
+        selectinload(db.Player.properties).joinedload(db.Property.info),
+    ).order_by(db.Player.id)
+
+
+def load_game(session, player_name=None):
+    """
+    Load the player visible state of a savegame
+
+    :arg session: A session on the savegame's database
+    :kwarg player_name: If given, only load this player.  Otherwise load all of them.
+    :returns: A :class:`GameState`.  Walking any of the relationships documented in
+        :class:`GameState` will not issue further queries while the session is open.
+    """
+    flog = mlog.fields(func='load_game')
+    flog.fields(player_name=player_name).debug('Entered load_game')
+
+    locations = location_query(session).all()
+
+    players = player_query(session)
+    if player_name is not None:
+        players = players.filter(db.Player.name == player_name)
+    players = players.all()
+
+    world = session.query(db.World).first()
+
+    flog.fields(locations=len(locations), players=len(players)).debug('Leaving load_game')
+    return GameState(locations, players, world)
@@ -0,0 +1,384 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Write-ahead journal of the trades and movements of players
+
+Saving the whole game after every trade would cost a SQLite transaction each time.  Instead, each
+order that the dispatcher applies and each move of a ship is appended to a journal file next to the
+savegame.  When the game is loaded, :func:`magnate.savegame.load.init_game` replays the journal into
+the savegame and empties it.  A running game may do the same with :meth:`OrderJournal.compact`.
+
+Records are buffered in memory and written with a single :func:`os.write` and fsync for every
+batch.  A batch is written when ``commit_delay`` seconds have passed since its first record or when
+it reaches ``max_pending`` bytes, so many trades share the cost of one fsync.  Each record is
+framed by its length and a CRC32 and encoded with :data:`magnate.codec.STORAGE_CODEC` so that it
+can be read by later releases.  A record which was only partly written when the game crashed
+fails the check and it and anything after it is ignored.  :class:`OrderJournal` cuts such a torn
+record off the end of the file when it opens the journal so that the records it appends can be
+read.  A complete record which cannot be decoded is an error and the journal is kept so that the
+records after it are not lost.
+
+Applying a journal and emptying it cannot be done atomically.  So that a crash between the two does
+not apply the records twice, every journal starts with a header record holding a random
+generation id.  The savegame's :class:`~magnate.savegame.db.JournalState` records the generation
+and how many of its records have been applied in the same transaction as the changes, and those
+records are skipped if the journal is applied again.
+"""
+import os
+import struct
+import zlib
+
+from ..codec import STORAGE_CODEC, WireError
+from ..errors import MagnateInvalidJournal
+from ..logging import log
+from . import db
+
+
+mlog = log.fields(mod=__name__)
+
+#: Record of an order which was applied.  The price of the Order is the price which was paid
+ORDER_RECORD = 'order'
+#: Record of a ship moving to a new location
+MOVE_RECORD = 'move'
+#: First record of a journal.  It holds the generation id of the journal
+HEADER_RECORD = 'journal'
+
+#: Length and CRC32 of each record
+_FRAME = struct.Struct('!II')
+
+#: Default number of seconds that a record waits for others to be written with it
+DEFAULT_COMMIT_DELAY = 0.005
+#: Default number of buffered bytes after which they are written without waiting
+DEFAULT_MAX_PENDING = 64 * 1024
+
+
+def journal_path(savegame):
+    """Return the path of the journal which belongs to a savegame file"""
+    return savegame + '.orders'
+
+
+def encode_record(record, codec=STORAGE_CODEC):
+    """
+    Encode a journal record
+
+    :arg record: Tuple of the kind of record and its fields
+    :kwarg codec: The :class:`magnate.codec.Codec` to encode with
+    :returns: bytes of the framed record
+    :raises magnate.codec.WireError: if the record cannot be encoded
+    """
+    payload = codec.encode(record)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _complete_records(data):
+    """
+    Find the records which were completely written
+
+    :arg data: :class:`memoryview` of the journal
+    :returns: A tuple of a list of (offset, payload) of each complete record and the offset after
+        the last of them
+    """
+    records = []
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append((offset, payload))
+        offset = start + length
+    return records, offset
+
+
+def new_generation():
+    """Return a new, random generation id for a journal"""
+    return os.urandom(8).hex()
+
+
+def load_journal(path, codec=STORAGE_CODEC):
+    """
+    Read the generation id and the records of a journal file
+
+    :arg path: Path to the journal
+    :kwarg codec: The :class:`magnate.codec.Codec` the records were encoded with
+    :returns: A tuple of the generation id and a list of the records which were completely
+        written, without the header.  The generation is None if the journal does not exist or was
+        written by an older version of the game without a header
+    :raises magnate.errors.MagnateInvalidJournal: if a record was completely written but cannot
+        be decoded.  The records after it may be valid so the journal must not be emptied
+    """
+    flog = mlog.fields(func='load_journal', path=path)
+    try:
+        with open(path, 'rb') as f:
+            data = memoryview(f.read())
+    except FileNotFoundError:
+        return None, []
+
+    complete, end = _complete_records(data)
+    if end < len(data):
+        flog.fields(offset=end).warning('Journal ends with a partly written record')
+
+    records = []
+    for offset, payload in complete:
+        try:
+            records.append(codec.decode(payload))
+        except WireError as e:
+            flog.fields(offset=offset).trace('error').error('Journal has an invalid record')
+            raise MagnateInvalidJournal('{} has an invalid record at offset {}: {}'.format(
+                path, offset, e))
+
+    generation = None
+    if records and records[0][0] == HEADER_RECORD:
+        generation = records[0][1]
+        records = records[1:]
+    return generation, records
+
+
+def read_journal(path, codec=STORAGE_CODEC):
+    """
+    Read the records in a journal file
+
+    :arg path: Path to the journal
+    :kwarg codec: The :class:`magnate.codec.Codec` the records were encoded with
+    :returns: A list of the records which were completely written, without the header.  The list
+        is empty if the journal does not exist
+    :raises magnate.errors.MagnateInvalidJournal: if a record was completely written but cannot
+        be decoded.  The records after it may be valid so the journal must not be emptied
+    """
+    return load_journal(path, codec)[1]
+
+
+class OrderJournal:
+    """
+    Append records to a journal file with group commit
+    """
+    def __init__(self, path, loop=None, commit_delay=DEFAULT_COMMIT_DELAY,
+                 max_pending=DEFAULT_MAX_PENDING, sync=True):
+        """
+        :arg path: Path to the journal file.  It is created, with a new generation id, if it does
+            not exist or is empty.  A partly written record at its end is removed
+        :kwarg loop: The asyncio event loop to schedule commits on.  If None, each record is written
+            as soon as it is added
+        :kwarg commit_delay: Seconds a record waits for others to be written with it
+        :kwarg max_pending: Buffered bytes after which they are written without waiting
+        :kwarg sync: If True, fsync the journal after each write so that the records survive
+            a crash of the machine as well as of the game
+        """
+        self.path = path
+        self.loop = loop
+        self.commit_delay = commit_delay
+        self.max_pending = max_pending
+        self.sync = sync
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        self._truncate_torn_record()
+        if not os.fstat(self._fd).st_size:
+            self._write_header()
+        self._pending = bytearray()
+        self._commit_handle = None
+        #: Number of records added since the journal was opened
+        self.records = 0
+        #: Number of writes to the journal file since it was opened
+        self.commits = 0
+
+    def _truncate_torn_record(self):
+        """
+        Cut off a record which a crash left partly written
+
+        Otherwise the records appended after it could never be read.
+        """
+        size = os.fstat(self._fd).st_size
+        if not size:
+            return
+        _, end = _complete_records(memoryview(os.pread(self._fd, size, 0)))
+        if end < size:
+            mlog.fields(func='OrderJournal._truncate_torn_record', path=self.path, offset=end,
+                        size=size).warning('Removing a partly written record from the journal')
+            os.ftruncate(self._fd, end)
+            if self.sync:
+                os.fsync(self._fd)
+
+    def _write_header(self):
+        """Start the empty journal file with a new generation id"""
+        os.write(self._fd, encode_record((HEADER_RECORD, new_generation())))
+        if self.sync:
+            os.fsync(self._fd)
+
+    def append(self, record):
+        """
+        Add a record to the journal
+
+        :arg record: Tuple of the kind of record and its fields
+        :raises magnate.codec.WireError: if the record cannot be encoded
+        """
+        self._pending += encode_record(record)
+        self.records += 1
+        if self.loop is None or len(self._pending) >= self.max_pending:
+            self.commit()
+        elif self._commit_handle is None:
+            self._commit_handle = self.loop.call_later(self.commit_delay, self.commit)
+
+    def record_order(self, player, order):
+        """
+        Add an applied order to the journal
+
+        :arg player: Name of the player who placed the order
+        :arg order: The :class:`magnate.order.Order` with the price that was paid
+        """
+        self.append((ORDER_RECORD, player, order))
+
+    def record_move(self, player, location):
+        """
+        Add a ship's move to the journal
+
+        :arg player: Name of the player who owns the ship
+        :arg location: Name of the location the ship moved to
+        """
+        self.append((MOVE_RECORD, player, location))
+
+    def commit(self):
+        """Write the buffered records to the journal file"""
+        if self._commit_handle is not None:
+            self._commit_handle.cancel()
+            self._commit_handle = None
+        if not self._pending:
+            return
+        with memoryview(self._pending) as data:
+            written = 0
+            while written < len(data):
+                written += os.write(self._fd, data[written:])
+        if self.sync:
+            os.fsync(self._fd)
+        self._pending.clear()
+        self.commits += 1
+
+    def compact(self, session, codec=STORAGE_CODEC):
+        """
+        Apply the journal to a savegame and empty the journal
+
+        :arg session: A session on the savegame's database.  It is committed before the journal is
+            emptied
+        :kwarg codec: The :class:`magnate.codec.Codec` the records were encoded with
+        :returns: Number of records which were applied
+        :raises magnate.errors.MagnateInvalidJournal: if the journal cannot be read.  Nothing is
+            applied and the journal is kept
+        """
+        self.commit()
+        generation, records = load_journal(self.path, codec)
+        applied = replay(session, records, generation)
+        session.commit()
+        os.ftruncate(self._fd, 0)
+        self._write_header()
+        return applied
+
+    def close(self):
+        """Write the remaining records and close the journal file"""
+        if self._fd is None:
+            return
+        self.commit()
+        os.close(self._fd)
+        self._fd = None
+
+
+def _apply_order(session, player, order, time):
+    """Apply an order record to a player in the savegame"""
+    quantity = order.hold_quantity + order.warehouse_quantity
+    if order.buy:
+        player.cash -= order.price * quantity
+    else:
+        player.cash += order.price * quantity
+
+    commodity = session.query(db.CommodityData).filter_by(name=order.commodity).one_or_none()
+    if commodity is None or not player.ships or not order.hold_quantity:
+        # Equipment and anything else that is not cargo only changes the player's cash
+        return
+    ship = player.ships[0]
+    if order.buy:
+        session.add(db.Cargo(ship=ship, commodity=commodity, quantity=order.hold_quantity,
+                             purchase_price=order.price, purchase_date=time))
+        return
+
+    # Sell the oldest cargo first
+    remaining = order.hold_quantity
+    cargo = session.query(db.Cargo).filter_by(ship=ship, commodity=commodity) \
+        .order_by(db.Cargo.purchase_date, db.Cargo.id)
+    for entry in cargo:
+        sold = min(remaining, entry.quantity)
+        entry.quantity -= sold
+        remaining -= sold
+        if not entry.quantity:
+            session.delete(entry)
+        if not remaining:
+            break
+
+
+def replay(session, records, generation=None):
+    """
+    Apply journal records to a savegame
+
+    :arg session: A session on the savegame's database.  The caller commits it.
+    :arg records: Records from :func:`load_journal`
+    :kwarg generation: Generation id of the journal.  The records of this generation which were
+        already applied to the savegame are skipped and the number applied is saved in the
+        session.  If None, every record is applied
+    :returns: Number of records which were applied.  Records for players or locations which are
+        not in the savegame are skipped
+    """
+    flog = mlog.fields(func='replay')
+    flog.fields(records=len(records), generation=generation).debug('Entered replay')
+
+    state = None
+    skip = 0
+    if generation is not None:
+        state = session.query(db.JournalState).first()
+        if state is None:
+            state = db.JournalState(generation=generation, applied=0)
+            session.add(state)
+        elif state.generation == generation:
+            # The game stopped after these were saved but before the journal was emptied
+            skip = state.applied
+            flog.fields(skipped=skip).info('Skipping journal records which were already applied')
+        state.generation = generation
+        state.applied = len(records)
+
+    world = session.query(db.World).first()
+    time = world.time if world is not None else 0
+    players = {}
+    applied = 0
+    for kind, name, *fields in records[skip:]:
+        player = players.get(name)
+        if player is None:
+            player = players[name] = session.query(db.Player).filter_by(name=name).one_or_none()
+        if player is None:
+            flog.fields(player=name).warning('Skipping a journal record for an unknown player')
+            continue
+
+        if kind == ORDER_RECORD:
+            _apply_order(session, player, fields[0], time)
+        elif kind == MOVE_RECORD:
+            location = session.query(db.LocationData).filter_by(name=fields[0]).one_or_none()
+            if location is None or not player.ships:
+                flog.fields(player=name, location=fields[0]).warning(
+                    'Skipping a move to a location that is not in the savegame')
+                continue
+            player.ships[0].location = location
+        else:
+            flog.fields(kind=kind).warning('Skipping an unknown kind of journal record')
+            continue
+        applied += 1
+
+    flog.fields(applied=applied).debug('Leaving replay')
+    return applied
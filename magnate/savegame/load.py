@@ -21,9 +21,12 @@ Set a savegame file for the program to use.
 import os
 
 
+from sqlalchemy.orm import sessionmaker
+
 from ..errors import MagnateNoSaveGame
 from ..logging import log
 from . import db
+from .journal import journal_path, load_journal, replay
 
 
 mlog = log.fields(mod=__name__)
@@ -38,10 +41,49 @@ mlog = log.fields(mod=__name__)
 # Game setup mechanics
 #
 
-def init_game(savegame, datadir):
-    """Initialize a game from a savegame file"""
+def replay_journal(engine, path):
+    """
+    Apply the trades and movements recorded in a journal to the savegame and empty the journal
+
+    :arg engine: SQLAlchemy engine refering to the savegame file
+    :arg path: Path to the journal.  Nothing is done if it does not exist
+    :returns: Number of records which were applied
+    :raises magnate.errors.MagnateInvalidJournal: if the journal cannot be read.  Nothing is
+        applied and the journal is kept
+    """
+    flog = mlog.fields(func='replay_journal', path=path)
+    generation, records = load_journal(path)
+    if not records:
+        return 0
+
+    Session = sessionmaker(bind=engine)  # pylint: disable=invalid-name
+    session = Session()
+    try:
+        applied = replay(session, records, generation)
+        session.commit()
+    finally:
+        session.close()
+
+    # The savegame has the changes now.  If the game stops before the journal is emptied, the
+    # generation saved with them keeps them from being applied again
+    os.truncate(path, 0)
+    flog.fields(records=len(records), applied=applied).info('Replayed the order journal')
+    return applied
+
+
+def init_game(savegame, datadir, journal=None):
+    """
+    Initialize a game from a savegame file
+
+    :arg savegame: Path to the savegame.  It is created if it does not exist
+    :arg datadir: The data directory
+    :kwarg journal: Path of the order journal which the game wrote its trades to.  It is applied
+        to the savegame and emptied.  Defaults to :func:`~magnate.savegame.journal.journal_path`
+        of the savegame
+    :returns: SQLAlchemy engine refering to the savegame
+    """
     flog = mlog.fields(func='init_game')
-    flog.fields(savegame=savegame, datadir=datadir).debug('Enter init_game')
+    flog.fields(savegame=savegame, datadir=datadir, journal=journal).debug('Enter init_game')
 
     # Finish initializing dynamic parts of the schema
     db.init_schema(datadir)
@@ -54,5 +96,9 @@ def init_game(savegame, datadir):
         flog.debug('Attempting to create')
         game_state = db.create_savegame(savegame, datadir)
 
+    if journal is None:
+        journal = journal_path(savegame)
+    replay_journal(game_state, journal)
+
     flog.debug('Leaving init_game')
     return game_state
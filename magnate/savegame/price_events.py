@@ -0,0 +1,105 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Resolve which events affect the price of each commodity in a savegame
+
+In the savegame, an :class:`~magnate.savegame.db.EventData` affects a commodity when all of the
+categories of any one of its :class:`~magnate.savegame.db.EventCondition` are categories of the
+commodity.  Working that out requires joining the events, conditions, and commodity categories
+together.  Instead of doing that each time a price is set, the events for every commodity are
+resolved once, when the game is loaded, into a table of :class:`magnate.market.PriceEvents`.
+"""
+from collections import OrderedDict
+
+from sqlalchemy.orm import sessionmaker
+
+from ..logging import log
+from ..market import PriceEvent, PriceEvents
+from . import db
+from .event_index import EventIndex
+
+
+mlog = log.fields(mod=__name__)
+
+
+def _event_table(index, events):
+    """
+    Create the table of events for every commodity in an :class:`EventIndex`
+
+    :arg index: :class:`EventIndex` of the events
+    :arg events: Mapping of the event keys in index to (msg, adjustment)
+    """
+    price_events = OrderedDict((key, (PriceEvent(msg, abs(adjustment)), adjustment < 0))
+                               for key, (msg, adjustment) in events.items())
+
+    table = OrderedDict()
+    for name in index.commodity_masks:
+        sales = []
+        shortages = []
+        for key in index.events_for(name):
+            price_event, is_sale = price_events[key]
+            if is_sale:
+                sales.append(price_event)
+            else:
+                shortages.append(price_event)
+        table[name] = PriceEvents(sales, shortages)
+
+    return table
+
+
+def build_event_table(commodities, events):
+    """
+    Create a table of the events which affect each commodity
+
+    :arg commodities: Mapping of commodity name to the set of categories the commodity is in
+    :arg events: Iterable of (msg, adjustment, conditions) for each event.  conditions is an
+        iterable of sets of categories.  The event affects a commodity if all of the categories in
+        any one of the conditions are categories of the commodity.
+    :returns: Mapping of commodity name to :class:`magnate.market.PriceEvents`.  Events with
+        a negative adjustment are sales and those with a positive adjustment are shortages.
+    """
+    events = list(events)
+    index = EventIndex(commodities, OrderedDict((idx, event[2])
+                                                for idx, event in enumerate(events)))
+    return _event_table(index, OrderedDict((idx, event[:2]) for idx, event in enumerate(events)))
+
+
+def load_event_table(engine):
+    """
+    Load the events which affect each commodity from a savegame
+
+    :arg engine: SQLAlchemy engine for the savegame
+    :returns: Mapping of commodity name to :class:`magnate.market.PriceEvents`
+
+    The events, conditions, and commodities are loaded with a fixed number of queries no matter how
+    many of them there are.
+    """
+    flog = mlog.fields(func='load_event_table')
+    flog.debug('Entered load_event_table')
+
+    Session = sessionmaker(bind=engine)  # pylint: disable=invalid-name
+    session = Session()
+    try:
+        index = EventIndex.from_session(session)
+        events = OrderedDict((event_id, (msg, adjustment)) for event_id, msg, adjustment
+                             in session.query(db.EventData.id, db.EventData.msg,
+                                              db.EventData.adjustment))
+    finally:
+        session.close()
+
+    flog.fields(commodities=len(index.commodity_masks),
+                events=len(events)).debug('Leaving load_event_table')
+    return _event_table(index, events)
@@ -0,0 +1,93 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Save and load the price history in a savegame
+
+Each :class:`magnate.price_history.PriceChunk` is stored as one row of the ``price_history`` table
+with the encoded samples in a BLOB.  Only the retained chunks are saved so the table does not grow
+beyond the retention of each series.
+"""
+from ..logging import log
+from ..price_history import DEFAULT_CHUNK_SIZE, DEFAULT_RETENTION, PriceChunk, PriceHistory
+from . import db
+
+
+mlog = log.fields(mod=__name__)
+
+
+def save_price_history(session, history):
+    """
+    Replace the price history in a savegame
+
+    :arg session: A session on the savegame's database.  The caller commits it.
+    :arg history: The :class:`magnate.price_history.PriceHistory` to save
+    """
+    flog = mlog.fields(func='save_price_history')
+    flog.debug('Entered save_price_history')
+
+    location_ids = dict(session.query(db.LocationData.name, db.LocationData.id))
+    commodity_ids = dict(session.query(db.CommodityData.name, db.CommodityData.id))
+
+    session.query(db.PriceHistoryChunk).delete()
+
+    rows = []
+    for location, commodity in history:
+        location_id = location_ids.get(location)
+        commodity_id = commodity_ids.get(commodity)
+        if location_id is None or commodity_id is None:
+            flog.fields(location=location, commodity=commodity).warning(
+                'Not saving price history for a market that is not in the savegame')
+            continue
+
+        for chunk in history.series(location, commodity).seal():
+            rows.append({'location_id': location_id, 'commodity_id': commodity_id,
+                         'first_time': chunk.first_time, 'last_time': chunk.last_time,
+                         'count': chunk.count, 'data': chunk.data})
+
+    if rows:
+        session.execute(db.PriceHistoryChunk.__table__.insert(), rows)
+
+    flog.fields(chunks=len(rows)).debug('Leaving save_price_history')
+
+
+def load_price_history(session, retention=DEFAULT_RETENTION, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Load the price history from a savegame
+
+    :arg session: A session on the savegame's database
+    :kwarg retention: Number of samples to keep for each (location, commodity)
+    :kwarg chunk_size: Number of samples to store in each new chunk
+    :returns: A :class:`magnate.price_history.PriceHistory`
+    """
+    flog = mlog.fields(func='load_price_history')
+    flog.debug('Entered load_price_history')
+
+    history = PriceHistory(retention, chunk_size)
+    query = session.query(db.LocationData.name, db.CommodityData.name,
+                          db.PriceHistoryChunk.data) \
+        .select_from(db.PriceHistoryChunk) \
+        .join(db.LocationData, db.PriceHistoryChunk.location_id == db.LocationData.id) \
+        .join(db.CommodityData, db.PriceHistoryChunk.commodity_id == db.CommodityData.id) \
+        .order_by(db.PriceHistoryChunk.location_id, db.PriceHistoryChunk.commodity_id,
+                  db.PriceHistoryChunk.first_time)
+
+    num_chunks = 0
+    for location, commodity, data in query:
+        history.series(location, commodity).add_chunk(PriceChunk.from_data(bytes(data)))
+        num_chunks += 1
+
+    flog.fields(chunks=num_chunks).debug('Leaving load_price_history')
+    return history
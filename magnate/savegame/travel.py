@@ -0,0 +1,52 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Build the travel graph from a savegame
+
+The distance between locations comes from the orbit of the celestial body that each location is on.
+"""
+from collections import OrderedDict
+
+from ..logging import log
+from ..travel import TravelGraph
+from . import db
+
+
+mlog = log.fields(mod=__name__)
+
+
+def load_travel_graph(session):
+    """
+    Create the travel graph for the locations in a savegame
+
+    :arg session: A session on the savegame's database
+    :returns: A :class:`magnate.travel.TravelGraph`
+    """
+    flog = mlog.fields(func='load_travel_graph')
+    flog.debug('Entered load_travel_graph')
+
+    query = session.query(db.SystemData.name, db.LocationData.name, db.CelestialData.orbit) \
+        .select_from(db.LocationData) \
+        .join(db.CelestialData, db.LocationData.celestial_id == db.CelestialData.id) \
+        .join(db.SystemData, db.CelestialData.system_id == db.SystemData.id) \
+        .order_by(db.SystemData.id, db.CelestialData.orbit, db.LocationData.id)
+
+    systems = OrderedDict()
+    for system, location, orbit in query:
+        systems.setdefault(system, OrderedDict())[location] = orbit
+
+    flog.fields(systems=len(systems)).debug('Leaving load_travel_graph')
+    return TravelGraph(systems)
@@ -0,0 +1,344 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Serve the game's events to user interfaces in other processes
+
+Clients connect over TCP or a Unix socket and exchange :mod:`magnate.wire` messages.  A client
+subscribes to the events it wants to receive and publishes ``action.*`` and ``query.*`` events for
+the backend to act on.
+
+When a client connects, the server sends it a :data:`magnate.wire.HELLO` message with the names of
+the game's commodities, locations, and ship types.  Both ends then encode those names as their
+position in that table (see :mod:`magnate.codec`).
+
+When the server is given the game's :class:`magnate.dispatcher.Dispatcher`, each client gets its
+own :class:`magnate.session.Session`.  The client's events keep their usual names on the wire but
+the player's events are published and subscribed in the session's namespace on the server so each
+client plays its own user and ship in the shared markets.
+
+The server subscribes to each event once, no matter how many clients want it.  When the event is
+published, it is encoded once and the same bytes are written to every client which subscribed to
+it.
+
+Writes never wait for a client.  If a client falls behind, the data waiting to be sent to it grows.
+Past ``high_water`` bytes, events which a newer event will make obsolete (:data:`DROPPABLE_EVENTS`)
+are no longer sent to that client.  Past ``max_buffer`` bytes, the client is disconnected so that it
+cannot make the server run out of memory.
+"""
+import argparse
+import asyncio
+import getpass
+import sys
+from functools import partial
+
+from .auth import HashingAuthProvider, create_auth_provider
+from .codec import Codec, game_names
+from .errors import MagnateAuthError
+from .logging import log
+from .magnate import Magnate
+from .wire import (CLIENT_EVENTS, DEFAULT_PORT, HELLO, PUBLISH, REFUSED_SUBSCRIPTIONS, SUBSCRIBE,
+                   UNSUBSCRIBE, WireError, encode_message, read_message)
+
+
+mlog = log.fields(mod=__name__)
+
+#: Default number of bytes waiting to be sent after which droppable events are skipped
+DEFAULT_HIGH_WATER = 256 * 1024
+#: Default number of bytes waiting to be sent after which the client is disconnected
+DEFAULT_MAX_BUFFER = 4 * 1024 * 1024
+
+#: Prefixes of events which may be skipped for a slow client because a later event supersedes them
+DROPPABLE_EVENTS = ('market.',)
+
+
+class Connection:
+    """A client connected to the :class:`GameServer`"""
+    def __init__(self, server, reader, writer):
+        """
+        :arg server: The :class:`GameServer` the client connected to
+        :arg reader: The :class:`asyncio.StreamReader` for the client
+        :arg writer: The :class:`asyncio.StreamWriter` for the client
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info('peername')
+        #: The player's :class:`magnate.session.Session`.  None if the clients share one player
+        self.session = None
+        if server.dispatcher is not None:
+            self.session = server.dispatcher.open_session()
+        #: Names of the events the client subscribed to
+        self.subscriptions = set()
+        #: Number of events which were not sent because the client was behind
+        self.dropped = 0
+        self.closed = False
+
+    def send(self, frame, droppable=False):
+        """
+        Queue a frame to be written to the client
+
+        :arg frame: bytes of the frame
+        :kwarg droppable: If True, the frame is skipped when the client is behind
+        """
+        if self.closed:
+            return
+        buffered = self.writer.transport.get_write_buffer_size()
+        if buffered > self.server.max_buffer:
+            mlog.fields(peer=self.peer, buffered=buffered).warning(
+                'Disconnecting a client which is not reading its events')
+            self.close()
+            return
+        if droppable and buffered > self.server.high_water:
+            self.dropped += 1
+            return
+        self.writer.write(frame)
+
+    def scope(self, event):
+        """Return the name of one of the client's events on the server's PubPen"""
+        if self.session is None:
+            return event
+        return self.session.pubpen.scope(event)
+
+    def close(self):
+        """Disconnect the client"""
+        if not self.closed:
+            self.closed = True
+            self.server.disconnected(self)
+            if self.session is not None:
+                self.server.dispatcher.close_session(self.session.session_id)
+            self.writer.close()
+
+    async def serve(self):
+        """Act on the messages from the client until it disconnects"""
+        flog = mlog.fields(func='Connection.serve', peer=self.peer)
+        flog.debug('Client connected')
+        codec = self.server.codec
+        # The name table is sent without using it so the client can decode it
+        self.writer.write(encode_message(HELLO, '', (codec.names,)))
+        try:
+            while not self.closed:
+                kind, event, args, kwargs = await read_message(self.reader, codec)
+                if kind == PUBLISH:
+                    if event.startswith(CLIENT_EVENTS):
+                        self.server.pubpen.publish(self.scope(event), *args, **kwargs)
+                    else:
+                        flog.fields(event=event).warning('Client may not publish this event')
+                elif kind == SUBSCRIBE:
+                    if event.startswith(REFUSED_SUBSCRIPTIONS):
+                        flog.fields(event=event).warning('Client may not subscribe to this event')
+                    else:
+                        self.server.subscribe(self, event)
+                elif kind == UNSUBSCRIBE:
+                    self.server.unsubscribe(self, event)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except WireError:
+            flog.trace('error').warning('Client sent an invalid message')
+        finally:
+            self.close()
+            flog.fields(dropped=self.dropped).debug('Client disconnected')
+
+
+class GameServer:
+    """
+    Share one game's events with many clients
+    """
+    def __init__(self, pubpen, names=(), dispatcher=None, high_water=DEFAULT_HIGH_WATER,
+                 max_buffer=DEFAULT_MAX_BUFFER):
+        """
+        :arg pubpen: The :class:`pubmarine.PubPen` the game's backend uses
+        :kwarg names: Names which are sent as their position in this sequence instead of as
+            strings.  See :func:`magnate.codec.game_names`
+        :kwarg dispatcher: The game's :class:`magnate.dispatcher.Dispatcher`.  If given, each
+            client plays in its own session.  If None, every client shares the local player
+        :kwarg high_water: Bytes waiting to be sent to a client after which droppable events
+            are not sent to it
+        :kwarg max_buffer: Bytes waiting to be sent to a client after which it is disconnected
+        """
+        self.pubpen = pubpen
+        self.codec = Codec(names)
+        self.dispatcher = dispatcher
+        self.high_water = high_water
+        self.max_buffer = max_buffer
+        self.connections = set()
+        self._servers = []
+        self._tasks = set()
+        #: Clients subscribed to each event, by the event's name on the PubPen
+        self._subscribers = {}
+        # The PubPen only holds weak references to its callbacks so the forwarding functions are
+        # kept alive here
+        self._forwarders = {}
+        self._sub_ids = {}
+
+    async def start(self, host=None, port=DEFAULT_PORT, path=None):
+        """
+        Start accepting clients
+
+        :kwarg host: Address to listen on for TCP clients.  If None and path is None, listen on
+            localhost
+        :kwarg port: Port to listen on for TCP clients
+        :kwarg path: Path of a Unix socket to listen on
+        """
+        if path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._accept, path))
+        if host is not None or path is None:
+            self._servers.append(await asyncio.start_server(self._accept, host or 'localhost',
+                                                            port))
+        mlog.fields(host=host, port=port, path=path).info('Accepting clients')
+
+    @property
+    def sockets(self):
+        """The sockets that the server is listening on"""
+        return [sock for server in self._servers for sock in server.sockets]
+
+    async def close(self):
+        """Disconnect every client and stop accepting new ones"""
+        for server in self._servers:
+            server.close()
+        for connection in list(self.connections):
+            connection.close()
+        # Let each connection notice that it was closed
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    async def _accept(self, reader, writer):
+        """Serve a newly connected client"""
+        connection = Connection(self, reader, writer)
+        self.connections.add(connection)
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            await connection.serve()
+        finally:
+            self._tasks.discard(task)
+
+    def subscribe(self, connection, event):
+        """Forward an event to a client"""
+        name = connection.scope(event)
+        clients = self._subscribers.get(name)
+        if clients is None:
+            clients = self._subscribers[name] = set()
+            forwarder = self._forwarders[name] = partial(self._forward, name, event)
+            self._sub_ids[name] = self.pubpen.subscribe(name, forwarder)
+        clients.add(connection)
+        connection.subscriptions.add(event)
+
+    def unsubscribe(self, connection, event):
+        """Stop forwarding an event to a client"""
+        connection.subscriptions.discard(event)
+        name = connection.scope(event)
+        clients = self._subscribers.get(name)
+        if clients is None:
+            return
+        clients.discard(connection)
+        if not clients:
+            self.pubpen.unsubscribe(self._sub_ids.pop(name))
+            del self._subscribers[name]
+            del self._forwarders[name]
+
+    def disconnected(self, connection):
+        """Forget a client which has disconnected"""
+        self.connections.discard(connection)
+        for event in list(connection.subscriptions):
+            self.unsubscribe(connection, event)
+
+    def _forward(self, name, event, *args, **kwargs):
+        """
+        Send an event to every client subscribed to it
+
+        :arg name: The name of the event on the PubPen
+        :arg event: The name of the event that the clients subscribed to
+        """
+        try:
+            frame = encode_message(PUBLISH, event, args, kwargs, self.codec)
+        except WireError:
+            mlog.fields(event=event).trace('error').error('Could not encode an event')
+            return
+        # Events in a session's namespace answer that player's own actions so they are never dropped
+        droppable = name == event and event.startswith(DROPPABLE_EVENTS)
+        for connection in list(self._subscribers.get(name, ())):
+            connection.send(frame, droppable)
+
+
+def _parse_args(args):
+    """Parse the command line arguments which are specific to the server"""
+    parser = argparse.ArgumentParser(prog='magnate-server', add_help=False)
+    parser.add_argument('--listen', dest='host', action='store', default=None,
+                        help='Address to listen on for TCP connections.  Defaults to localhost'
+                        ' unless --unix-socket is given')
+    parser.add_argument('--port', dest='port', action='store', type=int, default=DEFAULT_PORT,
+                        help='Port to listen on for TCP connections')
+    parser.add_argument('--unix-socket', dest='path', action='store', default=None,
+                        help='Path of a Unix socket to listen on')
+    parser.add_argument('--add-user', dest='add_user', action='store', default=None,
+                        help='Add a player to the auth_db, prompting for their password, and exit')
+    args, _ = parser.parse_known_args(args)
+    return args
+
+
+def add_user(cfg, username):
+    """
+    Add a player to the credentials database, prompting for their password
+
+    :arg cfg: The game's configuration
+    :arg username: Name of the new player
+    :returns: The exit code for the program
+    """
+    provider = create_auth_provider(cfg)
+    if not isinstance(provider, HashingAuthProvider):
+        print('Set auth_db in the config file to store players\' passwords')
+        return 1
+    password = getpass.getpass('Password for {}: '.format(username))
+    if password != getpass.getpass('Repeat the password: '):
+        print('The passwords do not match')
+        return 1
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(provider.set_password(username, password, create=True))
+    except MagnateAuthError as e:
+        print(e)
+        return 1
+    finally:
+        loop.close()
+    return 0
+
+
+def main():
+    """Run the game backend as a server.  This is the entrypoint for magnate-server"""
+    magnate = Magnate()
+    args = _parse_args(magnate.cfg['ui_args'])
+    magnate.setup()
+    if args.add_user:
+        return add_user(magnate.cfg, args.add_user)
+
+    loop = asyncio.get_event_loop()
+    magnate.start_backend(loop)
+    server = GameServer(magnate.pubpen, game_names(magnate), magnate.dispatcher)
+    loop.run_until_complete(server.start(args.host, args.port, args.path))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
+        magnate.stop_backend()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Sessions of the players in a game
+
+Every player has a :class:`Session`.  The player's user, ship, and the dispatcher's handlers for the
+player's actions talk over the session's :class:`ScopedPubPen`.  It publishes and subscribes the
+player's events (:data:`SESSION_EVENTS`) under a name which starts with ``session.{id}.`` so
+``query.user.info`` from one player only reaches that player's user.  Everything else, like the
+markets and the world's ticks, is shared by every session.
+
+The session of the local player has no id and its events are not renamed so a single player game
+uses the same event names that it always has.
+"""
+import itertools
+import sys
+
+from .events import publisher
+
+
+#: Prefixes of events which belong to one player
+SESSION_EVENTS = ('action.', 'fleet.', 'query.fleet.', 'query.routes.', 'query.ship.',
+                  'query.user.', 'routes.', 'ship.', 'user.')
+#: Suffixes of market events which confirm one player's orders
+SESSION_EVENT_SUFFIXES = ('.purchased', '.sold')
+
+
+class ScopedPubPen:
+    """
+    View of a :class:`pubmarine.PubPen` which keeps one player's events apart from the others'
+
+    It has the subscribe, unsubscribe, and publish methods of a PubPen.  Events in
+    :data:`SESSION_EVENTS` are renamed into the session's namespace before being passed on.
+    :func:`magnate.events.publisher` also publishes into the namespace when it is given
+    a ScopedPubPen.
+    """
+    def __init__(self, pubpen, session_id=None):
+        """
+        :arg pubpen: The game's :class:`pubmarine.PubPen`
+        :kwarg session_id: Id of the session.  If None, events are not renamed
+        """
+        self.pubpen = pubpen
+        self.loop = pubpen.loop
+        self.session_id = session_id
+        self.prefix = None if session_id is None else 'session.{}.'.format(session_id)
+        self._sub_ids = set()
+        # Cache of the names of events in this namespace
+        self._topics = {}
+
+    def scope(self, event):
+        """
+        Return the name that an event has in the session's namespace
+
+        :arg event: The name of the event
+        :returns: The name to publish and subscribe to on the game's PubPen
+        """
+        try:
+            return self._topics[event]
+        except KeyError:
+            pass
+        name = event
+        if self.prefix is not None and (event.startswith(SESSION_EVENTS)
+                                        or event.endswith(SESSION_EVENT_SUFFIXES)):
+            name = sys.intern(self.prefix + event)
+        self._topics[event] = name
+        return name
+
+    def subscribe(self, event, callback):
+        """Subscribe a callback to an event in this namespace"""
+        sub_id = self.pubpen.subscribe(self.scope(event), callback)
+        self._sub_ids.add(sub_id)
+        return sub_id
+
+    def unsubscribe(self, sub_id):
+        """Unsubscribe from an event"""
+        self._sub_ids.discard(sub_id)
+        self.pubpen.unsubscribe(sub_id)
+
+    def publish(self, event, *args, **kwargs):
+        """Publish an event in this namespace"""
+        self.pubpen.publish(self.scope(event), *args, **kwargs)
+
+    def close(self):
+        """Remove every subscription made through this view"""
+        for sub_id in self._sub_ids:
+            self.pubpen.unsubscribe(sub_id)
+        self._sub_ids = set()
+        if self.prefix is not None:
+            # Forget the session's event names so that they do not pile up as players come and go
+            # pylint: disable=protected-access
+            handlers = self.pubpen._event_handlers
+            for name in self._topics.values():
+                if name.startswith(self.prefix) and not handlers.get(name, True):
+                    del handlers[name]
+            # pylint: enable=protected-access
+
+
+class Session:
+    """
+    One player's connection to the game
+    """
+    def __init__(self, pubpen, session_id=None):
+        """
+        :arg pubpen: The game's :class:`pubmarine.PubPen`
+        :kwarg session_id: Id of the session.  None for the local player
+        """
+        self.session_id = session_id
+        self.pubpen = ScopedPubPen(pubpen, session_id)
+        #: The :class:`magnate.magnate.User` once the player has logged in
+        self.user = None
+        #: Callbacks subscribed for the session.  The PubPen only holds weak references to them
+        self.callbacks = []
+        #: True once the session has been closed
+        self.closed = False
+        self._publishers = {}
+
+    def publisher(self, template, *args):
+        """
+        Return a :class:`magnate.events.Publisher` for an event in the session's namespace
+
+        The Publisher is created the first time it is asked for and then reused.
+        """
+        key = (template, args)
+        try:
+            return self._publishers[key]
+        except KeyError:
+            pub = self._publishers[key] = publisher(self.pubpen, template, *args)
+            return pub
+
+    def close(self):
+        """Stop handling the session's events"""
+        self.closed = True
+        self.pubpen.close()
+        self.callbacks = []
+        self._publishers = {}
+        self.user = None
+
+
+class SessionRegistry:
+    """
+    The sessions in a game, by id
+    """
+    def __init__(self):
+        self._sessions = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def __getitem__(self, session_id):
+        return self._sessions[session_id]
+
+    def __iter__(self):
+        return iter(self._sessions.values())
+
+    def create(self, pubpen):
+        """
+        Create a new session with a new id
+
+        :arg pubpen: The game's :class:`pubmarine.PubPen`
+        :returns: The new :class:`Session`
+        """
+        session = Session(pubpen, next(self._ids))
+        self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id, default=None):
+        """Return the session with an id or default if there is none"""
+        return self._sessions.get(session_id, default)
+
+    def remove(self, session_id):
+        """
+        Remove a session from the registry
+
+        :arg session_id: Id of the session
+        :returns: The removed :class:`Session`
+        :raises KeyError: if there is no session with that id
+        """
+        return self._sessions.pop(session_id)
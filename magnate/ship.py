@@ -18,6 +18,8 @@ Data structures related to Player controlled ships
 """
 import attr
 
+from .events import publisher
+
 
 @attr.s
 class ManifestEntry:
@@ -64,13 +66,23 @@ class ShipData:
 
 class Ship:
     """A user's ship"""
-    def __init__(self, magnate, ship_data, location):
+    def __init__(self, magnate, ship_data, location, pubpen=None):
+        """
+        :arg magnate: The :class:`magnate.magnate.Magnate` running the game
+        :arg ship_data: The :class:`ShipData` for the type of ship
+        :arg location: The :class:`magnate.market.Market` the ship starts at
+        :kwarg pubpen: The PubPen for the ship's events.  Defaults to the magnate's PubPen
+        """
         self.magnate = magnate
-        self.pubpen = magnate.pubpen
+        self.pubpen = magnate.pubpen if pubpen is None else pubpen
         self.ship_data = ship_data
 
+        self._publish_cargo_update = publisher(self.pubpen, 'ship.cargo.update')
+        self._publish_destinations = publisher(self.pubpen, 'ship.destinations')
+        self._publish_moved = publisher(self.pubpen, 'ship.moved')
+
         self._location = None
-        self._destinations = []
+        self._destinations = ()
 
         self.manifest = {}
         self.filled_hold = 0
@@ -122,8 +134,8 @@ class Ship:
 
         self.filled_hold += new_entry.quantity
 
-        self.pubpen.publish('ship.cargo.update', self.manifest[new_entry.commodity],
-                            self.holdspace - self.filled_hold, self.filled_hold)
+        self._publish_cargo_update(self.manifest[new_entry.commodity],
+                                   self.holdspace - self.filled_hold, self.filled_hold)
 
     def remove_cargo(self, commodity, amount):
         """
@@ -155,7 +167,7 @@ class Ship:
             amount_left = self.manifest[commodity]
         self.filled_hold -= amount
 
-        self.pubpen.publish('ship.cargo.update', amount_left, self.holdspace - self.filled_hold, self.filled_hold)
+        self._publish_cargo_update(amount_left, self.holdspace - self.filled_hold, self.filled_hold)
 
         return transfer
 
@@ -189,20 +201,18 @@ class Ship:
             location
         :raises ValueError: when the new location is not valid
         """
-        temp_destinations = [l for l in location.system.locations]
-        try:
-            temp_destinations.remove(location.name)
-        except ValueError:
-            # No worries, we just want to make sure we can't go to ourselves
-            pass
-        self._destinations = temp_destinations
+        self._destinations = location.destinations
 
         previous_location = self._location.name if self._location is not None else None
         self._location = location
-        self.pubpen.publish('ship.destinations', self.destinations)
-        self.pubpen.publish('ship.moved', location.name, previous_location)
+        self._publish_destinations(self.destinations)
+        self._publish_moved(location.name, previous_location)
 
     @property
     def destinations(self):
-        """Read-only property lists the ship's valid destinations"""
+        """Read-only property lists the ship's valid destinations
+
+        This is the location's :attr:`magnate.market.LocationData.destinations` tuple.  It is
+        shared by every ship at the location and must not be modified.
+        """
         return self._destinations
@@ -0,0 +1,255 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Periodically update the prices in every market in the universe
+
+The markets of each stellar system are independent of every other system so a tick can price each
+system in a separate process.  The static pricing data for each system is flattened into
+a :class:`SystemPriceTable` of compact arrays which is sent to each worker process once, when the
+process starts.  After that, each tick only sends the name of a system and a seed to the workers and
+receives an array of prices back.  The prices are then compared with the current ones on the main
+event loop and only those which changed are published.
+"""
+import asyncio
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import attr
+
+from .events import publisher
+from .logging import log
+from .market import draw_price
+from .rng import derive_seed
+
+
+mlog = log.fields(mod=__name__)
+
+#: Static price tables for the worker process.  Set by :func:`_init_worker`
+_WORKER_TABLES = None
+
+
+@attr.s
+class SystemPriceTable:
+    """
+    Static pricing data for every commodity in every market of a system
+
+    Entry ``i`` of each array is for the commodity named in ``keys[i]``.  The adjustments of the
+    sale events for entry ``i`` are
+    ``sale_adjustments[sale_offsets[i]:sale_offsets[i + 1]]`` and likewise for shortages.
+
+    :keys: Tuple of (location name, commodity name) for each entry
+    :mean_prices: array of the mean price of each entry
+    :std_devs: array of the standard deviation of each entry
+    :sale_offsets: array of offsets into sale_adjustments
+    :sale_adjustments: array of the adjustments of all of the sale events
+    :shortage_offsets: array of offsets into shortage_adjustments
+    :shortage_adjustments: array of the adjustments of all of the shortage events
+    """
+    keys = attr.ib(validator=attr.validators.instance_of(tuple))
+    mean_prices = attr.ib(validator=attr.validators.instance_of(array))
+    std_devs = attr.ib(validator=attr.validators.instance_of(array))
+    sale_offsets = attr.ib(validator=attr.validators.instance_of(array))
+    sale_adjustments = attr.ib(validator=attr.validators.instance_of(array))
+    shortage_offsets = attr.ib(validator=attr.validators.instance_of(array))
+    shortage_adjustments = attr.ib(validator=attr.validators.instance_of(array))
+
+    @classmethod
+    def from_markets(cls, markets):
+        """
+        Create a SystemPriceTable from the markets in a system
+
+        :arg markets: Iterable of :class:`magnate.market.Market` in the system
+        """
+        keys = []
+        mean_prices = array('q')
+        std_devs = array('q')
+        sale_offsets = array('l', (0,))
+        sale_adjustments = array('q')
+        shortage_offsets = array('l', (0,))
+        shortage_adjustments = array('q')
+
+        for market in markets:
+            for name, commodity in market.commodities.items():
+                keys.append((market.location.name, name))
+                mean_prices.append(commodity.mean_price)
+                std_devs.append(commodity.standard_deviation)
+
+                sale_adjustments.extend(commodity.price_events.sale_adjustments)
+                sale_offsets.append(len(sale_adjustments))
+                shortage_adjustments.extend(commodity.price_events.shortage_adjustments)
+                shortage_offsets.append(len(shortage_adjustments))
+
+        return cls(tuple(keys), mean_prices, std_devs, sale_offsets, sale_adjustments,
+                   shortage_offsets, shortage_adjustments)
+
+
+def price_system(table, stream_class, seed):
+    """
+    Draw new prices for every entry in a :class:`SystemPriceTable`
+
+    :arg table: The SystemPriceTable to price
+    :arg stream_class: The :class:`magnate.rng.RandomStream` class to draw numbers from
+    :arg seed: Seed for the random stream
+    :returns: A tuple of an array of new prices and a list of (index, event_type, event_idx) for
+        the entries whose price was set by an event
+    """
+    rng = stream_class(seed)
+    num_entries = len(table.keys)
+    percentages = rng.randints(1, 100, num_entries)
+    decreases = rng.randints(0, 1, num_entries)
+
+    sale_offsets = table.sale_offsets
+    shortage_offsets = table.shortage_offsets
+
+    prices = array('q')
+    events = []
+    for idx in range(num_entries):
+        price, event_type, event_idx = draw_price(
+            rng, table.mean_prices[idx], table.std_devs[idx],
+            table.sale_adjustments[sale_offsets[idx]:sale_offsets[idx + 1]],
+            table.shortage_adjustments[shortage_offsets[idx]:shortage_offsets[idx + 1]],
+            percentages[idx], decreases[idx])
+        prices.append(price)
+        if event_type is not None:
+            events.append((idx, event_type, event_idx))
+
+    return prices, events
+
+
+def _init_worker(tables):
+    """Store the static price tables in a worker process"""
+    global _WORKER_TABLES  # pylint: disable=global-statement
+    _WORKER_TABLES = tables
+
+
+def _price_system_in_worker(system, stream_class, seed):
+    """Price one system using the tables sent to this worker process"""
+    return price_system(_WORKER_TABLES[system], stream_class, seed)
+
+
+class PriceTicker:
+    """
+    Update the prices of all markets at a regular interval
+
+    :attr:`tables` is keyed by system name.  When there is more than one system and workers is
+    greater than zero, systems are priced in a :class:`concurrent.futures.ProcessPoolExecutor`.
+    Otherwise they are priced on the event loop.
+    """
+    def __init__(self, magnate, markets, workers=0):
+        """
+        :arg magnate: The :class:`magnate.magnate.Magnate` which owns the markets
+        :arg markets: Mapping of location name to :class:`magnate.market.Market`
+        :kwarg workers: Maximum number of worker processes
+        """
+        self.loop = magnate.pubpen.loop
+        self.random_source = magnate.random_source
+        self.markets = markets
+        self.tick_count = 0
+        self._timer = None
+        # The tick which is running, if any
+        self._task = None
+        self._running = False
+        self._publish_tick = publisher(magnate.pubpen, 'world.tick')
+
+        systems = OrderedDict()
+        for market in markets.values():
+            systems.setdefault(market.location.system.name, []).append(market)
+        self.tables = OrderedDict((name, SystemPriceTable.from_markets(system_markets))
+                                  for name, system_markets in systems.items())
+
+        self.executor = None
+        if workers > 0 and len(self.tables) > 1:
+            self.executor = ProcessPoolExecutor(min(workers, len(self.tables)),
+                                                initializer=_init_worker,
+                                                initargs=(dict(self.tables),))
+
+    async def tick(self):
+        """
+        Draw new prices for every market and publish the ones that changed
+
+        :event world.tick: Emitted after the new prices have been set
+            :arg int tick_count: Number of ticks so far
+        """
+        self.tick_count += 1
+        stream_class = self.random_source.stream_class
+        seeds = OrderedDict((system, derive_seed(self.random_source.world_seed, 'tick', system,
+                                                 str(self.tick_count)))
+                            for system in self.tables)
+
+        if self.executor is None:
+            results = [price_system(self.tables[system], stream_class, seed)
+                       for system, seed in seeds.items()]
+        else:
+            results = await asyncio.gather(*(self.loop.run_in_executor(
+                self.executor, _price_system_in_worker, system, stream_class, seed)
+                                              for system, seed in seeds.items()))
+
+        for system, (prices, events) in zip(seeds, results):
+            self._apply(self.tables[system], prices, events)
+
+        self._publish_tick(self.tick_count)
+
+    def _apply(self, table, prices, events):
+        """Set the new prices in the markets"""
+        event_types = {idx: (event_type, event_idx) for idx, event_type, event_idx in events}
+        for idx, (location, commodity) in enumerate(table.keys):
+            market = self.markets[location]
+            event_type, event_idx = event_types.get(idx, (None, 0))
+            if event_type is not None or market.commodities[commodity].price != prices[idx]:
+                market.apply_price(commodity, prices[idx], event_type, event_idx)
+
+    def _run_tick(self, interval):
+        """Start a tick.  The next one is scheduled when it finishes so ticks never overlap"""
+        self._timer = None
+        self._task = asyncio.ensure_future(self.tick(), loop=self.loop)
+        self._task.add_done_callback(partial(self._tick_done, interval))
+
+    def _tick_done(self, interval, task):
+        """Schedule the next tick once the last one has finished"""
+        self._task = None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            mlog.fields(func='PriceTicker._tick_done', tick_count=self.tick_count,
+                        error=repr(task.exception())).error('Price tick failed')
+        if self._running:
+            self._timer = self.loop.call_later(interval, self._run_tick, interval)
+
+    def start(self, interval):
+        """
+        Update prices every interval seconds
+
+        :arg interval: Number of seconds from the end of one tick to the start of the next
+        """
+        mlog.fields(interval=interval, systems=len(self.tables),
+                    parallel=self.executor is not None).debug('Starting price ticks')
+        self._running = True
+        self._timer = self.loop.call_later(interval, self._run_tick, interval)
+
+    def stop(self):
+        """Stop updating prices and shut down any worker processes"""
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
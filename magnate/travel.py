@@ -0,0 +1,222 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Distances and routes between locations
+
+Every location in a stellar system can fly directly to every other location in the same system.
+The distance between them is how many orbits apart their celestial bodies are so the direct flight
+is always the shortest way between them.  :class:`TravelGraph` computes those distances for each
+system once and keeps them in one array per location.
+
+Systems are joined to each other by jump lanes between two locations, the gateways.  Routes between
+systems only need to pass through gateways so they are found by searching the (small) graph of
+gateways instead of every location.  The search is done once per origin and then cached.
+"""
+import heapq
+from array import array
+from collections import OrderedDict
+
+import attr
+
+
+#: Distance between two locations orbiting the same celestial body
+MIN_DISTANCE = 1
+
+
+def orbit_distance(orbit, other_orbit):
+    """
+    Return the distance between two locations in the same system
+
+    :arg orbit: The orbit of the first location
+    :arg other_orbit: The orbit of the second location
+    :returns: The distance between them.  This is never less than :data:`MIN_DISTANCE`
+    """
+    return max(MIN_DISTANCE, abs(orbit - other_orbit))
+
+
+@attr.s(frozen=True)
+class Route:
+    """
+    The shortest way from one location to another
+
+    :path: Tuple of the names of the locations passed through, starting with the origin and ending
+        with the destination
+    :distance: Total distance travelled
+    """
+    path = attr.ib(convert=tuple)
+    distance = attr.ib(validator=attr.validators.instance_of(int))
+
+
+class TravelGraph:
+    """
+    Precomputed distances between locations
+    """
+    def __init__(self, systems, links=()):
+        """
+        :arg systems: Mapping of system name to a mapping of location name to the orbit of the
+            location
+        :kwarg links: Iterable of (location, location, distance) jump lanes which join the systems
+        """
+        self.locations = []
+        self._system_of = array('q')
+        self._local_idx = array('q')
+        #: Indexes of the locations in each system
+        self.systems = OrderedDict()
+        for system_idx, (system, members) in enumerate(systems.items()):
+            self.systems[system] = tuple(range(len(self.locations),
+                                               len(self.locations) + len(members)))
+            for local_idx, location in enumerate(members):
+                self.locations.append(location)
+                self._system_of.append(system_idx)
+                self._local_idx.append(local_idx)
+        self._location_idx = {name: idx for idx, name in enumerate(self.locations)}
+        system_members = list(self.systems.values())
+
+        #: _distances[location][local index] is the distance to each location in the same system
+        self._distances = []
+        for members in systems.values():
+            orbits = list(members.values())
+            for local_idx, orbit in enumerate(orbits):
+                distances = array('q', (orbit_distance(orbit, other) for other in orbits))
+                distances[local_idx] = 0
+                self._distances.append(distances)
+
+        self._destinations = [tuple(self.locations[other]
+                                    for other in system_members[self._system_of[idx]]
+                                    if other != idx)
+                              for idx in range(len(self.locations))]
+
+        # The graph of gateways.  Gateways in the same system are joined by their in-system
+        # distance.
+        self._adjacent = {}
+        for location, other, distance in links:
+            loc_idx = self._location_idx[location]
+            other_idx = self._location_idx[other]
+            self._adjacent.setdefault(loc_idx, {})[other_idx] = distance
+            self._adjacent.setdefault(other_idx, {})[loc_idx] = distance
+        self._gateways = [[] for _ in system_members]
+        for gateway in self._adjacent:
+            self._gateways[self._system_of[gateway]].append(gateway)
+        for gateways in self._gateways:
+            for gateway in gateways:
+                for other in gateways:
+                    if other != gateway:
+                        self._adjacent[gateway][other] = self._local_distance(gateway, other)
+
+        #: Shortest distance from an origin to every reachable gateway and the previous gateway
+        #: on that route (-1 for the first gateway)
+        self._gateway_routes = {}
+
+    @classmethod
+    def from_systems(cls, system_data):
+        """
+        Create a TravelGraph from the game's systems
+
+        :arg system_data: Mapping of system name to :class:`magnate.market.SystemData`
+        :returns: A new TravelGraph
+        """
+        return cls(OrderedDict((name, OrderedDict((loc.name, loc.orbit)
+                                                  for loc in system.locations.values()))
+                               for name, system in system_data.items()))
+
+    def _local_distance(self, loc_idx, other_idx):
+        """Return the distance between two locations in the same system"""
+        return self._distances[loc_idx][self._local_idx[other_idx]]
+
+    def destinations(self, location):
+        """
+        Return the locations which can be flown to directly
+
+        :arg location: Name of the location to fly from
+        :returns: Tuple of the names of the other locations in the same system.  The same tuple is
+            returned every time it is called for a location.
+        """
+        return self._destinations[self._location_idx[location]]
+
+    def _search(self, loc_idx):
+        """Find the shortest distance from a location to every gateway"""
+        try:
+            return self._gateway_routes[loc_idx]
+        except KeyError:
+            pass
+
+        distances = {}
+        previous = {}
+        queue = [(self._local_distance(loc_idx, gateway), gateway, -1)
+                 for gateway in self._gateways[self._system_of[loc_idx]]]
+        heapq.heapify(queue)
+        while queue:
+            distance, gateway, prev_gateway = heapq.heappop(queue)
+            if gateway in distances:
+                continue
+            distances[gateway] = distance
+            previous[gateway] = prev_gateway
+            for neighbor, step in self._adjacent[gateway].items():
+                if neighbor not in distances:
+                    heapq.heappush(queue, (distance + step, neighbor, gateway))
+
+        self._gateway_routes[loc_idx] = (distances, previous)
+        return distances, previous
+
+    def route(self, origin, destination):
+        """
+        Find the shortest route between two locations
+
+        :arg origin: Name of the location to start from
+        :arg destination: Name of the location to travel to
+        :returns: A :class:`Route` or None if the destination cannot be reached from the origin
+        """
+        loc_idx = self._location_idx[origin]
+        dest_idx = self._location_idx[destination]
+        if loc_idx == dest_idx:
+            return Route((origin,), 0)
+        if self._system_of[loc_idx] == self._system_of[dest_idx]:
+            return Route((origin, destination), self._local_distance(loc_idx, dest_idx))
+
+        distances, previous = self._search(loc_idx)
+        best = None
+        for gateway in self._gateways[self._system_of[dest_idx]]:
+            if gateway in distances:
+                distance = distances[gateway] + self._local_distance(gateway, dest_idx)
+                if best is None or distance < best[0]:
+                    best = (distance, gateway)
+        if best is None:
+            return None
+
+        distance, gateway = best
+        path = [destination]
+        while gateway != -1:
+            if gateway != dest_idx:
+                path.append(self.locations[gateway])
+            gateway = previous[gateway]
+        if path[-1] != origin:
+            path.append(origin)
+        return Route(reversed(path), distance)
+
+    def distance(self, origin, destination):
+        """
+        Return the shortest distance between two locations
+
+        :arg origin: Name of the location to start from
+        :arg destination: Name of the location to travel to
+        :returns: The distance or None if the destination cannot be reached from the origin
+        """
+        loc_idx = self._location_idx[origin]
+        dest_idx = self._location_idx[destination]
+        if self._system_of[loc_idx] == self._system_of[dest_idx]:
+            return self._local_distance(loc_idx, dest_idx)
+        route = self.route(origin, destination)
+        return route.distance if route is not None else None
@@ -29,6 +29,9 @@ class UserInterface(metaclass=ABCMeta):
     Stellar Magnate clients must implement a subclass or UserInterface as
     their main entrypoint.
     """
+    #: Whether the game world should be run in this process.  Interfaces which talk to a game
+    #: running elsewhere set this to False.
+    needs_backend = True
 
     @abstractmethod
     def __init__(self, pubpen, args):
@@ -0,0 +1,166 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Play a game which is running in a magnate-server
+
+This plugin does not draw anything itself.  It connects to the server and then runs another user
+interface plugin with a :class:`RemotePubPen` which passes that interface's events to and from the
+server.
+"""
+import argparse
+import asyncio
+
+from pubmarine import PubPen
+from straight.plugin import load
+
+from magnate.codec import DEFAULT_CODEC, Codec
+from magnate.logging import log
+from magnate.ui.api import UserInterface
+from magnate.wire import (CLIENT_EVENTS, DEFAULT_PORT, HELLO, PUBLISH, SUBSCRIBE, WireError,
+                          encode_message, read_message)
+
+
+mlog = log.fields(mod=__name__)
+
+#: Prefixes of events which stay inside the client
+LOCAL_EVENTS = ('ui.',)
+
+
+class RemotePubPen(PubPen):
+    """
+    PubPen which sends the user interface's requests to a game server
+
+    ``action.*`` and ``query.*`` events are sent to the server instead of being published locally.
+    Subscribing to any other event (except ``ui.*`` events) asks the server to send that event to
+    us.  When it arrives, it is published locally.
+
+    Until the server's name table arrives, messages are encoded with
+    :data:`magnate.codec.DEFAULT_CODEC`, which the server can always decode.
+    """
+    def __init__(self, loop, event_list=None):
+        super().__init__(loop, event_list=event_list)
+        self._writer = None
+        self._receiver = None
+        # Frames sent before we were connected
+        self._pending = []
+        # Events the server has been asked to send
+        self._remote_events = set()
+        #: The :class:`magnate.codec.Codec` which uses the server's name table
+        self.codec = DEFAULT_CODEC
+
+    def _send(self, frame):
+        """Send a frame to the server once connected"""
+        if self._writer is None:
+            self._pending.append(frame)
+        else:
+            self._writer.write(frame)
+
+    def subscribe(self, event, callback):
+        sub_id = super().subscribe(event, callback)
+        if event not in self._remote_events and not event.startswith(LOCAL_EVENTS):
+            self._remote_events.add(event)
+            self._send(encode_message(SUBSCRIBE, event))
+        return sub_id
+
+    def publish(self, event, *args, **kwargs):
+        if event.startswith(CLIENT_EVENTS):
+            self._send(encode_message(PUBLISH, event, args, kwargs, self.codec))
+        else:
+            super().publish(event, *args, **kwargs)
+
+    async def connect(self, host=None, port=DEFAULT_PORT, path=None):
+        """
+        Connect to a game server
+
+        :kwarg host: Host that the server is listening on.  Defaults to localhost
+        :kwarg port: Port that the server is listening on
+        :kwarg path: Path of the Unix socket that the server is listening on.  If given, host and
+            port are ignored
+        """
+        if path is not None:
+            reader, self._writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, self._writer = await asyncio.open_connection(host or 'localhost', port)
+        for frame in self._pending:
+            self._writer.write(frame)
+        self._pending = []
+        self._receiver = asyncio.ensure_future(self._receive(reader), loop=self.loop)
+
+    async def _receive(self, reader):
+        """Publish the events that the server sends"""
+        flog = mlog.fields(func='RemotePubPen._receive')
+        try:
+            while True:
+                kind, event, args, kwargs = await read_message(reader, self.codec)
+                if kind == PUBLISH:
+                    super().publish(event, *args, **kwargs)
+                elif kind == HELLO:
+                    self.codec = Codec(args[0])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            flog.warning('Lost the connection to the game server')
+        except WireError:
+            flog.trace('error').error('Game server sent an invalid message')
+
+    def close(self):
+        """Disconnect from the server"""
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class Interface(UserInterface):
+    """Run a user interface plugin against a remote game"""
+    needs_backend = False
+
+    def __init__(self, pubpen, cli_args):
+        super().__init__(RemotePubPen(pubpen.loop), cli_args)
+        args = self._parse_args(cli_args)
+        self.address = (args.host, args.port, args.path)
+
+        prefix = 'magnate.ui.{}'.format(args.remote_ui)
+        ui_classes = [c for c in load('magnate.ui', subclasses=UserInterface)
+                      if c is not Interface and c.__module__.startswith(prefix)]
+        if not ui_classes:
+            raise ValueError('Unknown user ui: {}'.format(args.remote_ui))
+
+        #: The user interface which the player sees
+        self.user_interface = ui_classes[0](self.pubpen, cli_args)
+
+    @staticmethod
+    def _parse_args(cli_args):
+        """Parse the command line arguments which are specific to the remote interface"""
+        parser = argparse.ArgumentParser(prog='magnate --ui-plugin remote', add_help=False)
+        parser.add_argument('--server', dest='host', action='store', default=None,
+                            help='Host that the game server is running on')
+        parser.add_argument('--server-port', dest='port', action='store', type=int,
+                            default=DEFAULT_PORT, help='Port that the game server listens on')
+        parser.add_argument('--server-socket', dest='path', action='store', default=None,
+                            help='Path to the Unix socket that the game server listens on')
+        parser.add_argument('--remote-ui', dest='remote_ui', action='store', default='urwid',
+                            help='User interface plugin to play the game with')
+        args, _ = parser.parse_known_args(cli_args)
+        return args
+
+    def run(self):
+        host, port, path = self.address
+        self.pubpen.loop.run_until_complete(self.pubpen.connect(host, port, path))
+        try:
+            return self.user_interface.run()
+        finally:
+            self.pubpen.close()
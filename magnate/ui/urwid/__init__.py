@@ -16,6 +16,8 @@
 """
 The main entrypoint into the urwid user interface
 """
+import argparse
+
 import urwid
 
 from magnate.ui.api import UserInterface
@@ -32,13 +34,14 @@ class Interface(UserInterface):
     def __init__(self, pubpen, cli_args):
         super().__init__(pubpen, cli_args)
 
-        # Note: We don't have any extra command line args
+        args = self._parse_args(cli_args)
 
         # Windows
 
         self.title_card = TitleScreen(pubpen)
         self.login_screen = LoginScreen(pubpen)
-        self.main_window = MainScreen(pubpen)
+        self.main_window = MainScreen(pubpen, msg_history_size=args.msg_history_size,
+                                      msg_spill_file=args.msg_spill_file)
         self.root_win = urwid.Frame(urwid.SolidFill(' '))
 
         # Arrange the widgets
@@ -56,6 +59,20 @@ class Interface(UserInterface):
                                          event_loop=urwid.AsyncioEventLoop(loop=self.pubpen.loop),
                                          palette=(('reversed', 'standout', ''),),)
 
+    @staticmethod
+    def _parse_args(cli_args):
+        """Parse the command line arguments which are specific to the urwid interface"""
+        parser = argparse.ArgumentParser(prog='magnate --ui-plugin urwid', add_help=False)
+        parser.add_argument('--msg-history-size', dest='msg_history_size', action='store',
+                            type=int, default=None,
+                            help='Number of messages to keep in the message window history')
+        parser.add_argument('--msg-spill-file', dest='msg_spill_file', action='store',
+                            default=None,
+                            help='File to append messages to once they fall out of the'
+                            ' message window history')
+        args, _ = parser.parse_known_args(cli_args)
+        return args
+
     def show_title_card(self):
         """Display a splash screen"""
         self.root_win.body = urwid.Filler(self.title_card, height=('relative', 100))
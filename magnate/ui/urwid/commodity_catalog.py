@@ -22,6 +22,7 @@ from functools import partial
 import attr
 import urwid
 
+from ...events import topic
 from ...market import CommodityType
 from .abcwidget import ABCWidget
 from .indexed_menu import IndexedMenuButton, IndexedMenuEnumerator
@@ -96,6 +97,10 @@ class CommodityCatalog(urwid.WidgetWrap, metaclass=ABCWidget):
         self.location = None
         self.keypress_map = IndexedMenuEnumerator()
         self._commodity_query_sub_id = None
+        # Mapping of location to the version of the market and the prices of the commodities
+        # traded here the last time we saw the market.  On later visits, only the prices which
+        # changed since that version are requested.
+        self._market_cache = {}
 
         # Primary column -- names the commodity and will be formatted to
         # allow hotkeys to select it
@@ -242,18 +247,48 @@ class CommodityCatalog(urwid.WidgetWrap, metaclass=ABCWidget):
     #
     # Handle updates to the displayed info
     #
-    def handle_commodity_info(self, commodities):
+    def _show_prices(self, prices):
+        """
+        Display the prices of the commodities in the current market
+
+        :arg prices: OrderedDict mapping commodity names to prices
+        """
+        price_map = self.auxiliary_cols[self.price_col_idx].data_map
+        for commodity, price in prices.items():
+            price_map[commodity] = price
+        self._construct_commodity_list(price_map)
+
+    def handle_commodity_info(self, commodities, version):
         """
         Update the display with prices about all commodities in a market
 
-        :arg prices: a dict mapping commodity names to prices
+        :arg commodities: a dict mapping commodity names to :class:`magnate.market.Commodity`
+        :arg version: The version of the market
         """
         self.pubpen.unsubscribe(self._commodity_query_sub_id)
         self._commodity_query_sub_id = None
-        for commodity in commodities.values():
-            if commodity.type.intersection(self.types_traded):
-                self.auxiliary_cols[self.price_col_idx].data_map[commodity.name] = commodity.price
-        self._construct_commodity_list(self.auxiliary_cols[self.price_col_idx].data_map)
+        prices = OrderedDict((commodity.name, commodity.price)
+                             for commodity in commodities.values()
+                             if commodity.type.intersection(self.types_traded))
+        self._market_cache[self.location] = (version, prices)
+        self._show_prices(prices)
+
+    def handle_price_changes(self, version, changed):
+        """
+        Update the display with the prices which changed since the last visit to a market
+
+        :arg version: The current version of the market
+        :arg changed: a dict mapping the names of commodities whose price changed to their prices
+        """
+        self.pubpen.unsubscribe(self._commodity_query_sub_id)
+        self._commodity_query_sub_id = None
+        _version, prices = self._market_cache[self.location]
+        for commodity, price in changed.items():
+            # The changes include commodities which are not traded in this catalog
+            if commodity in prices:
+                prices[commodity] = price
+        self._market_cache[self.location] = (version, prices)
+        self._show_prices(prices)
 
     @abstractmethod
     def handle_new_location(self, new_location, *args):
@@ -273,10 +308,18 @@ class CommodityCatalog(urwid.WidgetWrap, metaclass=ABCWidget):
         self.auxiliary_cols[self.price_col_idx].widget_list.clear()
         self.auxiliary_cols[self.price_col_idx].data_map.clear()
 
-        # Sync market information
-        if self._commodity_query_sub_id is None:
-            self._commodity_query_sub_id = self.pubpen.subscribe('market.{}.info'.format(new_location), self.handle_commodity_info)
-        self.pubpen.publish('query.market.{}.info'.format(new_location))
+        # Sync market information.  A reply for the previous location is no longer wanted.
+        if self._commodity_query_sub_id is not None:
+            self.pubpen.unsubscribe(self._commodity_query_sub_id)
+        if new_location in self._market_cache:
+            version, _prices = self._market_cache[new_location]
+            self._commodity_query_sub_id = self.pubpen.subscribe(
+                topic('market.{}.changes', new_location), self.handle_price_changes)
+            self.pubpen.publish(topic('query.market.{}.changes', new_location), version)
+        else:
+            self._commodity_query_sub_id = self.pubpen.subscribe(
+                topic('market.{}.info', new_location), self.handle_commodity_info)
+            self.pubpen.publish(topic('query.market.{}.info', new_location))
         ### TODO: Implement this so that we can update once prices change on
         # a timeout instead of in response to user moving the ship.
         #self.pubpen.subscribe('market.{}.update'.format(new_location)) => handle new market data
@@ -23,23 +23,28 @@ class GameMenuDialog(urwid.WidgetWrap):
     """
     Menu for Meta-game entries
 
-    Saving, quiting, settings, etc
+    Saving, quiting, profiling, settings, etc
 
     """
     _selectable = True
     signals = ['close_game_menu']
 
+    _PROFILE_LABEL = '(P)rofile'
+    _STOP_PROFILE_LABEL = '(P)rofile: Stop'
+
     def __init__(self, pubpen):
         self.pubpen = pubpen
 
         self.save_button = urwid.Button('(S)ave')
         self.load_button = urwid.Button('(L)oad')
+        self.profile_button = urwid.Button(self._PROFILE_LABEL)
         self.quit_button = urwid.Button('(Q)uit')
         self.continue_button = urwid.Button('(ESC) Continue Game')
 
         self.buttons = urwid.SimpleFocusListWalker((
             urwid.AttrMap(self.save_button, None, focus_map='reversed'),
             urwid.AttrMap(self.load_button, None, focus_map='reversed'),
+            urwid.AttrMap(self.profile_button, None, focus_map='reversed'),
             urwid.AttrMap(self.quit_button, None, focus_map='reversed'),
             urwid.AttrMap(self.continue_button, None, focus_map='reversed'),
             ))
@@ -63,9 +68,13 @@ class GameMenuDialog(urwid.WidgetWrap):
 
         urwid.connect_signal(self.save_button, 'click', self.save_game)
         urwid.connect_signal(self.load_button, 'click', self.load_game)
+        urwid.connect_signal(self.profile_button, 'click', self.toggle_profiler)
         urwid.connect_signal(self.quit_button, 'click', self.quit_client)
         urwid.connect_signal(self.continue_button, 'click', self.continue_game)
 
+        self.pubpen.subscribe('debug.profile_started', self.handle_profile_started)
+        self.pubpen.subscribe('debug.profile_saved', self.handle_profile_saved)
+
     def finalize(self):
         """Cleanup any game menu state when the dialog is hidden"""
         # Nothing needs cleaning up in this dialog, so nothing to do in
@@ -80,6 +89,10 @@ class GameMenuDialog(urwid.WidgetWrap):
         """Load game state from a file"""
         pass
 
+    def toggle_profiler(self, *args):
+        """Start profiling the game or stop and save the profile"""
+        self.pubpen.publish('action.debug.profile')
+
     @staticmethod
     def quit_client(*args):
         """Quit the game"""
@@ -96,5 +109,21 @@ class GameMenuDialog(urwid.WidgetWrap):
             self.save_game()
         elif key in frozenset('lL'):
             self.load_game()
+        elif key in frozenset('pP'):
+            self.toggle_profiler()
         elif key in frozenset('qQ'):
             self.quit_client()
+
+    #
+    # Handlers for backend signals
+    #
+    def handle_profile_started(self, duration):
+        """Let the user know that the game is being profiled"""
+        self.profile_button.set_label(self._STOP_PROFILE_LABEL)
+        self.pubpen.publish('ui.urwid.message',
+                            'Profiling the game for {:g} seconds'.format(duration))
+
+    def handle_profile_saved(self, path):
+        """Tell the user where the profile was saved"""
+        self.profile_button.set_label(self._PROFILE_LABEL)
+        self.pubpen.publish('ui.urwid.message', 'Saved the profile to {}'.format(path))
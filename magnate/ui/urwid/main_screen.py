@@ -255,7 +255,7 @@ class MainWindow(urwid.WidgetWrap):
 
 class MainScreen(urwid.LineBox):
     """Toplevel window mapping the top of the screen"""
-    def __init__(self, pubpen):
+    def __init__(self, pubpen, msg_history_size=None, msg_spill_file=None):
         self.pubpen = pubpen
 
         #
@@ -264,7 +264,8 @@ class MainScreen(urwid.LineBox):
         self.menu_bar_window = MenuBarWindow(self.pubpen)
         self.info_window = InfoWindow(self.pubpen)
         self.main_window = MainWindow(self.pubpen)
-        self.msg_window = MessageWindow(self.pubpen)
+        self.msg_window = MessageWindow(self.pubpen, history_size=msg_history_size,
+                                        spill_file=msg_spill_file)
 
         pile = urwid.Pile((self.main_window,
                            (self.msg_window.height, self.msg_window),
@@ -15,14 +15,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """ Handle the display of Markets and Commodities"""
 
+import urwid
+
 from ...market import CommodityType
 from .commodity_catalog import CatalogColumn, CommodityCatalog
+from .price_chart import PriceChart
 
 
 class MarketDisplay(CommodityCatalog):
     """Display the market information to buy and sell commodities"""
     signals = ['close_market_display', 'open_cargo_order_dialog']
 
+    #: Number of rows taken up by the price chart, including its border
+    CHART_HEIGHT = 8
+
     def __init__(self, pubpen):
         auxiliary_cols = [CatalogColumn('Price', 13, money=True),
                           #CatalogColumn('Amount', 20),
@@ -40,12 +46,42 @@ class MarketDisplay(CommodityCatalog):
                          primary_title='Commodity', auxiliary_cols=auxiliary_cols,
                          price_col_idx=0, types_traded=frozenset((CommodityType.cargo,)))
 
+        #
+        # Chart of the price history of the commodity in focus
+        #
+        self.price_chart = PriceChart(self.pubpen)
+        self.chart_box = urwid.LineBox(self.price_chart, title='Price History', title_align='left',
+                                       lline=None, tlcorner='\u2500', blcorner='\u2500',
+                                       rline=None, trcorner='\u2500', brcorner='\u2500')
+        self._w = urwid.Pile([('weight', 1, self.market_display),
+                              (self.CHART_HEIGHT, self.chart_box)])
+
         #
         # Event handlers
         #
         self.pubpen.subscribe('ship.info', self.handle_ship_info)
         self.pubpen.subscribe('ship.cargo.update', self.handle_cargo_update)
 
+    #
+    # Helpers
+    #
+    def _highlight_focused_line(self):
+        """Highlight the line in focus and chart the price history of its commodity"""
+        super()._highlight_focused_line()
+
+        try:
+            idx = self.commodity.focus_position
+        except IndexError:
+            # The commodity list hasn't been refreshed yet.
+            return
+
+        for commodity, commodity_idx in self.commodity_col.data_map.items():
+            if commodity_idx == idx:
+                if commodity != self.price_chart.commodity:
+                    self.chart_box.set_title('Price History: {}'.format(commodity))
+                self.price_chart.show(self.location, commodity)
+                break
+
     #
     # Handle updates to the displayed info
     #
@@ -16,25 +16,114 @@
 """
 Message window displays errors and events.
 """
+from collections import deque
 from enum import Enum
 from functools import partial
 
+import attr
 import urwid
 
 
 MsgType = Enum('MsgType', ('info', 'error'))
 
 
+@attr.s
+class Message:
+    """A message along with how many times it has been repeated"""
+    msg = attr.ib(validator=attr.validators.instance_of(str))
+    severity = attr.ib(validator=attr.validators.instance_of(MsgType), default=MsgType.info)
+    count = attr.ib(validator=attr.validators.instance_of(int), default=1)
+
+    def is_repeat_of(self, msg, severity):
+        """Return True if the given msg and severity are the same as this message"""
+        return self.msg == msg and self.severity is severity
+
+    def __str__(self):
+        if self.count > 1:
+            return '{} (x{})'.format(self.msg, self.count)
+        return self.msg
+
+
+class MessageHistory:
+    """
+    Fixed size record of the messages that have been displayed
+
+    Once capacity is reached, the oldest messages are evicted to make room for new ones.  If
+    a spill_file is given, evicted messages are appended to it so that the full history of the
+    session can still be examined after the fact.
+    """
+    def __init__(self, capacity, spill_file=None):
+        """
+        :arg capacity: The maximum number of messages to hold in memory
+        :kwarg spill_file: If given, filename to append evicted messages to
+        """
+        self._messages = deque(maxlen=capacity)
+        self.spill_file = spill_file
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __getitem__(self, idx):
+        return self._messages[idx]
+
+    @property
+    def capacity(self):
+        """Maximum number of messages which are held in memory"""
+        return self._messages.maxlen
+
+    def append(self, message):
+        """
+        Add a message to the history, evicting the oldest if the history is full
+
+        :arg message: The :class:`Message` to record
+        """
+        if len(self._messages) == self._messages.maxlen:
+            self._spill(self._messages[0])
+        self._messages.append(message)
+
+    def _spill(self, message):
+        """Write an evicted message to the spill_file"""
+        if self.spill_file is None:
+            return
+
+        try:
+            with open(self.spill_file, 'a') as f:
+                f.write('{}: {}\n'.format(message.severity.name, message))
+        except OSError:
+            # Losing the overflow is better than crashing the user interface
+            self.spill_file = None
+
+
 class MessageWindow(urwid.WidgetWrap):
     """Display system messages"""
     _MAX_MESSAGES = 3
     _MIN_TIME_BETWEEN_MESSAGES = 0.7
-    _can_print_message = True
+    _HISTORY_SIZE = 100
+    _MAX_PENDING = 20
 
-    def __init__(self, pubpen):
+    def __init__(self, pubpen, history_size=None, spill_file=None):
+        """
+        :arg pubpen: PubPen to use to receive messages
+        :kwarg history_size: Number of messages to keep in memory.  Defaults to
+            :attr:`_HISTORY_SIZE`
+        :kwarg spill_file: If given, messages which no longer fit in the history
+            are appended to this file.
+        """
         self.pubpen = pubpen
         self.loop = self.pubpen.loop
 
+        if history_size is None:
+            history_size = self._HISTORY_SIZE
+        self.history = MessageHistory(max(history_size, self._MAX_MESSAGES),
+                                      spill_file=spill_file)
+
+        # Messages which are waiting for the rate limit to expire before being displayed
+        self._pending = deque()
+        self._drain_handle = None
+
         self.message_list = urwid.SimpleFocusListWalker([])
         list_box = urwid.ListBox(self.message_list)
         message_win = urwid.LineBox(list_box, tline=None, lline=None, bline=None,
@@ -64,20 +153,51 @@ class MessageWindow(urwid.WidgetWrap):
         """
         Add a message to the MessageWindow.
 
-        Reap older messages if there are too many
+        Messages are displayed no more often than :attr:`_MIN_TIME_BETWEEN_MESSAGES`.  Messages
+        which arrive faster than that are queued.  A message which is identical to the one
+        before it is collapsed into the earlier one with a repeat count instead of being
+        displayed again.  If too many messages are waiting to be displayed, the oldest are
+        recorded in the history without being shown.
         """
-        if not self._can_print_message:
-            self.loop.call_later(self._MIN_TIME_BETWEEN_MESSAGES, self.add_message, msg, severity)
+        if self._pending:
+            if self._pending[-1].is_repeat_of(msg, severity):
+                self._pending[-1].count += 1
+                return
+        elif self.history and self.history[-1].is_repeat_of(msg, severity):
+            self.history[-1].count += 1
+            self._refresh_message(self.history[-1])
             return
 
-        if severity is MsgType.error:
-            msg = urwid.Text(('reversed', msg))
-        else:
-            msg = urwid.Text(msg)
-        self.message_list.append(msg)
+        self._pending.append(Message(msg, severity))
+        while len(self._pending) > self._MAX_PENDING:
+            self.history.append(self._pending.popleft())
+
+        if self._drain_handle is None:
+            self._display_next()
+
+    def _display_next(self):
+        """Display the next pending message and wait for the rate limit before the one after"""
+        if not self._pending:
+            self._drain_handle = None
+            return
+
+        message = self._pending.popleft()
+        self.history.append(message)
+        self.message_list.append(urwid.Text(self._format(message)))
         while len(self.message_list) > self._MAX_MESSAGES:
             self.message_list.pop(0)
 
-        self._can_print_message = False
-        self.loop.call_later(self._MIN_TIME_BETWEEN_MESSAGES,
-                             partial(setattr, self, '_can_print_message', True))
+        self._drain_handle = self.loop.call_later(self._MIN_TIME_BETWEEN_MESSAGES,
+                                                  self._display_next)
+
+    def _refresh_message(self, message):
+        """Update the displayed text of the most recent message"""
+        if self.message_list:
+            self.message_list[-1].set_text(self._format(message))
+
+    @staticmethod
+    def _format(message):
+        """Return urwid markup for a :class:`Message`"""
+        if message.severity is MsgType.error:
+            return ('reversed', str(message))
+        return str(message)
@@ -0,0 +1,137 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Chart the price history of a commodity
+
+The chart asks the backend for one bucket of prices per column it has to draw in so drawing it
+takes the same time no matter how many prices have been recorded.
+"""
+import urwid
+
+from ...events import topic
+
+
+#: Character drawn between the low and high price of a bucket
+RANGE_CHAR = '│'
+#: Character drawn at the mean price of a bucket
+MEAN_CHAR = '┼'
+
+
+def render_chart(buckets, width, height):
+    """
+    Draw a chart of the prices in buckets
+
+    :arg buckets: List of :class:`magnate.price_history.PriceBucket`.  Only the last width of them
+        are drawn.
+    :arg width: Number of columns to draw in
+    :arg height: Number of rows to draw in
+    :returns: List of height strings, each width characters long
+    """
+    rows = [[' '] * width for _ in range(height)]
+    buckets = [b for b in buckets[-width:] if b.low is not None]
+    if not buckets or height < 1:
+        return [''.join(row) for row in rows]
+
+    lowest = min(b.low for b in buckets)
+    highest = max(b.high for b in buckets)
+    spread = highest - lowest
+
+    def to_row(price):
+        """Return the row on which to draw a price.  Higher prices are closer to the top"""
+        if not spread:
+            return height // 2
+        return (height - 1) - round((price - lowest) * (height - 1) / spread)
+
+    # Right align the chart so that the most recent prices are next to each other
+    offset = width - len(buckets)
+    for col, bucket in enumerate(buckets, offset):
+        for row in range(to_row(bucket.high), to_row(bucket.low) + 1):
+            rows[row][col] = RANGE_CHAR
+        rows[to_row(bucket.mean)][col] = MEAN_CHAR
+
+    return [''.join(row) for row in rows]
+
+
+class PriceChart(urwid.Widget):
+    """Chart of the past prices of one commodity in one market"""
+    _sizing = frozenset(['box'])
+    _selectable = False
+
+    def __init__(self, pubpen):
+        super().__init__()
+        self.pubpen = pubpen
+        self.location = None
+        self.commodity = None
+        self.buckets = []
+        self._width = None
+        self._sub_ids = []
+
+    def show(self, location, commodity):
+        """
+        Chart a commodity
+
+        :arg location: The location of the market
+        :arg commodity: The name of the commodity
+        """
+        if location != self.location:
+            for sub_id in self._sub_ids:
+                self.pubpen.unsubscribe(sub_id)
+            self._sub_ids = [
+                self.pubpen.subscribe(topic('market.{}.price_history', location),
+                                      self.handle_price_history),
+                self.pubpen.subscribe(topic('market.{}.update', location),
+                                      self.handle_price_update),
+            ]
+
+        if (location, commodity) != (self.location, self.commodity):
+            self.location = location
+            self.commodity = commodity
+            self.buckets = []
+            self._invalidate()
+
+        self._query()
+
+    def _query(self):
+        """Ask the backend for one bucket of prices per column"""
+        if self.commodity is not None and self._width:
+            self.pubpen.publish(topic('query.market.{}.price_history', self.location),
+                                self.commodity, self._width)
+
+    def handle_price_history(self, commodity, buckets):
+        """
+        Redraw the chart with new prices
+
+        :arg commodity: The name of the commodity the prices are for
+        :arg buckets: List of :class:`magnate.price_history.PriceBucket`
+        """
+        if commodity == self.commodity:
+            self.buckets = buckets
+            self._invalidate()
+
+    def handle_price_update(self, commodity, *args):
+        """Ask for the prices again when the price of the charted commodity changes"""
+        if commodity.name == self.commodity:
+            self._query()
+
+    def render(self, size, focus=False):
+        maxcol, maxrow = size
+        if maxcol != self._width:
+            # The chart was resized so we need a different number of buckets
+            self._width = maxcol
+            self._query()
+
+        lines = render_chart(self.buckets, maxcol, maxrow)
+        return urwid.Text('\n'.join(lines), wrap='clip').render((maxcol,))
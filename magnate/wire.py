@@ -0,0 +1,150 @@
+# Stellar Magnate - A space-themed commodity trading game
+# Copyright (C) 2019 Toshio Kuratomi <toshio@fedoraproject.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Send events between processes
+
+Each message is a frame: a four byte, big endian length followed by that many bytes of payload.
+The payload is a one byte message kind, the event name, and for :data:`PUBLISH` and :data:`HELLO`,
+the arguments of the event encoded by a :class:`magnate.codec.Codec`.
+"""
+import struct
+
+from .codec import DEFAULT_CODEC, WireError, decode_str, encode_str
+
+
+#: Default port that the game server listens on
+DEFAULT_PORT = 7427
+#: Prefixes of the player events which clients send to the server.  All other events are sent from
+#: the server to the clients.  The ``action.debug.*`` and ``query.debug.*`` events are left out so
+#: that only the server's operator can use the debugging facilities
+CLIENT_EVENTS = ('action.fleet.', 'action.ship.', 'action.user.', 'query.bank.', 'query.cargo.',
+                 'query.fleet.', 'query.market.', 'query.routes.', 'query.ship.', 'query.user.',
+                 'query.warehouse.')
+
+#: Prefixes of events which clients may not subscribe to.  Actions carry what a player sends, like
+#: their password, and ``session.*`` are the names of other players' events on the server
+REFUSED_SUBSCRIPTIONS = ('action.', 'session.')
+
+#: Header of each frame: the length of the payload
+FRAME_HEADER = struct.Struct('!I')
+#: Largest payload that will be accepted
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+#: Message kinds.  PUBLISH carries an event.  SUBSCRIBE and UNSUBSCRIBE ask for an event to be
+#: forwarded or to stop being forwarded.  HELLO is sent by the server when a client connects.  Its
+#: argument is the name table of the server's codec.
+PUBLISH = 1
+SUBSCRIBE = 2
+UNSUBSCRIBE = 3
+HELLO = 4
+MESSAGE_KINDS = frozenset((PUBLISH, SUBSCRIBE, UNSUBSCRIBE, HELLO))
+_WITH_ARGS = frozenset((PUBLISH, HELLO))
+
+
+def encode_value(value, codec=DEFAULT_CODEC):
+    """
+    Encode a value
+
+    :arg value: The value to encode
+    :kwarg codec: The :class:`magnate.codec.Codec` to encode with
+    :returns: bytes holding the encoded value
+    :raises WireError: if the value contains something which cannot be sent
+    """
+    return codec.encode(value)
+
+
+def decode_value(data, codec=DEFAULT_CODEC):
+    """
+    Decode a value created by :func:`encode_value`
+
+    :arg data: bytes to decode
+    :kwarg codec: The :class:`magnate.codec.Codec` to decode with
+    :returns: The value
+    :raises WireError: if the data is not a valid value
+    """
+    return codec.decode(data)
+
+
+def encode_message(kind, event, args=(), kwargs=None, codec=DEFAULT_CODEC):
+    """
+    Encode a message as a frame
+
+    :arg kind: One of the message kinds
+    :arg event: The name of the event
+    :kwarg args: Positional arguments of a published event
+    :kwarg kwargs: Keyword arguments of a published event
+    :kwarg codec: The :class:`magnate.codec.Codec` to encode the arguments with
+    :returns: bytes holding the frame header and the payload
+    :raises WireError: if the arguments contain something which cannot be sent
+    """
+    out = bytearray(FRAME_HEADER.size)
+    out.append(kind)
+    encode_str(event, out)
+    if kind in _WITH_ARGS:
+        codec.encode_into(tuple(args), out)
+        codec.encode_into(kwargs or {}, out)
+    FRAME_HEADER.pack_into(out, 0, len(out) - FRAME_HEADER.size)
+    return bytes(out)
+
+
+def decode_message(payload, codec=DEFAULT_CODEC):
+    """
+    Decode the payload of a frame
+
+    :arg payload: bytes-like object holding the payload without the frame header
+    :kwarg codec: The :class:`magnate.codec.Codec` to decode the arguments with
+    :returns: A tuple of kind, event name, args, and kwargs.  args and kwargs are empty for kinds
+        other than :data:`PUBLISH` and :data:`HELLO`
+    :raises WireError: if the payload is not a valid message.  This includes args which are not
+        a tuple and kwargs which are not a mapping of str keys
+    """
+    payload = memoryview(payload)
+    try:
+        kind = payload[0]
+        if kind not in MESSAGE_KINDS:
+            raise WireError('Unknown message kind {}'.format(kind))
+        event, offset = decode_str(payload, 1)
+        args = ()
+        kwargs = {}
+        if kind in _WITH_ARGS:
+            args, offset = codec.decode_from(payload, offset)
+            kwargs, offset = codec.decode_from(payload, offset)
+    except (IndexError, KeyError, TypeError, ValueError, struct.error) as e:
+        raise WireError('Invalid message: {}'.format(e))
+    if offset != len(payload):
+        raise WireError('{} extra bytes after the message'.format(len(payload) - offset))
+    if not isinstance(args, tuple):
+        raise WireError('Arguments of the message are not a tuple')
+    if not isinstance(kwargs, dict) or not all(isinstance(key, str) for key in kwargs):
+        raise WireError('Keyword arguments of the message are not a mapping of names')
+    return kind, event, args, dict(kwargs)
+
+
+async def read_message(reader, codec=DEFAULT_CODEC):
+    """
+    Read one message from a stream
+
+    :arg reader: The :class:`asyncio.StreamReader` to read from
+    :kwarg codec: The :class:`magnate.codec.Codec` to decode the arguments with
+    :returns: The same as :func:`decode_message`
+    :raises asyncio.IncompleteReadError: if the stream ends
+    :raises WireError: if the frame is too large or is not a valid message
+    """
+    header = await reader.readexactly(FRAME_HEADER.size)
+    length, = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise WireError('Frame of {} bytes is larger than the maximum'.format(length))
+    return decode_message(await reader.readexactly(length), codec)
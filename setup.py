@@ -31,6 +31,6 @@ Travel by Brian Winn.
             'Topic :: Games/Entertainment :: Simulation',
         ],
         packages=['magnate', 'magnate.ui'],
-        scripts=['bin/magnate'],
+        scripts=['bin/magnate', 'bin/magnate-replay', 'bin/magnate-server'],
         install_requires=['PyYaml', 'attrs', 'jsonschema', 'kitchen', 'pubmarine >= 0.3', 'straight.plugin', 'twiggy', 'urwid', 'voluptuous'],
     )
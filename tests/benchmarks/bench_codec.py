@@ -0,0 +1,77 @@
+"""
+Benchmark encoding and decoding the events which are sent most often to remote clients
+
+Each event is encoded as a whole message and decoded again, the way the server and a client do.
+The generic encoding sends classes and enums by name.  The compact encoding sends them with their
+schemas and sends the game's names as their position in the name table.
+
+Run with::
+
+    python tests/benchmarks/bench_codec.py [--commodities N] [--seconds N]
+"""
+import argparse
+import time
+from collections import OrderedDict
+
+from magnate.codec import Codec
+from magnate.market import Commodity, CommodityData
+from magnate.order import Order
+from magnate.ship import ManifestEntry
+from magnate.wire import FRAME_HEADER, PUBLISH, decode_message, encode_message
+
+
+def make_events(num_commodities):
+    names = ['Commodity {}'.format(idx) for idx in range(num_commodities)]
+    market = OrderedDict()
+    for idx, name in enumerate(names):
+        commodity = Commodity(None, CommodityData(name, frozenset(('food', 'cargo')), 100 + idx,
+                                                  10, 0.3, 1))
+        commodity.price = 100 + idx
+        market[name] = commodity
+    manifest = {name: ManifestEntry(name, 10, 97.5) for name in names[:5]}
+    order = Order('Earth', names[0], 100, hold_quantity=10, buy=True)
+
+    events = (
+        ('market.{loc}.info', ('market.Earth.info', (market, 100))),
+        ('market.{loc}.changes', ('market.Earth.changes',
+                                  (105, OrderedDict((name, 90) for name in names[:5])))),
+        ('ship.info', ('ship.info', ('Sol', 'Wombat', 100, 40, manifest, 'Earth'))),
+        ('action.user.order', ('action.user.order', (order,))),
+    )
+    return events, ['Earth', 'Mars'] + names
+
+
+def measure(codec, event, args, seconds):
+    frame = encode_message(PUBLISH, event, args, codec=codec)
+    payload = frame[FRAME_HEADER.size:]
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            decode_message(encode_message(PUBLISH, event, args, codec=codec)[FRAME_HEADER.size:],
+                           codec)
+        count += 100
+    elapsed = time.perf_counter() - start
+    assert decode_message(payload, codec)[1] == event
+    return len(frame), count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--commodities', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=1.0)
+    args = parser.parse_args()
+
+    events, names = make_events(args.commodities)
+    codecs = (('generic', Codec(compact=False)), ('compact', Codec(names)))
+    print(f'{args.commodities} commodities in the market')
+    print(f'{"event":<20} {"encoding":<8} {"bytes":>7} {"msgs/s":>10}')
+    for label, (event, event_args) in events:
+        for codec_name, codec in codecs:
+            size, rate = measure(codec, event, event_args, args.seconds)
+            print(f'{label:<20} {codec_name:<8} {size:>7} {rate:>10,.0f}')
+
+
+if __name__ == '__main__':
+    main()
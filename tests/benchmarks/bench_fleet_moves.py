@@ -0,0 +1,108 @@
+"""
+Benchmark moving a fleet of ships between locations
+
+Each tick moves every ship in the fleet once.  The ships' destinations come from the tuple that
+each location computes when its system is constructed.  For comparison, the benchmark also moves
+a fleet of ships whose location setter builds the destination list on every move the way it used
+to.  Both fleets go through the whole setter, including publishing the ship's events.
+
+Run with::
+
+    python tests/benchmarks/bench_fleet_moves.py [--ships N] [--locations N]
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from pubmarine import PubPen
+
+from magnate.market import LocationData, SystemData
+from magnate.ship import Ship, ShipData
+from magnate.travel import TravelGraph
+
+
+def make_system(num_locations):
+    """Create a system and set the destinations of its locations"""
+    system = SystemData('Sol', None)
+    system.locations = OrderedDict()
+    for orbit in range(num_locations):
+        location = LocationData(f'Location {orbit}', 'planet', system, orbit)
+        system.locations[location.name] = location
+
+    graph = TravelGraph.from_systems({system.name: system})
+    for location in system.locations.values():
+        location.destinations = graph.destinations(location.name)
+    return system
+
+
+class UncachedShip(Ship):
+    """Ship whose location setter builds the destinations the way it did before they were cached"""
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, location):
+        temp_destinations = [name for name in location.system.locations]
+        try:
+            temp_destinations.remove(location.name)
+        except ValueError:
+            pass
+        self._destinations = temp_destinations
+
+        previous_location = self._location.name if self._location is not None else None
+        self._location = location
+        self._publish_destinations(self.destinations)
+        self._publish_moved(location.name, previous_location)
+
+
+def move_fleet(loop, fleet, moves):
+    """
+    Move every ship once per tick
+
+    :returns: A tuple of the milliseconds per tick and the peak bytes allocated
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    for tick in moves:
+        for ship, location in zip(fleet, tick):
+            ship.location = location
+        # Let the ships' events be delivered before the next tick
+        loop.run_until_complete(asyncio.sleep(0))
+    elapsed = (time.perf_counter() - start) / len(moves) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ships', type=int, default=10000)
+    parser.add_argument('--locations', type=int, default=100)
+    parser.add_argument('--ticks', type=int, default=10)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    magnate = SimpleNamespace(pubpen=PubPen(loop))
+    system = make_system(args.locations)
+    locations = list(system.locations.values())
+    ship_data = ShipData('Freighter', 1000, 100, 5, 100, 0)
+    starts = [random.choice(locations) for _ in range(args.ships)]
+    moves = [[random.choice(locations) for _ in starts] for _ in range(args.ticks)]
+
+    print(f'{args.ships} ships, {args.locations} locations, {args.ticks} ticks')
+
+    for label, ship_class in (('cached tuples:', Ship), ('lists per move:', UncachedShip)):
+        fleet = [ship_class(magnate, ship_data, location) for location in starts]
+        loop.run_until_complete(asyncio.sleep(0))
+        elapsed, peak = move_fleet(loop, fleet, moves)
+        print(f'{label:17} {elapsed:8.3f} ms/tick  {peak / 1024:10.1f} KiB peak')
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
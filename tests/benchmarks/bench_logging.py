@@ -0,0 +1,90 @@
+"""
+Benchmark the cost of debug logging on the validators of the data files
+
+Run with::
+
+    python tests/benchmarks/bench_logging.py [--values N] [--loads N] [--repeat N]
+
+Logging is configured at WARNING, as it is by default, so none of the debug messages are written.
+The enum validators from :mod:`magnate.savegame.base_types` and the loading of the game's data
+definitions are timed with the module logging through twiggy directly, as it used to, and through
+the lazy logger.
+"""
+import argparse
+import os.path
+import time
+
+import twiggy
+from twiggy import levels, outputs
+
+from magnate.logging import log
+from magnate.savegame import base_types
+from magnate.savegame.data_def import load_data_definitions
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+
+def log_at_warning():
+    """Replace the configured log outputs with one which only takes WARNING and above"""
+    twiggy.emitters.clear()
+    twiggy.add_emitters(('bench', levels.WARNING, None, outputs.NullOutput()))
+
+
+def use_logger(mlog):
+    """Make :mod:`magnate.savegame.base_types` log through mlog"""
+    base_types.mlog = mlog
+    base_types._validator_log = mlog.fields(  # pylint: disable=protected-access
+        func='_generic_types_validator')
+
+
+def bench_validators(values):
+    """Validate and transform values into the commodity and location enums"""
+    commodities = [m.name for m in base_types.CommodityType]
+    locations = [m.name for m in base_types.LocationType]
+    commodity_validator = base_types.CommodityType.validator
+    location_validator = base_types.LocationType.validator
+
+    start = time.perf_counter()
+    for i in range(values // 2):
+        commodity_validator(commodities[i % len(commodities)])
+        location_validator(locations[i % len(locations)])
+    return time.perf_counter() - start
+
+
+def bench_load(loads):
+    """Load and validate the game's data files"""
+    start = time.perf_counter()
+    for _ in range(loads):
+        load_data_definitions(DATADIR)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--values', type=int, default=200000)
+    parser.add_argument('--loads', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times to run each benchmark.  The fastest run is reported')
+    args = parser.parse_args()
+
+    log_at_warning()
+    base_types.init_base_types(DATADIR)
+    lazy_mlog = base_types.mlog
+    eager_mlog = log.fields(mod=base_types.__name__)
+
+    results = {}
+    for name, mlog in (('twiggy', eager_mlog), ('lazy', lazy_mlog)):
+        use_logger(mlog)
+        results[name] = (min(bench_validators(args.values) for _ in range(args.repeat)),
+                         min(bench_load(args.loads) for _ in range(args.repeat)))
+    use_logger(lazy_mlog)
+
+    print(f'{"logger":>8} {"validations/s":>14} {"us/validation":>14} {"ms/data load":>13}')
+    for name, (validate_time, load_time) in results.items():
+        print(f'{name:>8} {args.values / validate_time:>14,.0f}'
+              f' {validate_time / args.values * 1e6:>14.2f} {load_time / args.loads * 1e3:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
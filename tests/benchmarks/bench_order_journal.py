@@ -0,0 +1,91 @@
+"""
+Benchmark the cost of making a trade durable
+
+Run with::
+
+    python tests/benchmarks/bench_order_journal.py [--trades N]
+
+Each trade is made durable three ways: a SQLite transaction which updates the player's cash and
+adds the cargo, an order journal which fsyncs every record, and an order journal which groups the
+records of a burst of trades into one write and fsync.
+"""
+import argparse
+import asyncio
+import os.path
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from magnate.order import Order
+from magnate.savegame import db
+from magnate.savegame.journal import OrderJournal
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+
+def bench_sqlite(tmpdir, trades):
+    """Commit a savegame transaction for every trade"""
+    engine = db.create_savegame(os.path.join(tmpdir, 'bench.sqlite'), DATADIR)
+    session = sessionmaker(bind=engine)()
+    player = db.Player(name='toshio', password='x', cash=10 ** 9)
+    ship = db.Ship(info=session.query(db.ShipData).first(), condition=100, owner=player,
+                   location=session.query(db.LocationData).first())
+    commodity = session.query(db.CommodityData).first()
+    session.add_all((player, ship))
+    session.commit()
+
+    start = time.perf_counter()
+    for _ in range(trades):
+        player.cash -= 10
+        session.add(db.Cargo(ship=ship, commodity=commodity, quantity=1, purchase_price=10,
+                             purchase_date=0))
+        session.commit()
+    elapsed = time.perf_counter() - start
+    session.close()
+    engine.dispose()
+    return elapsed
+
+
+def bench_journal(tmpdir, trades, burst):
+    """Journal every trade, committing after each burst of trades"""
+    loop = asyncio.new_event_loop()
+    journal = OrderJournal(os.path.join(tmpdir, 'bench-{}.orders'.format(burst)),
+                           loop if burst > 1 else None)
+    order = Order('Earth', 'Grain', 10, hold_quantity=1)
+
+    start = time.perf_counter()
+    for trade in range(trades):
+        journal.record_order('toshio', order)
+        if trade % burst == burst - 1:
+            # The event loop gets to run the scheduled commit between bursts of events
+            journal.commit()
+    journal.close()
+    elapsed = time.perf_counter() - start
+    loop.close()
+    return elapsed, journal.commits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--trades', type=int, default=2000)
+    parser.add_argument('--burst', type=int, default=50,
+                        help='Trades which arrive within one commit delay')
+    args = parser.parse_args()
+
+    db.init_schema(DATADIR)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sqlite_time = bench_sqlite(tmpdir, args.trades)
+        each_time, each_commits = bench_journal(tmpdir, args.trades, 1)
+        group_time, group_commits = bench_journal(tmpdir, args.trades, args.burst)
+
+    print(f'{"method":<24} {"us/trade":>9} {"fsyncs":>7}')
+    print(f'{"sqlite transaction":<24} {sqlite_time / args.trades * 1e6:>9.1f} {args.trades:>7}')
+    print(f'{"journal, fsync each":<24} {each_time / args.trades * 1e6:>9.1f} {each_commits:>7}')
+    print(f'{"journal, group commit":<24} {group_time / args.trades * 1e6:>9.1f}'
+          f' {group_commits:>7}')
+
+
+if __name__ == '__main__':
+    main()
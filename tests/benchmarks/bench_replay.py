@@ -0,0 +1,115 @@
+"""
+Benchmark replaying a recorded game through a dispatcher without a user interface
+
+Run with::
+
+    python tests/benchmarks/bench_replay.py [--minutes N] [--tick-interval S] [--action-interval S]
+
+A game of the given length is played by a bot which buys and sells grain and flies between the
+planets, and recorded.  The recording is then replayed into a fresh game and the time it takes is
+reported.  The replayed game is checked against the recorded one.
+"""
+import argparse
+import asyncio
+import os.path
+import random
+import sys
+import tempfile
+import time
+
+from magnate.magnate import Magnate
+from magnate.order import Order
+from magnate.replay import SETTLE_STEPS, Replayer, read_recording
+from magnate.tick import PriceTicker
+
+
+def start_game(loop, **cfg):
+    """Start the backend of a game without a user interface"""
+    sys.argv = ['magnate', '--_testing-configuration']
+    magnate = Magnate()
+    magnate.cfg.update(cfg)
+    magnate._load_data_definitions()  # pylint: disable=protected-access
+    magnate.start_backend(loop)
+    return magnate
+
+
+async def play(magnate, actions, actions_per_tick):
+    """Play a game as a bot which trades grain"""
+    rand = random.Random(0)
+    ticker = PriceTicker(magnate, magnate.markets)
+    magnate.recorder.ticker = ticker
+    dispatcher = magnate.dispatcher
+    await dispatcher.handle_login('toshio', '')
+    user = dispatcher.user
+    locations = list(magnate.markets)
+
+    ticks_owed = 0.0
+    for _ in range(actions):
+        location = user.ship.location.name
+        price = magnate.markets[location].commodities['Grain'].price
+        held = user.ship.manifest.get('Grain')
+        choice = rand.random()
+        if choice < 0.4 and user.cash >= price:
+            dispatcher.pubpen.publish('action.user.order', Order(location, 'Grain', price,
+                                                                 hold_quantity=1))
+        elif choice < 0.8 and held is not None:
+            dispatcher.pubpen.publish('action.user.order', Order(location, 'Grain', price,
+                                                                 hold_quantity=1, buy=False))
+        else:
+            dispatcher.pubpen.publish('action.ship.movement_attempt', rand.choice(locations))
+        # Let the action finish before the next tick as it would between a person's actions
+        for _ in range(SETTLE_STEPS):
+            await asyncio.sleep(0)
+
+        if actions_per_tick:
+            ticks_owed += 1 / actions_per_tick
+            while ticks_owed >= 1:
+                ticks_owed -= 1
+                await ticker.tick()
+                await asyncio.sleep(0)
+    return user.cash, user.ship.location.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--tick-interval', type=float, default=0,
+                        help='Seconds between price ticks in the recorded game.  0, the default'
+                        ' of price_tick_interval, only changes prices when a ship arrives')
+    parser.add_argument('--action-interval', type=float, default=2.0,
+                        help='Seconds between the player\'s actions in the recorded game')
+    args = parser.parse_args()
+
+    actions = int(args.minutes * 60 / args.action_interval)
+    actions_per_tick = args.tick_interval / args.action_interval
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'game.rec')
+        recorded = start_game(loop, record_session=path, world_seed=42)
+        expected = loop.run_until_complete(play(recorded, actions, actions_per_tick))
+        recorded.stop_backend()
+
+        start = time.perf_counter()
+        recording = read_recording(path)
+        read_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+    replayed = start_game(loop, world_seed=recording.world_seed,
+                          price_generator=recording.price_generator)
+    replayer = Replayer(replayed)
+    start = time.perf_counter()
+    loop.run_until_complete(replayer.run(recording.records))
+    replay_time = time.perf_counter() - start
+    user = replayer.sessions[0].user
+    actual = (user.cash, user.ship.location.name)
+
+    print(f'{args.minutes:g} minute game: {replayer.events} actions, {recording.ticks} ticks,'
+          f' {size} byte recording')
+    print(f'read {read_time * 1000:.1f} ms, replay {replay_time * 1000:.1f} ms'
+          f' ({(replayer.events + recording.ticks) / replay_time:,.0f} events/s)')
+    print('replayed game matches' if actual == expected else
+          f'replayed game differs: {actual} != {expected}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark finding the best trade routes across many markets
+
+Run with::
+
+    python tests/benchmarks/bench_routes.py [--locations N] [--commodities N]
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from pubmarine import PubPen
+
+from magnate.market import Commodity, CommodityData, LocationData, Market, SystemData
+from magnate.rng import RandomSource
+from magnate.routes import RouteTable
+
+
+def make_markets(num_locations, num_commodities, num_systems):
+    """Create a universe of markets with random prices"""
+    loop = asyncio.new_event_loop()
+    magnate = SimpleNamespace(pubpen=PubPen(loop), random_source=RandomSource(0),
+                              price_history=None)
+    commodity_data = [CommodityData(f'Commodity {i}', frozenset(('cargo',)), 100, 30, 0.1,
+                                    random.randint(1, 3))
+                      for i in range(num_commodities)]
+    systems = [SystemData(f'System {i}', None) for i in range(num_systems)]
+
+    markets = OrderedDict()
+    for idx in range(num_locations):
+        location = LocationData(f'Location {idx}', 'planet', systems[idx % num_systems])
+        commodities = OrderedDict((c.name, Commodity(magnate.pubpen, c)) for c in commodity_data)
+        markets[location.name] = Market(magnate, location, commodities)
+    return magnate, markets
+
+
+def timed(func, iterations):
+    """Return the mean milliseconds func takes"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--locations', type=int, default=300)
+    parser.add_argument('--commodities', type=int, default=10)
+    parser.add_argument('--systems', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    magnate, markets = make_markets(args.locations, args.commodities, args.systems)
+    start = time.perf_counter()
+    table = RouteTable(magnate.pubpen, markets)
+    print(f'{args.locations} locations, {args.commodities} commodities, {args.systems} systems')
+    print(f'build table:           {(time.perf_counter() - start) * 1000:8.3f} ms')
+
+    origin = next(iter(markets))
+    elapsed = timed(lambda: table.best(500, 100000, origin=origin), args.iterations)
+    print(f'best from one market:  {elapsed:8.3f} ms')
+    elapsed = timed(lambda: table.best(500, 100000), args.iterations // 10)
+    print(f'best from anywhere:    {elapsed:8.3f} ms')
+
+    locations = list(markets)
+    names = table.commodities
+
+    def update():
+        table.update(random.choice(locations), random.choice(names), random.randint(1, 300))
+    print(f'one price change:      {timed(update, args.iterations):8.3f} ms')
+
+    def reprice_market():
+        market = markets[random.choice(locations)]
+        for name in names:
+            table.update(market.location.name, name, random.randint(1, 300))
+    print(f'reprice one market:    {timed(reprice_market, args.iterations):8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark the savegame lookups which the game makes against a large savegame
+
+Run with::
+
+    python tests/benchmarks/bench_savegame_indexes.py [--locations N] [--players N]
+
+The lookups are timed once with the indexes from the schema and once after the indexes have been
+dropped, as they would be in a savegame from before the indexes existed.
+"""
+import argparse
+import os.path
+import random
+import tempfile
+import time
+
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+
+from magnate.savegame import db
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+INDEXES = ('ix_commodity_location_id_price', 'ix_cargo_ship_id', 'ix_ship_owner_id',
+           'ix_ship_location_id', 'ix_ship_part_ship_id')
+
+
+def populate(engine, num_locations, num_players, ships_per_player=20, commodities=100):
+    """Fill the savegame with a large universe using bulk inserts"""
+    def scalar(sql):
+        return conn.execute(sqlalchemy.text(sql)).first()[0]
+
+    with engine.begin() as conn:
+        celestial_id = scalar('SELECT id FROM celestial_data')
+        location_type = scalar('SELECT type FROM location_data')
+        ship_info = scalar('SELECT id FROM ship_data')
+        part_info = scalar('SELECT id FROM ship_part_data')
+
+        first_location = scalar('SELECT max(id) FROM location_data') + 1
+        conn.execute(db.LocationData.__table__.insert(),
+                     [{'id': first_location + i, 'name': f'Bench Location {i}',
+                       'type': location_type, 'celestial_id': celestial_id}
+                      for i in range(num_locations)])
+        locations = range(first_location, first_location + num_locations)
+
+        first_info = scalar('SELECT max(id) FROM commodity_data') + 1
+        conn.execute(db.CommodityData.__table__.insert(),
+                     [{'id': first_info + i, 'name': f'Bench Commodity {i}', 'mean_price': 100,
+                       'standard_deviation': 10, 'depreciation_rate': 1, 'volume': 1}
+                      for i in range(commodities)])
+
+        conn.execute(db.Commodity.__table__.insert(),
+                     [{'info_id': first_info + c, 'location_id': loc,
+                       'price': random.randint(1, 1000), 'last_update': 0}
+                      for loc in locations for c in range(commodities)])
+
+        conn.execute(db.Player.__table__.insert(),
+                     [{'id': p + 1, 'name': f'player{p}', 'password': 'x', 'cash': 0}
+                      for p in range(num_players)])
+
+        num_ships = num_players * ships_per_player
+        conn.execute(db.Ship.__table__.insert(),
+                     [{'id': s + 1, 'info_id': ship_info, 'condition': 100,
+                       'owner_id': s % num_players + 1, 'location_id': random.choice(locations)}
+                      for s in range(num_ships)])
+        conn.execute(db.Cargo.__table__.insert(),
+                     [{'ship_id': s % num_ships + 1, 'commodity_id': first_info,
+                       'quantity': 1, 'purchase_price': 1, 'purchase_date': 0}
+                      for s in range(num_ships * 5)])
+        conn.execute(db.ShipPart.__table__.insert(),
+                     [{'ship_id': s % num_ships + 1, 'info_id': part_info, 'condition': 100}
+                      for s in range(num_ships * 3)])
+
+    return list(locations), num_players, num_ships
+
+
+def run_lookups(engine, locations, num_players, num_ships, iterations):
+    """Time each of the lookups the game makes"""
+    session = sessionmaker(bind=engine)()
+    rand = random.Random(0)
+    lookups = (
+        ('market by price', lambda: session.query(db.Commodity)
+         .filter(db.Commodity.location_id == rand.choice(locations))
+         .order_by(db.Commodity.price).all()),
+        ('cargo of a ship', lambda: session.query(db.Cargo)
+         .filter(db.Cargo.ship_id == rand.randint(1, num_ships)).all()),
+        ('parts of a ship', lambda: session.query(db.ShipPart)
+         .filter(db.ShipPart.ship_id == rand.randint(1, num_ships)).all()),
+        ('ships of a player', lambda: session.query(db.Ship)
+         .filter(db.Ship.owner_id == rand.randint(1, num_players)).all()),
+        ('ships at a location', lambda: session.query(db.Ship)
+         .filter(db.Ship.location_id == rand.choice(locations)).all()),
+    )
+
+    results = {}
+    try:
+        for name, lookup in lookups:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                lookup()
+                session.expunge_all()
+            results[name] = (time.perf_counter() - start) / iterations * 1000
+    finally:
+        session.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--locations', type=int, default=2000)
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    db.init_schema(DATADIR)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = db.create_savegame(os.path.join(tmpdir, 'bench.sqlite'), DATADIR)
+        locations, num_players, num_ships = populate(engine, args.locations, args.players)
+        print(f'{len(locations)} locations, {num_players} players, {num_ships} ships')
+
+        indexed = run_lookups(engine, locations, num_players, num_ships, args.iterations)
+        with engine.begin() as conn:
+            for index in INDEXES:
+                conn.execute(sqlalchemy.text(f'DROP INDEX {index}'))
+        unindexed = run_lookups(engine, locations, num_players, num_ships, args.iterations)
+        engine.dispose()
+
+    print(f'{"lookup":<20} {"no index ms":>12} {"indexed ms":>11} {"speedup":>8}')
+    for name, indexed_time in indexed.items():
+        print(f'{name:<20} {unindexed[name]:>12.3f} {indexed_time:>11.3f}'
+              f' {unindexed[name] / indexed_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark sending market updates from a game server to many clients
+
+Every client subscribes to the same market's updates.  The benchmark publishes updates on the
+server and measures how long it takes until every client has received all of them.
+
+Run with::
+
+    python tests/benchmarks/bench_server_fanout.py [--clients N] [--updates N]
+"""
+import argparse
+import asyncio
+import time
+
+from pubmarine import PubPen
+
+from magnate.server import GameServer
+from magnate.ui.remote import RemotePubPen
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def handle_update(self, *args):
+        self.count += 1
+
+
+async def run(args):
+    loop = asyncio.get_event_loop()
+    server = GameServer(PubPen(loop))
+    await server.start('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    clients = []
+    counters = []
+    for _ in range(args.clients):
+        client = RemotePubPen(loop)
+        await client.connect('127.0.0.1', port)
+        counter = Counter()
+        client.subscribe('market.Earth.update', counter.handle_update)
+        clients.append(client)
+        counters.append(counter)
+    while len(server._subscribers.get('market.Earth.update', ())) < args.clients:
+        await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    for price in range(args.updates):
+        server.pubpen.publish('market.Earth.update', 'Grain', price)
+        # Let the loop run the forwarder and the clients read between publishes
+        await asyncio.sleep(0)
+    while sum(c.count for c in counters) < args.clients * args.updates:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    delivered = args.clients * args.updates
+    print(f'{args.clients} clients, {args.updates} updates')
+    print(f'delivered:   {delivered} events in {elapsed * 1000:.1f} ms')
+    print(f'throughput:  {delivered / elapsed:,.0f} events/s')
+
+    for client in clients:
+        client.close()
+    await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--updates', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -147,3 +147,37 @@ def test_load_savegame_invalid(tmpdir, fake_datadir):
         engine = db.load_savegame(savefile, fake_datadir)
 
     assert excinfo.value.args[0] == f'{savefile} does not point to a file'
+
+
+LOOKUP_INDEXES = {'commodity': {'ix_commodity_location_id_price'},
+                  'cargo': {'ix_cargo_ship_id'},
+                  'ship': {'ix_ship_owner_id', 'ix_ship_location_id'},
+                  'ship_part': {'ix_ship_part_ship_id'}}
+
+
+def _index_names(engine, table):
+    return {index['name'] for index in sqlalchemy.inspect(engine).get_indexes(table)}
+
+
+def test_create_savegame_indexes(tmpdir, fake_datadir):
+    engine = db.create_savegame(os.path.join(tmpdir, 'test_game.sqlite'), fake_datadir)
+
+    for table, indexes in LOOKUP_INDEXES.items():
+        assert indexes <= _index_names(engine, table)
+
+
+def test_upgrade_savegame_adds_indexes(tmpdir, fake_datadir, datadir):
+    engine = db.create_savegame(os.path.join(tmpdir, 'test_game.sqlite'), fake_datadir)
+    # Make it look like a savegame from before the indexes existed
+    with engine.begin() as connection:
+        for indexes in LOOKUP_INDEXES.values():
+            for index in indexes:
+                connection.execute(sqlalchemy.text(f'DROP INDEX {index}'))
+
+    db.upgrade_savegame(engine, datadir)
+
+    for table, indexes in LOOKUP_INDEXES.items():
+        assert indexes <= _index_names(engine, table)
+
+    # Upgrading again is a no-op
+    db.upgrade_savegame(engine, datadir)
@@ -0,0 +1,72 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+import os.path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from magnate.savegame import base_types
+from magnate.savegame import db
+from magnate.savegame import event_index
+
+
+@pytest.fixture
+def index(fake_datadir):
+    base_types.init_base_types(fake_datadir)
+    commodities = {'Grain': {'food'},
+                   'Drugs': {'chemical', 'illegal'},
+                   'Medicine': {'chemical', 'medical'},
+                   'Ore': {'metal'}}
+    events = {'cheap food': [{'food'}, {'chemical', 'illegal'}],
+              'famine': [{'food'}],
+              'raid': [{'illegal'}, {'chemical'}]}
+    yield event_index.EventIndex(commodities, events)
+
+
+class TestMasks:
+    def test_category_mask(self, fake_datadir):
+        base_types.init_base_types(fake_datadir)
+        food = base_types.CommodityType.food
+        assert event_index.category_mask(()) == 0
+        assert event_index.category_mask(['food']) == event_index.category_bit(food)
+        mask = event_index.category_mask(['food', 'metal'])
+        assert event_index.mask_categories(mask) == frozenset((food, base_types.CommodityType.metal))
+
+
+class TestEventIndex:
+    def test_events_for(self, index):
+        assert index.events_for('Grain') == ['cheap food', 'famine']
+        assert index.events_for('Drugs') == ['cheap food', 'raid']
+        assert index.events_for('Medicine') == ['raid']
+        assert index.events_for('Ore') == []
+
+    def test_events_matching(self, index):
+        assert index.events_matching({'chemical', 'illegal', 'food'}) == ['cheap food', 'famine',
+                                                                         'raid']
+        assert index.events_matching(0) == []
+
+    def test_commodities_for(self, index):
+        assert index.commodities_for('cheap food') == ['Grain', 'Drugs']
+        assert index.commodities_for('famine') == ['Grain']
+        assert index.commodities_for('raid') == ['Drugs', 'Medicine']
+
+    def test_unknown(self, index):
+        with pytest.raises(KeyError):
+            index.events_for('Gold')
+        with pytest.raises(KeyError):
+            index.commodities_for('plague')
+
+    def test_from_session(self, tmpdir, fake_datadir):
+        db.init_schema(fake_datadir)
+        engine = db.create_savegame(os.path.join(tmpdir, 'test_game.sqlite'), fake_datadir)
+        session = sessionmaker(bind=engine)()
+        try:
+            index = event_index.EventIndex.from_session(session)
+            event_ids = {msg: event_id for event_id, msg
+                         in session.query(db.EventData.id, db.EventData.msg)}
+        finally:
+            session.close()
+
+        assert list(index.commodity_masks) == ['Drugs']
+        assert index.events_for('Drugs') == [event_ids['price lower'], event_ids['price higher']]
+        assert index.commodities_for(event_ids['price higher']) == ['Drugs']
@@ -0,0 +1,100 @@
+import os.path
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from magnate.savegame import db
+from magnate.savegame import hydrate
+
+
+def _populate(session, num_players):
+    """Give the savegame a market and some players who own things"""
+    location = session.query(db.LocationData).one()
+    drugs = session.query(db.CommodityData).one()
+    ship_type = session.query(db.ShipData).one()
+    part_types = session.query(db.ShipPartData).all()
+    property_type = session.query(db.PropertyData).one()
+
+    session.add(db.Commodity(info=drugs, location=location, price=10, last_update=0))
+    for player_num in range(num_players):
+        player = db.Player(name=f'player{player_num}', password='x', cash=100)
+        session.add(player)
+        session.add(db.Property(info=property_type, condition=100, owner=player))
+        for _ in range(2):
+            ship = db.Ship(info=ship_type, condition=100, owner=player, location=location)
+            session.add(ship)
+            session.add(db.Cargo(ship=ship, commodity=drugs, quantity=1, purchase_price=10,
+                                 purchase_date=0))
+            for part_type in part_types:
+                session.add(db.ShipPart(info=part_type, condition=100, ship=ship))
+    session.add(db.World(time=0))
+    session.commit()
+
+
+def _walk(state):
+    """Touch every relationship that the game will use"""
+    seen = []
+    for location in state.locations:
+        seen.append(location.celestial.system.name)
+        for commodity in location.commodities:
+            seen.append((commodity.info.name, commodity.info.categories))
+    for player in state.players:
+        for ship in player.ships:
+            seen.append((ship.info.name, ship.location.name))
+            seen.extend(c.commodity.name for c in ship.cargo)
+            seen.extend(p.info.name for p in ship.ship_parts)
+        seen.extend(p.info.name for p in player.properties)
+    return seen
+
+
+@pytest.fixture
+def savegame(tmpdir, fake_datadir):
+    db.init_schema(fake_datadir)
+    engine = db.create_savegame(os.path.join(tmpdir, 'test_game.sqlite'), fake_datadir)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize('num_players', (1, 5))
+def test_load_game_statement_count(savegame, num_players):
+    session = sessionmaker(bind=savegame)()
+    _populate(session, num_players)
+    session.close()
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(savegame, 'before_cursor_execute', count)
+    session = sessionmaker(bind=savegame)()
+    try:
+        state = hydrate.load_game(session)
+        loaded = len(statements)
+        seen = _walk(state)
+    finally:
+        session.close()
+        event.remove(savegame, 'before_cursor_execute', count)
+
+    # locations, commodities, commodity categories, players, ships, cargo, ship parts,
+    # properties, and world
+    assert loaded == 9
+    # Walking the state did not lazy load anything
+    assert len(statements) == loaded
+
+    assert len(state.players) == num_players
+    assert len(state.players[0].ships) == 2
+    assert ('ship', 'Solar Observation Station') in seen
+    assert state.world.time == 0
+
+
+def test_load_game_one_player(savegame):
+    session = sessionmaker(bind=savegame)()
+    try:
+        _populate(session, 3)
+        state = hydrate.load_game(session, player_name='player1')
+    finally:
+        session.close()
+
+    assert [p.name for p in state.players] == ['player1']
@@ -0,0 +1,278 @@
+import asyncio
+import os.path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from magnate.codec import Codec
+from magnate.errors import MagnateInvalidJournal
+from magnate.order import Order
+from magnate.savegame import db
+from magnate.savegame import journal
+from magnate.savegame import load
+
+
+LOCATION = 'Solar Observation Station'
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def savegame(tmpdir, fake_datadir):
+    """Savegame with a player whose ship is at the Solar Observation Station"""
+    db.init_schema(fake_datadir)
+    path = os.path.join(tmpdir, 'test_game.sqlite')
+    engine = db.create_savegame(path, fake_datadir)
+    session = sessionmaker(bind=engine)()
+    try:
+        player = db.Player(name='toshio', password='x', cash=1000)
+        ship_data = session.query(db.ShipData).first()
+        location = session.query(db.LocationData).filter_by(name=LOCATION).one()
+        session.add(db.Ship(info=ship_data, condition=100, owner=player, location=location))
+        session.add(player)
+        session.commit()
+    finally:
+        session.close()
+    return path
+
+
+def _player(path):
+    engine = db.load_savegame(path, os.path.dirname(path))
+    session = sessionmaker(bind=engine)()
+    return session, session.query(db.Player).filter_by(name='toshio').one()
+
+
+def test_round_trip(tmpdir):
+    path = os.path.join(tmpdir, 'orders')
+    order = Order(LOCATION, 'Drugs', 10, hold_quantity=3)
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', order)
+    writer.record_move('toshio', LOCATION)
+    writer.close()
+
+    assert journal.read_journal(path) == [('order', 'toshio', order),
+                                          ('move', 'toshio', LOCATION)]
+    assert journal.read_journal(os.path.join(tmpdir, 'missing')) == []
+
+
+def test_records_name_their_types(tmpdir):
+    # Records must not depend on the order that codec schemas are registered in
+    path = os.path.join(tmpdir, 'orders')
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=3))
+    writer.close()
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert b'Order' in data
+    assert b'OrderStatusType' in data
+
+
+def test_group_commit(tmpdir, loop):
+    path = os.path.join(tmpdir, 'orders')
+    writer = journal.OrderJournal(path, loop, commit_delay=0.01, sync=False)
+    # Only the header has been written
+    size = os.path.getsize(path)
+    for _ in range(10):
+        writer.record_move('toshio', LOCATION)
+    assert os.path.getsize(path) == size
+
+    loop.run_until_complete(asyncio.sleep(0.02))
+    assert writer.commits == 1
+    assert len(journal.read_journal(path)) == 10
+    writer.close()
+
+
+def test_max_pending(tmpdir, loop):
+    path = os.path.join(tmpdir, 'orders')
+    writer = journal.OrderJournal(path, loop, commit_delay=60, max_pending=1, sync=False)
+    writer.record_move('toshio', LOCATION)
+    assert writer.commits == 1
+    writer.close()
+
+
+def test_torn_record(tmpdir):
+    path = os.path.join(tmpdir, 'orders')
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_move('toshio', LOCATION)
+    writer.record_move('toshio', 'Friesland')
+    writer.close()
+
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 2)
+    assert journal.read_journal(path) == [('move', 'toshio', LOCATION)]
+
+
+def test_append_after_torn_record(tmpdir):
+    path = os.path.join(tmpdir, 'orders')
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_move('toshio', LOCATION)
+    writer.record_move('toshio', 'Friesland')
+    writer.close()
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 2)
+
+    # The game restarts after the crash and keeps journaling
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_move('toshio', 'Friesland')
+    writer.record_move('toshio', LOCATION)
+    writer.close()
+    assert journal.read_journal(path) == [('move', 'toshio', LOCATION),
+                                          ('move', 'toshio', 'Friesland'),
+                                          ('move', 'toshio', LOCATION)]
+
+
+def _write_undecodable(path):
+    """Write a journal whose second of three records has a valid frame but cannot be decoded"""
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=1))
+    writer.close()
+    with open(path, 'ab') as f:
+        # A name table entry which the journal's codec does not have
+        f.write(journal.encode_record(('move', 'toshio', LOCATION), Codec(names=('toshio',))))
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=1))
+    writer.close()
+
+
+def test_undecodable_record(tmpdir):
+    path = os.path.join(tmpdir, 'orders')
+    _write_undecodable(path)
+    with pytest.raises(MagnateInvalidJournal):
+        journal.read_journal(path)
+
+
+def test_undecodable_record_is_kept(savegame, fake_datadir):
+    path = journal.journal_path(savegame)
+    _write_undecodable(path)
+    size = os.path.getsize(path)
+
+    with pytest.raises(MagnateInvalidJournal):
+        load.init_game(savegame, fake_datadir)
+    assert os.path.getsize(path) == size
+
+    writer = journal.OrderJournal(path, sync=False)
+    session, player = _player(savegame)
+    try:
+        with pytest.raises(MagnateInvalidJournal):
+            writer.compact(session)
+        assert player.cash == 1000
+    finally:
+        session.close()
+        writer.close()
+    assert os.path.getsize(path) == size
+
+
+def test_replay_in_init_game(savegame, fake_datadir):
+    path = journal.journal_path(savegame)
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=5))
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 12, hold_quantity=2, buy=False))
+    writer.record_order('nobody', Order(LOCATION, 'Drugs', 10, hold_quantity=5))
+    writer.close()
+
+    load.init_game(savegame, fake_datadir)
+    # The journal was compacted into the savegame
+    assert os.path.getsize(path) == 0
+
+    session, player = _player(savegame)
+    try:
+        assert player.cash == 1000 - 50 + 24
+        cargo = player.ships[0].cargo
+        assert [(c.commodity.name, c.quantity, c.purchase_price) for c in cargo] == \
+            [('Drugs', 3, 10)]
+    finally:
+        session.close()
+
+    # Loading again does not apply the orders twice
+    load.init_game(savegame, fake_datadir)
+    session, player = _player(savegame)
+    try:
+        assert player.cash == 974
+    finally:
+        session.close()
+
+
+def test_replay_configured_journal(savegame, fake_datadir, tmpdir):
+    # The game may be configured to write its journal somewhere other than next to the savegame
+    path = os.path.join(tmpdir, 'configured.orders')
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=5))
+    writer.close()
+
+    load.init_game(savegame, fake_datadir, journal=path)
+    assert os.path.getsize(path) == 0
+    session, player = _player(savegame)
+    try:
+        assert player.cash == 950
+    finally:
+        session.close()
+
+
+def test_crash_after_replay(savegame, fake_datadir, monkeypatch):
+    path = journal.journal_path(savegame)
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=5))
+    writer.close()
+
+    def crash(*args):
+        raise KeyboardInterrupt()
+    # The game stops after the savegame is committed but before the journal is emptied
+    monkeypatch.setattr(load.os, 'truncate', crash)
+    with pytest.raises(KeyboardInterrupt):
+        load.init_game(savegame, fake_datadir)
+    monkeypatch.undo()
+    assert len(journal.read_journal(path)) == 1
+
+    load.init_game(savegame, fake_datadir)
+    assert os.path.getsize(path) == 0
+    session, player = _player(savegame)
+    try:
+        assert player.cash == 950
+        assert sum(c.quantity for c in player.ships[0].cargo) == 5
+    finally:
+        session.close()
+
+
+def test_crash_after_compact(savegame, monkeypatch):
+    path = journal.journal_path(savegame)
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=1))
+
+    def crash(*args):
+        raise KeyboardInterrupt()
+    session, player = _player(savegame)
+    try:
+        monkeypatch.setattr(journal.os, 'ftruncate', crash)
+        with pytest.raises(KeyboardInterrupt):
+            writer.compact(session)
+        monkeypatch.undo()
+        # Compacting again after the restart does not charge the player twice
+        assert writer.compact(session) == 0
+        assert player.cash == 990
+    finally:
+        session.close()
+        writer.close()
+
+
+def test_compact(savegame):
+    path = journal.journal_path(savegame)
+    writer = journal.OrderJournal(path, sync=False)
+    writer.record_order('toshio', Order(LOCATION, 'Drugs', 10, hold_quantity=1))
+
+    session, player = _player(savegame)
+    try:
+        assert writer.compact(session) == 1
+        assert player.cash == 990
+    finally:
+        session.close()
+    assert journal.read_journal(path) == []
+
+    # Records after a compaction are still appended
+    writer.record_move('toshio', LOCATION)
+    writer.close()
+    assert len(journal.read_journal(path)) == 1
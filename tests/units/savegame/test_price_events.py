@@ -0,0 +1,39 @@
+import os.path
+
+from magnate.market import PriceEvent
+from magnate.savegame import base_types
+from magnate.savegame import db
+from magnate.savegame import price_events
+
+
+def test_build_event_table(fake_datadir):
+    base_types.init_base_types(fake_datadir)
+    commodities = {'Grain': {'food'},
+                   'Drugs': {'chemical', 'illegal'},
+                   'Ore': {'metal'}}
+    events = [('cheap food', -5, [{'food'}, {'chemical', 'illegal'}]),
+              ('famine', 10, [{'food'}]),
+              ('raid', 20, [{'illegal'}, {'chemical'}])]
+
+    table = price_events.build_event_table(commodities, events)
+
+    assert list(table) == ['Grain', 'Drugs', 'Ore']
+    assert table['Grain'].sales == (PriceEvent('cheap food', 5),)
+    assert table['Grain'].shortages == (PriceEvent('famine', 10),)
+    assert table['Drugs'].sales == (PriceEvent('cheap food', 5),)
+    # raid matches both of its conditions but only applies once
+    assert table['Drugs'].shortages == (PriceEvent('raid', 20),)
+    assert table['Drugs'].shortage_adjustments == (20,)
+    assert table['Ore'].sales == ()
+    assert table['Ore'].shortages == ()
+
+
+def test_load_event_table(tmpdir, fake_datadir):
+    db.init_schema(fake_datadir)
+    engine = db.create_savegame(os.path.join(tmpdir, 'test_game.sqlite'), fake_datadir)
+
+    table = price_events.load_event_table(engine)
+
+    assert list(table) == ['Drugs']
+    assert table['Drugs'].sales == (PriceEvent('price lower', 5),)
+    assert table['Drugs'].shortages == (PriceEvent('price higher', 5),)
@@ -0,0 +1,41 @@
+import os.path
+
+from sqlalchemy.orm import sessionmaker
+
+from magnate.price_history import PriceHistory
+from magnate.savegame import db
+from magnate.savegame import price_history
+
+
+def test_save_and_load(tmpdir, fake_datadir):
+    db.init_schema(fake_datadir)
+    engine = db.create_savegame(os.path.join(tmpdir, 'test_game.sqlite'), fake_datadir)
+
+    history = PriceHistory(retention=100, chunk_size=8)
+    for time in range(20):
+        history.record('Solar Observation Station', 'Drugs', time, time % 5)
+    # Markets which are not in the savegame are skipped
+    history.record('Nowhere', 'Drugs', 0, 1)
+
+    session = sessionmaker(bind=engine)()
+    try:
+        price_history.save_price_history(session, history)
+        session.commit()
+        # Saving again replaces the saved history
+        price_history.save_price_history(session, history)
+        session.commit()
+        assert session.query(db.PriceHistoryChunk).count() == 3
+
+        loaded = price_history.load_price_history(session, retention=100, chunk_size=8)
+    finally:
+        session.close()
+
+    assert list(loaded) == [('Solar Observation Station', 'Drugs')]
+    assert loaded.range('Solar Observation Station', 'Drugs') == \
+        history.range('Solar Observation Station', 'Drugs')
+
+    # The loaded history can be appended to
+    loaded.record('Solar Observation Station', 'Drugs', 20, 7)
+    times, prices = loaded.range('Solar Observation Station', 'Drugs', start=19)
+    assert list(times) == [19, 20]
+    assert list(prices) == [4, 7]
@@ -0,0 +1,23 @@
+import os.path
+
+from sqlalchemy.orm import sessionmaker
+
+from magnate.savegame import db
+from magnate.savegame.travel import load_travel_graph
+
+
+def test_load_travel_graph(tmpdir, fake_datadir):
+    db.init_schema(fake_datadir)
+    engine = db.create_savegame(os.path.join(tmpdir, 'test_game.sqlite'), fake_datadir)
+    session = sessionmaker(bind=engine)()
+    try:
+        locations = session.query(db.LocationData).all()
+        graph = load_travel_graph(session)
+    finally:
+        session.close()
+        engine.dispose()
+
+    assert sorted(graph.locations) == sorted(loc.name for loc in locations)
+    for location in locations:
+        assert location.name not in graph.destinations(location.name)
+        assert graph.distance(location.name, location.name) == 0
@@ -0,0 +1,127 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+
+import pytest
+
+from magnate import auth
+from magnate.auth import (DemoAuthProvider, SQLiteAuthProvider, VerifiedCache, hash_password,
+                          verify_password)
+from magnate.errors import MagnateAuthError
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def provider(tmp_path):
+    return SQLiteAuthProvider(str(tmp_path / 'auth.sqlite'), method='pbkdf2_sha256')
+
+
+class TestHashing:
+    @pytest.mark.parametrize('method', auth.HASH_METHODS)
+    def test_round_trip(self, method):
+        hashed = hash_password('s3cret', method)
+        assert hashed.startswith(method + '$')
+        assert verify_password('s3cret', hashed)
+        assert not verify_password('secret', hashed)
+
+    def test_salted(self):
+        assert hash_password('s3cret', 'pbkdf2_sha256') != hash_password('s3cret', 'pbkdf2_sha256')
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            hash_password('s3cret', 'md5')
+        with pytest.raises(ValueError):
+            verify_password('s3cret', 'md5$abc')
+        with pytest.raises(ValueError):
+            verify_password('s3cret', 'pbkdf2_sha256$10$!!$!!')
+
+
+class TestVerifiedCache:
+    def test_check(self):
+        cache = VerifiedCache(ttl=60)
+        cache.add('toshio', 's3cret')
+        assert cache.check('toshio', 's3cret')
+        assert not cache.check('toshio', 'secret')
+        assert not cache.check('alice', 's3cret')
+        cache.invalidate('toshio')
+        assert not cache.check('toshio', 's3cret')
+
+    def test_expires(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(auth.time, 'monotonic', lambda: now[0])
+        cache = VerifiedCache(ttl=60)
+        cache.add('toshio', 's3cret')
+        now[0] += 61
+        assert not cache.check('toshio', 's3cret')
+        assert len(cache) == 0
+
+    def test_disabled(self):
+        cache = VerifiedCache(ttl=0)
+        cache.add('toshio', 's3cret')
+        assert not cache.check('toshio', 's3cret')
+
+    def test_max_size(self):
+        cache = VerifiedCache(ttl=60, max_size=2)
+        for name in ('a', 'b', 'c'):
+            cache.add(name, 's3cret')
+        assert len(cache) == 2
+        assert not cache.check('a', 's3cret')
+        assert cache.check('c', 's3cret')
+
+
+class TestSQLiteAuthProvider:
+    def test_authenticate(self, loop, provider):
+        loop.run_until_complete(provider.set_password('toshio', 's3cret', create=True))
+        assert loop.run_until_complete(provider.authenticate('toshio', 's3cret'))
+        assert not loop.run_until_complete(provider.authenticate('toshio', 'secret'))
+        assert not loop.run_until_complete(provider.authenticate('alice', 's3cret'))
+
+    def test_cache_skips_hashing(self, loop, provider, monkeypatch):
+        loop.run_until_complete(provider.set_password('toshio', 's3cret', create=True))
+        assert loop.run_until_complete(provider.authenticate('toshio', 's3cret'))
+
+        def fail(*args):
+            raise AssertionError('The password was hashed again')
+        monkeypatch.setattr(auth, 'verify_password', fail)
+        assert loop.run_until_complete(provider.authenticate('toshio', 's3cret'))
+
+    def test_set_password(self, loop, provider):
+        loop.run_until_complete(provider.set_password('toshio', 's3cret', create=True))
+        assert loop.run_until_complete(provider.authenticate('toshio', 's3cret'))
+        loop.run_until_complete(provider.set_password('toshio', 'n3w'))
+        assert not loop.run_until_complete(provider.authenticate('toshio', 's3cret'))
+        assert loop.run_until_complete(provider.authenticate('toshio', 'n3w'))
+
+    def test_set_password_errors(self, loop, provider):
+        loop.run_until_complete(provider.set_password('toshio', 's3cret', create=True))
+        with pytest.raises(MagnateAuthError):
+            loop.run_until_complete(provider.set_password('toshio', 's3cret', create=True))
+        with pytest.raises(MagnateAuthError):
+            loop.run_until_complete(provider.set_password('alice', 's3cret'))
+
+    def test_persists(self, loop, provider):
+        loop.run_until_complete(provider.set_password('toshio', 's3cret', create=True))
+        reopened = SQLiteAuthProvider(provider.path)
+        assert loop.run_until_complete(reopened.authenticate('toshio', 's3cret'))
+
+
+class TestCreateAuthProvider:
+    def test_demo(self, loop):
+        provider = auth.create_auth_provider({'auth_db': None})
+        assert isinstance(provider, DemoAuthProvider)
+        assert loop.run_until_complete(provider.authenticate('Toshio', ''))
+        assert not loop.run_until_complete(provider.authenticate('alice', ''))
+
+    def test_sqlite(self, tmp_path):
+        provider = auth.create_auth_provider({'auth_db': str(tmp_path / 'auth.sqlite'),
+                                              'auth_hash': 'pbkdf2_sha256', 'auth_cache_ttl': 0})
+        assert isinstance(provider, SQLiteAuthProvider)
+        assert provider.method == 'pbkdf2_sha256'
+        assert provider.cache.ttl == 0
@@ -0,0 +1,118 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+from collections import OrderedDict
+
+import pytest
+
+from magnate import codec
+from magnate.market import Commodity, CommodityData, CommodityType, LocationType
+from magnate.memory import ModuleMemory
+from magnate.order import Order, OrderStatusType
+from magnate.price_history import PriceBucket
+from magnate.routes import TradeRoute
+from magnate.ship import ManifestEntry
+from magnate.travel import Route
+
+
+NAMES = ('Earth', 'Mars', 'Grain', 'Metal')
+
+VALUES = (
+    'Earth', 'Pluto', CommodityType.food, OrderStatusType.finalized,
+    ManifestEntry('Grain', 10, 12.5),
+    ManifestEntry('Uranium', 1, 0.0),
+    Order('Earth', 'Grain', 10, hold_quantity=5, buy=False),
+    Order('Pluto', 'Grain', 10, status=OrderStatusType.submitted),
+    PriceBucket(0, 10, 1, 5, 2.5, 3),
+    PriceBucket(0, 10, None, None, None, 0),
+    Route(('Earth', 'Luna', 'Pluto'), 5),
+    TradeRoute('Grain', 'Earth', 'Mars', 10, 20, 3, 30),
+    OrderedDict((('Grain', ManifestEntry('Grain', 1, 2.0)), ('Metal', None))),
+)
+
+
+def _commodity(name, price):
+    commodity = Commodity(None, CommodityData(name, frozenset(('food', 'cargo')), 25, 10, 0.3, 1))
+    commodity.price = price
+    return commodity
+
+
+@pytest.fixture(params=(True, False), ids=('compact', 'generic'))
+def game_codec(request):
+    return codec.Codec(NAMES, compact=request.param)
+
+
+class TestSchemaIds:
+    # Journals and recordings are written with these ids so changing them loses saved data.  New
+    # types must be registered after the existing ones
+    def test_schema_ids(self):
+        assert [schema.wire_type.cls for schema in codec.SCHEMAS] == [
+            Commodity, ManifestEntry, Order, PriceBucket, Route, TradeRoute, ModuleMemory]
+
+    def test_enum_ids(self):
+        assert [members[0].__class__ for members in codec._ENUM_MEMBERS] == [
+            CommodityType, LocationType, OrderStatusType]
+
+
+class TestCodec:
+    @pytest.mark.parametrize('value', VALUES)
+    def test_round_trip(self, game_codec, value):
+        assert game_codec.decode(game_codec.encode(value)) == value
+
+    @pytest.mark.parametrize('price', (30, None))
+    def test_commodity(self, game_codec, price):
+        decoded = game_codec.decode(game_codec.encode(_commodity('Grain', price)))
+        assert decoded.name == 'Grain'
+        assert decoded.price == price
+        assert decoded.type == frozenset((CommodityType.food, CommodityType.cargo))
+        assert decoded.depreciation_rate == 0.3
+
+    def test_names_are_interned(self):
+        game_codec = codec.Codec(NAMES)
+        assert game_codec.encode('Mars') == b'n\x00\x01'
+        assert len(game_codec.encode(ManifestEntry('Grain', 10, 12.5))) < \
+            len(codec.Codec().encode(ManifestEntry('Grain', 10, 12.5)))
+
+    def test_compact_is_smaller(self):
+        market = OrderedDict((name, _commodity(name, 10)) for name in ('Grain', 'Metal'))
+        compact = codec.Codec(NAMES).encode(market)
+        generic = codec.Codec(NAMES, compact=False).encode(market)
+        assert len(compact) < len(generic) / 2
+
+    def test_default_codec_data_decodes_anywhere(self):
+        data = codec.DEFAULT_CODEC.encode(Order('Earth', 'Grain', 10))
+        assert codec.Codec(NAMES).decode(data) == Order('Earth', 'Grain', 10)
+
+    def test_bytes_are_not_copied(self):
+        data = codec.DEFAULT_CODEC.encode([b'abc'])
+        decoded, = codec.DEFAULT_CODEC.decode(data)
+        assert isinstance(decoded, memoryview)
+        assert decoded == b'abc'
+
+    @pytest.mark.parametrize('value', (PriceBucket(0, 1, -2 ** 63, 0, 0.0, 0),
+                                       PriceBucket(0, 1, 0, 0, float('nan'), 0),
+                                       ManifestEntry('Grain', 2 ** 63, 1.0)))
+    def test_unsendable_fields(self, value):
+        with pytest.raises(codec.WireError):
+            codec.DEFAULT_CODEC.encode(value)
+
+    @pytest.mark.parametrize('data', (b'n\x00\x09', b'S\x7f', b'S\x01\x00', b'E\x00\x01\x00',
+                                      b'b\x00\x00\x00\x05ab', b'n\x00'))
+    def test_invalid_data(self, data):
+        with pytest.raises(codec.WireError):
+            codec.Codec(NAMES).decode(data)
+
+    def test_nesting(self, game_codec):
+        value = 'Grain'
+        for _ in range(codec.MAX_DEPTH):
+            value = [value]
+        assert game_codec.decode(game_codec.encode(value)) == value
+
+        with pytest.raises(codec.WireError):
+            game_codec.decode(game_codec.encode([value]))
+        with pytest.raises(codec.WireError):
+            game_codec.decode(b'l\x00\x00\x00\x01' * 100000 + b'N')
+
+    def test_too_many_names(self):
+        with pytest.raises(ValueError):
+            codec.Codec(str(idx) for idx in range(codec.MAX_NAMES + 1))
@@ -76,7 +76,13 @@ class Test_FindConfig:
 
 
 class Test_ReadConfig:
-    cfg_keys = frozenset(('data_dir', 'logging', 'state_dir', 'ui_plugin', 'use_uvloop'))
+    cfg_keys = frozenset(('data_dir', 'logging', 'state_dir', 'ui_plugin', 'use_uvloop',
+                          'world_seed', 'price_generator', 'price_tick_interval',
+                          'tick_workers', 'price_history_size', 'event_stats',
+                          'event_handler_budget', 'auth_db', 'auth_hash', 'auth_cache_ttl',
+                          'order_journal', 'journal_commit_delay', 'record_session',
+                          'profile_memory', 'memory_report_interval',
+                          'profile_duration'))
 
     ui_and_data_cfg = """
     # This is a sample config file
@@ -0,0 +1,79 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+import time
+
+import pytest
+
+from magnate import event_stats
+
+
+@pytest.fixture
+def pubpen():
+    loop = asyncio.new_event_loop()
+    yield event_stats.InstrumentedPubPen(loop, budget=1)
+    loop.close()
+
+
+class Handlers:
+    def __init__(self):
+        self.calls = 0
+
+    def fast(self, *args):
+        self.calls += 1
+
+    def slow(self, *args):
+        time.sleep(0.002)
+
+
+class TestInstrumentedPubPen:
+    def test_counts_publishes_and_fanout(self, pubpen):
+        handlers = Handlers()
+        pubpen.subscribe('ship.moved', handlers.fast)
+        pubpen.subscribe('ship.moved', handlers.slow)
+
+        pubpen.publish('ship.moved', 'Earth', 'Mars')
+        pubpen.publish('ship.moved', 'Mars', 'Earth')
+        pubpen.publish('market.event')
+        pubpen.loop.run_until_complete(asyncio.sleep(0))
+
+        assert handlers.calls == 2
+        assert pubpen.topics['ship.moved'].publishes == 2
+        assert pubpen.topics['ship.moved'].max_fanout == 2
+        assert pubpen.topics['ship.moved'].mean_fanout == 2.0
+        assert pubpen.topics['market.event'].publishes == 1
+        assert pubpen.topics['market.event'].deliveries == 0
+
+    def test_times_handlers(self, pubpen):
+        handlers = Handlers()
+        pubpen.subscribe('ship.moved', handlers.fast)
+        pubpen.subscribe('ship.moved', handlers.slow)
+
+        pubpen.publish('ship.moved', 'Earth', 'Mars')
+        pubpen.loop.run_until_complete(asyncio.sleep(0))
+
+        fast = pubpen.handlers[('ship.moved', 'Handlers.fast')]
+        slow = pubpen.handlers[('ship.moved', 'Handlers.slow')]
+        assert fast.calls == 1
+        assert fast.slow_calls == 0
+        assert slow.calls == 1
+        assert slow.slow_calls == 1
+        assert slow.max_time >= 0.002
+        assert sum(slow.histogram) == 1
+
+        assert 'Handlers.slow [ship.moved]' in pubpen.summary()
+
+    def test_event_stats_query(self, pubpen):
+        received = []
+
+        def handle_stats(topics, handlers):
+            received.append((topics, handlers))
+
+        pubpen.subscribe('debug.event_stats', handle_stats)
+        pubpen.publish('query.debug.event_stats')
+        pubpen.loop.run_until_complete(asyncio.sleep(0))
+        pubpen.loop.run_until_complete(asyncio.sleep(0))
+
+        assert len(received) == 1
+        assert received[0][0]['query.debug.event_stats'].publishes == 1
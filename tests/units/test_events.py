@@ -0,0 +1,63 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+
+import pytest
+from pubmarine import EventNotFoundError, PubPen
+
+from magnate import events
+
+
+@pytest.fixture
+def pubpen():
+    loop = asyncio.new_event_loop()
+    yield PubPen(loop)
+    loop.close()
+
+
+class TestTopic:
+    def test_formats_template(self):
+        assert events.topic('market.{}.update', 'Earth') == 'market.Earth.update'
+
+    def test_interned(self):
+        first = events.topic('market.{}.update', ''.join(('Ea', 'rth')))
+        second = events.topic('market.{}.update', 'Earth')
+        assert first is second
+
+
+class TestPublisher:
+    def test_no_subscribers_does_not_queue(self, pubpen, mocker):
+        publish = mocker.patch.object(pubpen, 'publish')
+        publish_update = events.publisher(pubpen, 'market.{}.update', 'Earth')
+
+        assert publish_update.has_subscribers is False
+        publish_update('Grain')
+        assert publish.called is False
+
+    def test_publishes_to_subscribers(self, pubpen):
+        received = []
+
+        def handler(*args):
+            received.append(args)
+
+        publish_update = events.publisher(pubpen, 'market.{}.update', 'Earth')
+        sub_id = pubpen.subscribe(events.topic('market.{}.update', 'Earth'), handler)
+        assert publish_update.has_subscribers is True
+
+        publish_update('Grain', 10)
+        pubpen.loop.run_until_complete(asyncio.sleep(0))
+        assert received == [('Grain', 10)]
+
+        pubpen.unsubscribe(sub_id)
+        assert publish_update.has_subscribers is False
+
+    def test_unregistered_event(self):
+        loop = asyncio.new_event_loop()
+        try:
+            pubpen = PubPen(loop, event_list=('ship.moved',))
+            events.publisher(pubpen, 'ship.moved')
+            with pytest.raises(EventNotFoundError):
+                events.publisher(pubpen, 'ship.{}', 'sunk')
+        finally:
+            loop.close()
@@ -0,0 +1,148 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from pubmarine import PubPen
+
+from magnate.fleet import Fleet, TradeOrder
+from magnate.market import Commodity, CommodityData, LocationData, Market, SystemData
+from magnate.rng import RandomSource
+from magnate.ship import ManifestEntry, ShipData
+from magnate.travel import TravelGraph
+
+
+PRICES = {'Earth': {'Grain': 10, 'Ore': 100},
+          'Mars': {'Grain': 30, 'Ore': 90}}
+
+
+@pytest.fixture
+def magnate():
+    loop = asyncio.new_event_loop()
+    magnate = SimpleNamespace(pubpen=PubPen(loop), random_source=RandomSource(42),
+                              price_history=None)
+
+    commodity_data = (CommodityData('Grain', frozenset(('food', 'cargo')), 25, 10, 0.3, 1),
+                      CommodityData('Ore', frozenset(('metal', 'cargo')), 200, 50, 0.1, 2),
+                      CommodityData('Laser', frozenset(('equipment',)), 50, 5, 0.1, 1))
+    system = SystemData('Sol', None)
+    markets = OrderedDict()
+    for name, prices in PRICES.items():
+        location = LocationData(name, 'planet', system)
+        commodities = OrderedDict((c.name, Commodity(magnate.pubpen, c)) for c in commodity_data)
+        markets[name] = Market(magnate, location, commodities)
+        for commodity, price in prices.items():
+            markets[name].commodities[commodity].price = price
+    magnate.markets = markets
+    # Earth and Mars are two ticks apart
+    magnate.travel_graph = TravelGraph(OrderedDict((('Sol', OrderedDict((('Earth', 2),
+                                                                         ('Mars', 4)))),)))
+
+    yield magnate
+    loop.close()
+
+
+@pytest.fixture
+def owner():
+    return SimpleNamespace(cash=1000)
+
+
+@pytest.fixture
+def fleet(magnate, owner):
+    fleet = Fleet(magnate, 'Haulers', owner)
+    fleet.add_ships(ShipData('Freighter', 1000, 100, 5, 20, 0), 'Earth', count=10)
+    yield fleet
+    fleet.close()
+
+
+class TestFleet:
+    def test_add_ships(self, fleet):
+        assert len(fleet) == 10
+        assert fleet.commodities == ['Grain', 'Ore']
+        new = fleet.add_ships(ShipData('Clipper', 500, 50, 5, 5, 0), 'Mars', count=2)
+        assert new == range(10, 12)
+        assert list(fleet.location) == [0] * 10 + [1] * 2
+        assert list(fleet.holdspace) == [20] * 10 + [5] * 2
+        assert list(fleet.ship_type) == [0] * 10 + [1] * 2
+
+    def test_give_order_invalid(self, fleet):
+        with pytest.raises(ValueError):
+            fleet.give_order(TradeOrder('Laser', 'Earth', 'Mars'))
+        with pytest.raises(ValueError):
+            fleet.give_order(TradeOrder('Grain', 'Earth', 'Venus'))
+
+    def test_tick_without_order(self, fleet, owner):
+        fleet.tick()
+        assert owner.cash == 1000
+        assert list(fleet.location) == [0] * 10
+
+    def test_trade_round_trip(self, magnate, fleet, owner):
+        traded = []
+
+        def record(*args):
+            traded.append(args)
+        # PubPen only keeps a weak reference to record
+        magnate.pubpen.subscribe('fleet.Haulers.traded', record)
+        fleet.give_order(TradeOrder('Grain', 'Earth', 'Mars'))
+
+        # $1000 buys 100 Grain at $10: the first five ships are filled and the rest are empty
+        fleet.tick()
+        assert owner.cash == 0
+        assert list(fleet.cargo[0]) == [20] * 5 + [0] * 5
+        assert list(fleet.filled_hold) == [20] * 5 + [0] * 5
+        assert fleet.manifest(0) == {'Grain': ManifestEntry('Grain', 20, 10.0)}
+        assert fleet.manifest(9) == {}
+        # Loaded ships set off for Mars, empty ones wait at Earth
+        assert list(fleet.location) == [0] * 10
+        assert list(fleet.destination) == [1] * 5 + [0] * 5
+        assert list(fleet.remaining) == [2] * 5 + [0] * 5
+
+        # Still flying so nothing is sold
+        fleet.tick()
+        assert list(fleet.remaining) == [1] * 5 + [0] * 5
+        assert list(fleet.cargo[0]) == [20] * 5 + [0] * 5
+
+        # Sells 100 Grain at $30.  The empty ships at Earth spend it all on 300 more Grain but
+        # only have space for 100
+        fleet.tick()
+        assert list(fleet.cargo[0]) == [0] * 5 + [20] * 5
+        assert owner.cash == 3000 - 1000
+        assert list(fleet.location) == [1] * 5 + [0] * 5
+        assert list(fleet.destination) == [0] * 5 + [1] * 5
+        assert list(fleet.remaining) == [2] * 10
+
+        magnate.pubpen.loop.run_until_complete(asyncio.sleep(0))
+        assert traded == [(100, 0, -1000), (100, 100, 2000)]
+
+    def test_no_route(self, magnate, owner):
+        magnate.travel_graph = TravelGraph(OrderedDict((('Sol', OrderedDict((('Earth', 2),))),
+                                                        ('Ares', OrderedDict((('Mars', 4),))))))
+        fleet = Fleet(magnate, 'Haulers', owner)
+        try:
+            with pytest.raises(ValueError):
+                fleet.give_order(TradeOrder('Grain', 'Earth', 'Mars'))
+        finally:
+            fleet.close()
+
+    def test_world_tick(self, magnate, fleet, owner):
+        fleet.give_order(TradeOrder('Ore', 'Earth', 'Mars'))
+        magnate.pubpen.publish('world.tick', 1)
+        magnate.pubpen.loop.run_until_complete(asyncio.sleep(0))
+        # Ore takes 2 units of hold so each ship carries 10
+        assert list(fleet.cargo[1]) == [10] * 1 + [0] * 9
+        assert owner.cash == 0
+
+    def test_fleet_info(self, magnate, fleet):
+        fleet.give_order(TradeOrder('Grain', 'Earth', 'Mars'))
+        fleet.tick()
+        info = []
+
+        def record(*args):
+            info.append(args)
+        magnate.pubpen.subscribe('fleet.Haulers.info', record)
+        magnate.pubpen.publish('query.fleet.Haulers.info')
+        magnate.pubpen.loop.run_until_complete(asyncio.sleep(0))
+        assert info == [(10, {'Earth': 5}, 5, {'Grain': 100})]
@@ -0,0 +1,85 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+from functools import partial
+
+import pytest
+from twiggy import filters, levels, outputs
+from twiggy.logger import Logger
+
+from magnate.logging import LazyLogger, enabled_for
+
+
+@pytest.fixture
+def output():
+    return outputs.ListOutput(close_atexit=False)
+
+
+def _logger(output, level):
+    """Create a twiggy logger with its own emitter writing to a list"""
+    return Logger(emitters={'test': filters.Emitter(level, None, output)})
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        return value.upper()
+
+
+class TestEnabledFor:
+    @pytest.mark.parametrize('level, expected', (
+        (levels.DEBUG, False),
+        (levels.INFO, False),
+        (levels.WARNING, True),
+        (levels.ERROR, True),
+    ))
+    def test_emitter_level(self, output, level, expected):
+        assert enabled_for(level, _logger(output, levels.WARNING)) is expected
+
+    def test_logger_level(self, output):
+        logger = _logger(output, levels.DEBUG)
+        logger.min_level = levels.ERROR
+        assert not enabled_for(levels.WARNING, logger)
+
+    def test_no_emitters(self):
+        assert not enabled_for(levels.CRITICAL, Logger(emitters={}))
+
+
+class TestLazyLogger:
+    def test_fields(self, output):
+        mlog = LazyLogger(_logger(output, levels.DEBUG)).fields(mod='test')
+        flog = mlog.fields(func='test_fields', value=1)
+        flog.fields(value=2).info('value is {}', 2)
+        mlog.debug('no function')
+
+        assert len(output.messages) == 2
+        msg = output.messages[0]
+        assert msg.level == levels.INFO
+        assert msg.text == 'value is 2'
+        assert msg.fields['mod'] == 'test'
+        assert msg.fields['func'] == 'test_fields'
+        # Fields bound later take precedence
+        assert msg.fields['value'] == 2
+        assert 'func' not in output.messages[1].fields
+
+    def test_disabled_level(self, output):
+        counter = Counter()
+        flog = LazyLogger(_logger(output, levels.WARNING)).fields(mod='test')
+        flog.fields(data=partial(counter, 'data')).debug('{0} is not formatted', None)
+        assert output.messages == []
+        assert counter.calls == 0
+
+    def test_lazy_value(self, output):
+        counter = Counter()
+        flog = LazyLogger(_logger(output, levels.DEBUG)).fields(data=partial(counter, 'data'))
+        flog.warning('computed')
+        assert counter.calls == 1
+        assert output.messages[0].fields['data'] == 'DATA'
+
+    def test_enabled_for(self, output):
+        flog = LazyLogger(_logger(output, levels.INFO)).fields(mod='test')
+        assert flog.enabled_for(levels.INFO)
+        assert not flog.enabled_for(levels.DEBUG)
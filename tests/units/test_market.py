@@ -0,0 +1,91 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from pubmarine import PubPen
+
+from magnate import market as market_mod
+from magnate.market import Commodity, CommodityData, LocationData, Market, SystemData
+from magnate.price_history import PriceHistory
+from magnate.rng import RandomSource
+
+
+COMMODITY_NAMES = ('Grain', 'Ore', 'Laser')
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def market(loop):
+    magnate = SimpleNamespace(pubpen=PubPen(loop), random_source=RandomSource(42),
+                              price_history=None)
+    commodities = OrderedDict(
+        (name, Commodity(magnate.pubpen, CommodityData(name, frozenset(('cargo',)), 100, 10,
+                                                       0.1, 1)))
+        for name in COMMODITY_NAMES)
+    location = LocationData('Earth', 'planet', SystemData('Sol', None))
+    return Market(magnate, location, commodities)
+
+
+class TestMarketVersions:
+    def test_initial_prices_are_changes(self, market):
+        assert market.version == len(COMMODITY_NAMES)
+        assert list(market.changes(0)) == list(COMMODITY_NAMES)
+
+    def test_changes_since(self, market):
+        version = market.version
+        assert market.changes(version) == OrderedDict()
+
+        market.apply_price('Ore', 1000)
+        market.apply_price('Grain', 2000)
+        market.apply_price('Ore', 1001)
+        # Setting the same price is not a change
+        market.apply_price('Laser', market.commodities['Laser'].price)
+        assert market.version == version + 3
+        assert market.changes(version) == OrderedDict((('Grain', 2000), ('Ore', 1001)))
+        assert market.changes(version + 2) == OrderedDict((('Ore', 1001),))
+
+    def test_unknown_version(self, market):
+        assert list(market.changes(market.version + 10)) == list(COMMODITY_NAMES)
+
+    def test_query_changes(self, loop, market):
+        events = []
+
+        def record(*args):
+            events.append(args)
+
+        market.pubpen.subscribe('market.Earth.changes', record)
+        version = market.version
+        market.apply_price('Laser', 5000)
+        market.pubpen.publish('query.market.Earth.changes', version)
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.run_until_complete(asyncio.sleep(0))
+        assert events == [(version + 1, OrderedDict((('Laser', 5000),)))]
+
+
+class TestPriceHistory:
+    def test_clock_goes_backwards(self, loop, market, monkeypatch):
+        market.price_history = PriceHistory()
+        updates = []
+
+        def record(*args):
+            updates.append(args)
+        market.pubpen.subscribe('market.Earth.update', record)
+
+        monkeypatch.setattr(market_mod.time, 'time', lambda: 1000)
+        market.apply_price('Grain', 1)
+        monkeypatch.setattr(market_mod.time, 'time', lambda: 500)
+        market.apply_price('Grain', 2)
+        loop.run_until_complete(asyncio.sleep(0))
+
+        assert len(updates) == 2
+        assert market.price_history.range('Earth', 'Grain')[1][-2:].tolist() == [1, 2]
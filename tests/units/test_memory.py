@@ -0,0 +1,96 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+import os.path
+import tracemalloc
+
+import pytest
+from pubmarine import PubPen
+
+import magnate.memory
+from magnate.codec import DEFAULT_CODEC
+from magnate.memory import MemoryProfiler, ModuleMemory, module_name, start_tracing
+
+
+PACKAGE_DIR = os.path.dirname(magnate.memory.__file__)
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def record(self, *args):
+        self.events.append(args)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def tracing():
+    was_tracing = tracemalloc.is_tracing()
+    start_tracing()
+    yield
+    if not was_tracing:
+        tracemalloc.stop()
+
+
+class TestModuleName:
+    @pytest.mark.parametrize('path, name', (
+        (os.path.join(PACKAGE_DIR, 'market.py'), 'magnate.market'),
+        (os.path.join(PACKAGE_DIR, 'ui', 'urwid', 'message_win.py'),
+         'magnate.ui.urwid.message_win'),
+        (os.path.join(PACKAGE_DIR, 'ui', '__init__.py'), 'magnate.ui'),
+        ('/usr/lib/python3/site-packages/sqlalchemy/orm/identity.py', 'sqlalchemy'),
+        ('/usr/lib/python3/dist-packages/six.py', 'six'),
+        (os.path.__file__, 'stdlib'),
+        ('/somewhere/else.py', 'other'),
+    ))
+    def test_module_name(self, path, name):
+        assert module_name(path) == name
+
+
+class TestMemoryProfiler:
+    def test_report(self, loop, tracing):
+        profiler = MemoryProfiler(PubPen(loop), interval=0, top=None)
+        profiler.report()
+        encoded = DEFAULT_CODEC.encode([('Earth', i * 1.5, 'x' * i) for i in range(1000)])
+        decoded = DEFAULT_CODEC.decode(encoded)
+
+        modules = {m.module: m for m in profiler.report()}
+        assert modules['magnate.codec'].size_diff > 0
+        assert modules['magnate.codec'].count >= len(decoded)
+        # The largest modules come first
+        sizes = [m.size for m in modules.values()]
+        assert sizes == sorted(sizes, reverse=True)
+
+        del decoded
+        modules = {m.module: m for m in profiler.report()}
+        assert modules.get('magnate.codec', ModuleMemory('', 0, 0)).size_diff < 0
+
+    def test_query(self, loop, tracing):
+        pubpen = PubPen(loop)
+        profiler = MemoryProfiler(pubpen, interval=0)
+        recorder = Recorder()
+        pubpen.subscribe('debug.memory', recorder.record)
+        pubpen.publish('query.debug.memory', 3)
+        for _ in range(2):
+            loop.run_until_complete(asyncio.sleep(0))
+
+        current, peak, modules = recorder.events[0]
+        assert 0 < current <= peak
+        assert len(modules) == 3
+        assert all(isinstance(m, ModuleMemory) for m in modules)
+        # The report can be sent to remote user interfaces
+        assert DEFAULT_CODEC.decode(DEFAULT_CODEC.encode(modules)) == modules
+        profiler.stop()
+
+    def test_not_tracing(self, loop):
+        if tracemalloc.is_tracing():
+            pytest.skip('Something else is tracing allocations')
+        assert MemoryProfiler(PubPen(loop)).report() == []
@@ -0,0 +1,94 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+
+import pytest
+from pubmarine import PubPen
+
+from magnate.ui.urwid.message_win import Message, MessageHistory, MessageWindow, MsgType
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def window(loop):
+    window = MessageWindow(PubPen(loop))
+    # Keep the tests quick
+    window._MIN_TIME_BETWEEN_MESSAGES = 0.001
+    yield window
+    if window._drain_handle is not None:
+        window._drain_handle.cancel()
+
+
+def _displayed(window):
+    return [widget.text for widget in window.message_list]
+
+
+class TestMessageHistory:
+    def test_capacity(self):
+        history = MessageHistory(3)
+        for idx in range(5):
+            history.append(Message(str(idx)))
+        assert history.capacity == 3
+        assert len(history) == 3
+        # The oldest messages were evicted
+        assert [m.msg for m in history] == ['2', '3', '4']
+        assert history[-1].msg == '4'
+
+    def test_spill(self, tmpdir):
+        spill_file = str(tmpdir.join('messages.log'))
+        history = MessageHistory(2, spill_file=spill_file)
+        history.append(Message('first'))
+        history.append(Message('second', MsgType.error, count=2))
+        assert not tmpdir.join('messages.log').exists()
+
+        history.append(Message('third'))
+        history.append(Message('fourth'))
+        assert tmpdir.join('messages.log').read() == 'info: first\nerror: second (x2)\n'
+        assert [m.msg for m in history] == ['third', 'fourth']
+
+    def test_unwritable_spill(self, tmpdir):
+        # A directory cannot be appended to
+        history = MessageHistory(1, spill_file=str(tmpdir))
+        history.append(Message('first'))
+        history.append(Message('second'))
+        assert history.spill_file is None
+        assert [m.msg for m in history] == ['second']
+
+
+class TestMessageWindow:
+    def test_repeats_collapse(self, window):
+        window.add_message('Engine trouble')
+        window.add_message('Engine trouble')
+        window.add_message('Engine trouble', severity=MsgType.error)
+        assert _displayed(window) == ['Engine trouble (x2)']
+        assert len(window.history) == 1
+
+        # Repeats of a message which is waiting to be displayed collapse as well
+        assert list(window._pending) == [Message('Engine trouble', MsgType.error)]
+        window.add_message('Engine trouble', severity=MsgType.error)
+        assert list(window._pending) == [Message('Engine trouble', MsgType.error, count=2)]
+
+    def test_pending_is_bounded(self, loop, window):
+        handles = set()
+        for idx in range(30):
+            window.add_message(str(idx))
+            handles.add(window._drain_handle)
+        # One timer drains the queue no matter how many messages arrive
+        assert len(handles) == 1
+        assert len(window._pending) == window._MAX_PENDING
+        # The first was displayed and the ones that did not fit in the queue went to the history
+        assert [m.msg for m in window.history] == [str(idx) for idx in range(10)]
+
+        async def drained():
+            while window._drain_handle is not None:
+                await asyncio.sleep(0.001)
+        loop.run_until_complete(asyncio.wait_for(drained(), 5))
+        assert [m.msg for m in window.history] == [str(idx) for idx in range(30)]
+        assert _displayed(window) == ['27', '28', '29']
@@ -0,0 +1,133 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import pytest
+
+from magnate import price_history
+
+
+class TestCodec:
+    @pytest.mark.parametrize('times, prices', (
+        ([], []),
+        ([0], [0]),
+        ([1000000, 1000001, 1000001, 1000060], [25, 24, 300, 1]),
+        ([5, 2 ** 40], [-3, 2 ** 40]),
+    ))
+    def test_round_trip(self, times, prices):
+        data = price_history.encode_samples(times, prices)
+        assert price_history.decode_samples(data) == (price_history.array('q', times),
+                                                      price_history.array('q', prices))
+
+    def test_compact(self):
+        times = range(1000000, 1000100)
+        prices = [25 + (i % 7) for i in range(100)]
+        data = price_history.encode_samples(times, prices)
+        # The first sample is large but after that each delta fits in a byte
+        assert len(data) < 2 * 100 + 8
+
+
+class TestPriceSeries:
+    def test_append_and_range(self):
+        series = price_history.PriceSeries(retention=100, chunk_size=4)
+        for time in range(10):
+            series.append(time, time * 10)
+
+        assert len(series) == 10
+        assert len(series.chunks) == 2
+        assert series.range() == (price_history.array('q', range(10)),
+                                  price_history.array('q', range(0, 100, 10)))
+        assert series.range(3, 6) == (price_history.array('q', [3, 4, 5, 6]),
+                                      price_history.array('q', [30, 40, 50, 60]))
+        assert series.range(start=8) == (price_history.array('q', [8, 9]),
+                                         price_history.array('q', [80, 90]))
+        assert series.range(20, 30) == (price_history.array('q'), price_history.array('q'))
+
+    def test_append_only(self):
+        series = price_history.PriceSeries()
+        series.append(10, 1)
+        series.append(10, 2)
+        with pytest.raises(ValueError):
+            series.append(9, 3)
+
+    def test_retention(self):
+        series = price_history.PriceSeries(retention=10, chunk_size=4)
+        for time in range(100):
+            series.append(time, time)
+
+        assert 10 <= len(series) < 10 + 4
+        times, _ = series.range()
+        assert times[-1] == 99
+        assert len(times) == len(series)
+
+    def test_seal(self):
+        series = price_history.PriceSeries(chunk_size=4)
+        for time in range(6):
+            series.append(time, time)
+
+        chunks = series.seal()
+        assert [c.count for c in chunks] == [4, 2]
+        assert chunks[1].samples() == (price_history.array('q', [4, 5]),
+                                       price_history.array('q', [4, 5]))
+
+
+class TestPriceHistory:
+    def test_record(self):
+        history = price_history.PriceHistory()
+        history.record('Earth', 'Grain', 1, 10)
+        history.record('Earth', 'Grain', 2, 11)
+        history.record('Mars', 'Grain', 1, 20)
+
+        assert sorted(history) == [('Earth', 'Grain'), ('Mars', 'Grain')]
+        assert history.range('Earth', 'Grain') == (price_history.array('q', [1, 2]),
+                                                   price_history.array('q', [10, 11]))
+        assert history.range('Venus', 'Grain') == (price_history.array('q'),
+                                                   price_history.array('q'))
+
+    def test_clock_goes_backwards(self):
+        history = price_history.PriceHistory()
+        history.record('Earth', 'Grain', 100, 10)
+        history.record('Earth', 'Grain', 50, 11)
+        history.record('Earth', 'Grain', 101, 12)
+        assert history.range('Earth', 'Grain') == (price_history.array('q', [100, 100, 101]),
+                                                   price_history.array('q', [10, 11, 12]))
+
+
+class TestDownsample:
+    def test_buckets(self):
+        series = price_history.PriceSeries(chunk_size=4)
+        for time in range(10):
+            series.append(time, time * 10)
+
+        buckets = series.downsample(5)
+        assert len(buckets) == 5
+        assert buckets[0] == price_history.PriceBucket(0, 2, 0, 10, 5.0, 2)
+        assert buckets[-1] == price_history.PriceBucket(8, 10, 80, 90, 85.0, 2)
+
+    def test_carries_price_into_empty_buckets(self):
+        series = price_history.PriceSeries(chunk_size=4)
+        series.append(0, 5)
+        series.append(1, 7)
+        series.append(9, 3)
+
+        buckets = series.downsample(5, start=2)
+        # Buckets are two time units wide except the last
+        assert [(b.start, b.end) for b in buckets] == [(2, 4), (4, 6), (6, 8), (8, 10)]
+        assert [b.count for b in buckets] == [0, 0, 0, 1]
+        assert [b.low for b in buckets] == [7, 7, 7, 3]
+
+    def test_matches_undecoded(self):
+        series = price_history.PriceSeries(retention=100000, chunk_size=16)
+        prices = [(i * 7919) % 101 for i in range(1000)]
+        for time, price in enumerate(prices):
+            series.append(time, price)
+
+        for bucket in series.downsample(10):
+            expected = prices[bucket.start:bucket.end]
+            assert bucket.low == min(expected)
+            assert bucket.high == max(expected)
+            assert bucket.mean == sum(expected) / len(expected)
+            assert bucket.count == len(expected)
+
+    def test_empty(self):
+        assert price_history.PriceSeries().downsample(10) == []
+        assert price_history.PriceHistory().downsample('Earth', 'Grain', 10) == []
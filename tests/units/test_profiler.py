@@ -0,0 +1,102 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+import os
+import pstats
+
+import pytest
+from pubmarine import PubPen
+
+from magnate.profiler import PROFILE_SIGNAL, CPUProfiler
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def record(self, *args):
+        self.events.append(args)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _busy():
+    """Something for the profiler to find"""
+    return sum(i * i for i in range(10000))
+
+
+def _run(loop, times=2):
+    for _ in range(times):
+        loop.run_until_complete(asyncio.sleep(0))
+
+
+class TestCPUProfiler:
+    def test_start_stop(self, loop, tmp_path):
+        pubpen = PubPen(loop)
+        profiler = CPUProfiler(pubpen, str(tmp_path / 'state'))
+        recorder = Recorder()
+        pubpen.subscribe('debug.profile_started', recorder.record)
+        pubpen.subscribe('debug.profile_saved', recorder.record)
+
+        profiler.start(duration=60)
+        assert profiler.running
+        _busy()
+        path = profiler.stop()
+        assert not profiler.running
+        _run(loop)
+
+        assert os.path.dirname(path) == str(tmp_path / 'state')
+        functions = {func[2] for func in pstats.Stats(path).stats}
+        assert '_busy' in functions
+        assert recorder.events == [(60,), (path,)]
+
+    def test_stop_not_running(self, loop, tmp_path):
+        profiler = CPUProfiler(PubPen(loop), str(tmp_path))
+        assert profiler.stop() is None
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_bounded(self, loop, tmp_path):
+        profiler = CPUProfiler(PubPen(loop), str(tmp_path), duration=0.01)
+        profiler.start()
+        loop.run_until_complete(asyncio.sleep(0.05))
+        assert not profiler.running
+        assert len(os.listdir(str(tmp_path))) == 1
+
+    def test_profiles_are_not_overwritten(self, loop, tmp_path):
+        profiler = CPUProfiler(PubPen(loop), str(tmp_path))
+        paths = set()
+        for _ in range(3):
+            profiler.start()
+            paths.add(profiler.stop())
+        assert len(paths) == 3
+        assert len(os.listdir(str(tmp_path))) == 3
+
+    def test_toggle_event(self, loop, tmp_path):
+        pubpen = PubPen(loop)
+        profiler = CPUProfiler(pubpen, str(tmp_path))
+        pubpen.publish('action.debug.profile')
+        _run(loop)
+        assert profiler.running
+        pubpen.publish('action.debug.profile')
+        _run(loop)
+        assert not profiler.running
+        assert len(os.listdir(str(tmp_path))) == 1
+
+    @pytest.mark.skipif(PROFILE_SIGNAL is None, reason='Platform has no profiler signal')
+    def test_signal(self, loop, tmp_path):
+        profiler = CPUProfiler(PubPen(loop), str(tmp_path))
+        assert profiler.install_signal_handler()
+        try:
+            os.kill(os.getpid(), PROFILE_SIGNAL)
+            _run(loop, 4)
+            assert profiler.running
+        finally:
+            profiler.close()
+        assert not profiler.running
+        assert len(os.listdir(str(tmp_path))) == 1
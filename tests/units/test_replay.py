@@ -0,0 +1,105 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+import sys
+
+import pytest
+
+from magnate.magnate import Magnate
+from magnate.order import Order
+from magnate.replay import LOGIN_EVENT, Replayer, read_recording
+from magnate.tick import PriceTicker
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _magnate(monkeypatch, loop, **cfg):
+    """Start the backend of a game without a user interface"""
+    monkeypatch.setattr(sys, 'argv', ['magnate', '--_testing-configuration'])
+    magnate = Magnate()
+    magnate.cfg.update(cfg)
+    magnate._load_data_definitions()
+    magnate.start_backend(loop)
+    return magnate
+
+
+def _state(magnate, sessions):
+    """Return everything about a game that the players' actions change"""
+    players = []
+    for session in sessions:
+        user = session.user
+        players.append((user.username, user.cash, user.ship.location.name,
+                        sorted(user.ship.manifest.items())))
+    prices = [(location, name, commodity.price) for location, market in magnate.markets.items()
+              for name, commodity in market.commodities.items()]
+    return players, prices
+
+
+def _run(loop):
+    for _ in range(4):
+        loop.run_until_complete(asyncio.sleep(0))
+
+
+def _play(magnate, loop):
+    """Play a short game with the local player and one remote player"""
+    dispatcher = magnate.dispatcher
+    ticker = PriceTicker(magnate, magnate.markets)
+    magnate.recorder.ticker = ticker
+    remote = dispatcher.open_session()
+
+    loop.run_until_complete(dispatcher.handle_login('toshio', 'secret'))
+    loop.run_until_complete(dispatcher.handle_login('toshio-remote', 'secret', session=remote))
+    for destination in ('Mars', 'Earth', 'Luna'):
+        for session in (dispatcher.default_session, remote):
+            location = session.user.ship.location.name
+            price = magnate.markets[location].commodities['Grain'].price
+            session.pubpen.publish('action.user.order',
+                                   Order(location, 'Grain', price, hold_quantity=2))
+            _run(loop)
+        loop.run_until_complete(ticker.tick())
+        _run(loop)
+        for session in (dispatcher.default_session, remote):
+            session.pubpen.publish('action.ship.movement_attempt', destination)
+            _run(loop)
+    loop.run_until_complete(ticker.tick())
+    return [dispatcher.default_session, remote]
+
+
+class TestReplay:
+    def test_record_and_replay(self, monkeypatch, loop, tmp_path):
+        path = str(tmp_path / 'game.rec')
+        original = _magnate(monkeypatch, loop, record_session=path, world_seed=1234)
+        sessions = _play(original, loop)
+        expected = _state(original, sessions)
+        original.stop_backend()
+
+        # Recordings must not depend on the order that codec schemas are registered in
+        with open(path, 'rb') as f:
+            assert b'OrderStatusType' in f.read()
+
+        recording = read_recording(path)
+        assert recording.world_seed == 1234
+        assert recording.ticks == 4
+        # Logins are recorded without their password
+        logins = [r for r in recording.records if r[2] == LOGIN_EVENT]
+        assert [(r[1], r[3]) for r in logins] == [(0, ('toshio',)), (1, ('toshio-remote',))]
+
+        replayed = _magnate(monkeypatch, loop, world_seed=recording.world_seed,
+                            price_generator=recording.price_generator)
+        replayer = Replayer(replayed)
+        loop.run_until_complete(replayer.run(recording.records))
+        assert replayer.events == len(recording.records) - 1
+        assert replayer.ticker.tick_count == 4
+        assert _state(replayed, [replayer.sessions[0], replayer.sessions[1]]) == expected
+
+    def test_not_a_recording(self, tmp_path):
+        path = tmp_path / 'game.rec'
+        path.write_bytes(b'not a recording')
+        with pytest.raises(ValueError):
+            read_recording(str(path))
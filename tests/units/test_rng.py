@@ -0,0 +1,65 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import pytest
+
+from magnate import rng
+
+
+class TestDeriveSeed:
+    def test_stable(self):
+        assert rng.derive_seed(1, 'market', 'Earth') == rng.derive_seed(1, 'market', 'Earth')
+
+    def test_distinct(self):
+        seeds = {rng.derive_seed(1, 'market', 'Earth'),
+                 rng.derive_seed(1, 'market', 'Mars'),
+                 rng.derive_seed(2, 'market', 'Earth'),
+                 rng.derive_seed(1, 'marketEarth')}
+        assert len(seeds) == 4
+
+
+class TestPCG32Stream:
+    def test_reference_output(self):
+        # Output of the reference pcg32-demo for seed 42, sequence 54
+        stream = rng.PCG32Stream(42, 54)
+        assert [stream._next32() for _ in range(6)] == [0xa15c02b7, 0x7b47f409, 0xba1d3330,
+                                                        0x83d2f293, 0xbfa4784b, 0xcbed606e]
+
+    def test_randints_in_range(self):
+        values = rng.PCG32Stream(1).randints(-3, 3, 1000)
+        assert min(values) == -3
+        assert max(values) == 3
+
+    def test_randint_matches_randints(self):
+        single = rng.PCG32Stream(7)
+        bulk = rng.PCG32Stream(7)
+        assert [single.randint(0, 100) for _ in range(50)] == bulk.randints(0, 100, 50)
+
+    @pytest.mark.parametrize('low, high', ((1, 0), (0, 2**32)))
+    def test_unsupported_range(self, low, high):
+        with pytest.raises(ValueError):
+            rng.PCG32Stream(1).randint(low, high)
+
+
+class TestRandomSource:
+    @pytest.mark.parametrize('generator', rng.GENERATORS)
+    def test_reproducible(self, generator):
+        first = rng.RandomSource(1234, generator).stream('market', 'Earth')
+        second = rng.RandomSource(1234, generator).stream('market', 'Earth')
+        assert first.randints(1, 100, 20) == second.randints(1, 100, 20)
+
+    @pytest.mark.parametrize('generator', rng.GENERATORS)
+    def test_streams_independent(self, generator):
+        source = rng.RandomSource(1234, generator)
+        earth = source.stream('market', 'Earth')
+        expected = source.stream('market', 'Earth').randints(1, 100, 20)
+
+        source.stream('market', 'Mars').randints(1, 100, 1000)
+        assert earth.randints(1, 100, 20) == expected
+
+    def test_random_seed(self):
+        assert isinstance(rng.RandomSource().world_seed, int)
+
+    def test_unknown_generator(self):
+        with pytest.raises(ValueError):
+            rng.RandomSource(1, 'dice')
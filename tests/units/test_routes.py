@@ -0,0 +1,80 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from pubmarine import PubPen
+
+from magnate.market import Commodity, CommodityData, LocationData, Market, SystemData
+from magnate.rng import RandomSource
+from magnate.routes import RouteTable, TradeRoute
+
+
+PRICES = {'Earth': {'Grain': 10, 'Ore': 100, 'Laser': 5},
+          'Mars': {'Grain': 30, 'Ore': 90, 'Laser': 50},
+          'Luna': {'Grain': 20, 'Ore': 150, 'Laser': 50},
+          'Proxima': {'Grain': 1000, 'Ore': 1000, 'Laser': 1000}}
+
+
+@pytest.fixture
+def magnate():
+    loop = asyncio.new_event_loop()
+    magnate = SimpleNamespace(pubpen=PubPen(loop), random_source=RandomSource(42),
+                              price_history=None)
+
+    commodity_data = (CommodityData('Grain', frozenset(('food', 'cargo')), 25, 10, 0.3, 1),
+                      CommodityData('Ore', frozenset(('metal', 'cargo')), 200, 50, 0.1, 2),
+                      CommodityData('Laser', frozenset(('equipment',)), 50, 5, 0.1, 1))
+    markets = OrderedDict()
+    for system_name, location_names in (('Sol', ('Earth', 'Mars', 'Luna')),
+                                        ('Centauri', ('Proxima',))):
+        system = SystemData(system_name, None)
+        for name in location_names:
+            location = LocationData(name, 'planet', system)
+            commodities = OrderedDict((c.name, Commodity(magnate.pubpen, c))
+                                      for c in commodity_data)
+            markets[name] = Market(magnate, location, commodities)
+            for commodity, price in PRICES[name].items():
+                markets[name].commodities[commodity].price = price
+    magnate.markets = markets
+
+    yield magnate
+    loop.close()
+
+
+class TestRouteTable:
+    def test_best_from_origin(self, magnate):
+        table = RouteTable(magnate.pubpen, magnate.markets)
+        routes = table.best(holdspace=100, cash=1000, origin='Earth')
+
+        # Equipment is not traded and other systems cannot be reached
+        assert routes == [TradeRoute('Grain', 'Earth', 'Mars', 10, 30, 100, 2000),
+                          TradeRoute('Grain', 'Earth', 'Luna', 10, 20, 100, 1000),
+                          TradeRoute('Ore', 'Earth', 'Luna', 100, 150, 10, 500)]
+
+    def test_best_anywhere(self, magnate):
+        table = RouteTable(magnate.pubpen, magnate.markets)
+        routes = table.best(holdspace=100, cash=1000, k=3)
+
+        assert [(r.commodity, r.origin, r.destination, r.profit) for r in routes] == \
+            [('Grain', 'Earth', 'Mars', 2000), ('Grain', 'Earth', 'Luna', 1000),
+             ('Ore', 'Mars', 'Luna', 660)]
+
+    def test_limited_by_hold_and_cash(self, magnate):
+        table = RouteTable(magnate.pubpen, magnate.markets)
+        # Ore takes two units of hold space
+        assert table.best(holdspace=4, cash=1000, origin='Earth', k=1) == \
+            [TradeRoute('Ore', 'Earth', 'Luna', 100, 150, 2, 100)]
+        assert table.best(holdspace=100, cash=25, origin='Earth', k=1)[0].quantity == 2
+        assert table.best(holdspace=0, cash=1000) == []
+
+    def test_price_update(self, magnate):
+        table = RouteTable(magnate.pubpen, magnate.markets)
+        magnate.markets['Luna'].apply_price('Grain', 100)
+        magnate.pubpen.loop.run_until_complete(asyncio.sleep(0))
+
+        assert table.best(holdspace=10, cash=1000, origin='Earth', k=1) == \
+            [TradeRoute('Grain', 'Earth', 'Luna', 10, 100, 10, 900)]
@@ -0,0 +1,279 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+from functools import partial
+
+import pytest
+from pubmarine import PubPen
+
+from magnate.server import Connection, GameServer
+from magnate.session import SessionRegistry
+from magnate.ship import ManifestEntry
+from magnate.ui.remote import RemotePubPen
+from magnate.wire import PUBLISH, encode_message
+
+
+class Backend:
+    """Stand in for the Dispatcher"""
+    def __init__(self, pubpen):
+        self.pubpen = pubpen
+        self.queries = []
+        pubpen.subscribe('query.user.info', self.handle_user_info)
+        pubpen.subscribe('ship.moved', self.handle_ship_moved)
+        pubpen.subscribe('query.debug.memory', self.handle_debug)
+        pubpen.subscribe('action.debug.profile', self.handle_debug)
+
+    def handle_user_info(self, *args, **kwargs):
+        self.queries.append((args, kwargs))
+        self.pubpen.publish('user.info', 'toshio', 500, 'Earth')
+
+    def handle_ship_moved(self, *args):
+        # Clients may not publish anything but action and query events
+        self.queries.append(('ship.moved', args))
+
+    def handle_debug(self, *args):
+        # Nor the debugging ones
+        self.queries.append(('debug', args))
+
+
+class SessionDispatcher:
+    """Stand in for the Dispatcher which answers each session with its id"""
+    def __init__(self, pubpen):
+        self.pubpen = pubpen
+        self.sessions = SessionRegistry()
+
+    def open_session(self):
+        session = self.sessions.create(self.pubpen)
+        callback = partial(self.handle_user_info, session)
+        session.callbacks.append(callback)
+        session.pubpen.subscribe('query.user.info', callback)
+        return session
+
+    def close_session(self, session_id):
+        self.sessions.remove(session_id).close()
+
+    def handle_user_info(self, session):
+        session.pubpen.publish('user.info', session.session_id)
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def record(self, *args):
+        self.events.append(args)
+
+
+async def _until(condition, timeout=2):
+    """Run the event loop until condition() is true"""
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('Timed out waiting for the condition')
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def server(loop):
+    pubpen = PubPen(loop)
+    server = GameServer(pubpen)
+    loop.run_until_complete(server.start('127.0.0.1', 0))
+    server.backend = Backend(pubpen)
+    yield server
+    loop.run_until_complete(server.close())
+
+
+def _client(loop, server, num_clients=1):
+    port = server.sockets[0].getsockname()[1]
+    clients = []
+    for _ in range(num_clients):
+        client = RemotePubPen(loop)
+        loop.run_until_complete(client.connect('127.0.0.1', port))
+        clients.append(client)
+    return clients
+
+
+class TestGameServer:
+    def test_query_and_reply(self, loop, server):
+        client, = _client(loop, server)
+        recorder = Recorder()
+        client.subscribe('user.info', recorder.record)
+        client.publish('query.user.info', 'toshio', extra=1)
+        client.publish('ship.moved', 'Mars', 'Earth')
+
+        loop.run_until_complete(_until(lambda: recorder.events))
+        assert recorder.events == [('toshio', 500, 'Earth')]
+        assert server.backend.queries == [(('toshio',), {'extra': 1})]
+        client.close()
+
+    def test_debug_events_are_refused(self, loop, server):
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = loop.run_until_complete(asyncio.open_connection('127.0.0.1', port))
+        for event in ('query.debug.memory', 'action.debug.profile', 'query.user.info'):
+            writer.write(encode_message(PUBLISH, event))
+
+        loop.run_until_complete(_until(lambda: server.backend.queries))
+        assert server.backend.queries == [((), {})]
+        writer.close()
+
+    def test_fan_out(self, loop, server):
+        clients = _client(loop, server, 20)
+        recorders = []
+        for client in clients:
+            recorder = Recorder()
+            client.subscribe('market.Earth.update', recorder.record)
+            recorders.append(recorder)
+        loop.run_until_complete(_until(
+            lambda: len(server._subscribers.get('market.Earth.update', ())) == 20))
+        # One subscription on the backend serves every client
+        assert len(server.pubpen._event_handlers['market.Earth.update']) == 1
+
+        server.pubpen.publish('market.Earth.update', 'Grain', 10)
+        loop.run_until_complete(_until(lambda: all(r.events for r in recorders)))
+        assert all(r.events == [('Grain', 10)] for r in recorders)
+
+        for client in clients:
+            client.close()
+        loop.run_until_complete(_until(lambda: not server.connections))
+        assert 'market.Earth.update' not in server._subscribers
+        assert not server.pubpen._event_handlers['market.Earth.update']
+
+    def test_sessions(self, loop):
+        pubpen = PubPen(loop)
+        dispatcher = SessionDispatcher(pubpen)
+        server = GameServer(pubpen, dispatcher=dispatcher)
+        loop.run_until_complete(server.start('127.0.0.1', 0))
+        try:
+            clients = _client(loop, server, 2)
+            recorders = []
+            for client in clients:
+                recorder = Recorder()
+                client.subscribe('user.info', recorder.record)
+                recorders.append(recorder)
+            loop.run_until_complete(_until(lambda: len(dispatcher.sessions) == 2
+                                           and len(server._subscribers) == 2))
+
+            clients[0].publish('query.user.info')
+            loop.run_until_complete(_until(lambda: recorders[0].events))
+            clients[1].publish('query.user.info')
+            loop.run_until_complete(_until(lambda: recorders[1].events))
+            # Each client only hears the answer to its own query
+            assert len(recorders[0].events) == 1
+            assert recorders[0].events != recorders[1].events
+
+            for client in clients:
+                client.close()
+            loop.run_until_complete(_until(lambda: not dispatcher.sessions))
+        finally:
+            loop.run_until_complete(server.close())
+
+    def test_sessions_cannot_spy(self, loop):
+        pubpen = PubPen(loop)
+        dispatcher = SessionDispatcher(pubpen)
+        server = GameServer(pubpen, dispatcher=dispatcher)
+        loop.run_until_complete(server.start('127.0.0.1', 0))
+        try:
+            spy, victim = _client(loop, server, 2)
+            loop.run_until_complete(_until(lambda: len(dispatcher.sessions) == 2))
+            spied = Recorder()
+            for session_id in (1, 2):
+                for event in ('action.user.login_attempt', 'user.info'):
+                    spy.subscribe('session.{}.{}'.format(session_id, event), spied.record)
+            spy.subscribe('action.user.login_attempt', spied.record)
+            answers = Recorder()
+            spy.subscribe('user.info', answers.record)
+            loop.run_until_complete(_until(lambda: len(server._subscribers) == 1))
+
+            victim.publish('action.user.login_attempt', 'victim', 'hunter2')
+            victim.publish('query.user.info')
+            # The spy's own query is answered after the victim's events have been handled
+            spy.publish('query.user.info')
+            loop.run_until_complete(_until(lambda: answers.events))
+            assert spied.events == []
+            assert all(not name.startswith('session.') or name.endswith('.user.info')
+                       for name in server._subscribers)
+
+            for client in (spy, victim):
+                client.close()
+            loop.run_until_complete(_until(lambda: not dispatcher.sessions))
+        finally:
+            loop.run_until_complete(server.close())
+
+    def test_name_table(self, loop):
+        pubpen = PubPen(loop)
+        server = GameServer(pubpen, names=('Earth', 'Grain'))
+        loop.run_until_complete(server.start('127.0.0.1', 0))
+        try:
+            client, = _client(loop, server)
+            loop.run_until_complete(_until(lambda: client.codec.names == ('Earth', 'Grain')))
+
+            recorder = Recorder()
+            client.subscribe('ship.cargo', recorder.record)
+            loop.run_until_complete(_until(lambda: 'ship.cargo' in server._subscribers))
+            entry = ManifestEntry('Grain', 10, 12.5)
+            pubpen.publish('ship.cargo', {'Grain': entry})
+            loop.run_until_complete(_until(lambda: recorder.events))
+            assert recorder.events == [({'Grain': entry},)]
+            client.close()
+        finally:
+            loop.run_until_complete(server.close())
+
+
+class FakeTransport:
+    def __init__(self):
+        self.buffered = 0
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class FakeWriter:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.frames = []
+        self.closed = False
+
+    def get_extra_info(self, name):
+        return None
+
+    def write(self, frame):
+        self.frames.append(frame)
+        self.transport.buffered += len(frame)
+
+    def close(self):
+        self.closed = True
+
+
+class TestBackpressure:
+    def test_slow_client(self, loop):
+        server = GameServer(PubPen(loop), high_water=100, max_buffer=200)
+        writer = FakeWriter()
+        connection = Connection(server, None, writer)
+        server.connections.add(connection)
+        server.subscribe(connection, 'market.Earth.update')
+        server.subscribe(connection, 'user.cash.update')
+        frame = encode_message(PUBLISH, 'market.Earth.update', ('Grain', 10))
+
+        while writer.transport.buffered <= 100:
+            server._forward('market.Earth.update', 'market.Earth.update', 'Grain', 10)
+        sent = len(writer.frames)
+        # Market updates are skipped once the client is behind
+        server._forward('market.Earth.update', 'market.Earth.update', 'Grain', 10)
+        assert len(writer.frames) == sent
+        assert connection.dropped == 1
+        assert writer.frames[0] == frame
+
+        # Other events are still sent until the client is too far behind
+        while not writer.closed:
+            server._forward('user.cash.update', 'user.cash.update', 10, 5)
+        assert writer.transport.buffered <= 200 + len(writer.frames[-1])
+        assert connection not in server.connections
+        assert not server._subscribers
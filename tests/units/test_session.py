@@ -0,0 +1,321 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+from collections import OrderedDict
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+from pubmarine import PubPen
+
+from magnate.auth import DemoAuthProvider
+from magnate.dispatcher import Dispatcher
+from magnate.events import publisher
+from magnate.fleet import TradeOrder
+from magnate.magnate import Magnate
+from magnate.market import Commodity, CommodityData, LocationData, Market, SystemData
+from magnate.order import Order
+from magnate.rng import RandomSource
+from magnate.savegame.journal import OrderJournal, read_journal
+from magnate.session import ScopedPubPen, SessionRegistry
+from magnate.ship import ShipData
+from magnate.travel import TravelGraph
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def record(self, *args):
+        self.events.append(args)
+
+
+def _run(loop):
+    """Let the callbacks of the published events run"""
+    for _ in range(3):
+        loop.run_until_complete(asyncio.sleep(0))
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def magnate(loop):
+    magnate = SimpleNamespace(pubpen=PubPen(loop), random_source=RandomSource(42),
+                              price_history=None, user=None, auth=DemoAuthProvider(),
+                              journal=None, recorder=None,
+                              ship_data={'Passenger': ShipData('Passenger', 100, 10, 5, 100, 0)})
+    magnate.login = partial(Magnate.login, magnate)
+    magnate.create_ship = partial(Magnate.create_ship, magnate)
+    magnate.create_fleet = partial(Magnate.create_fleet, magnate)
+
+    grain = CommodityData('Grain', frozenset(('food', 'cargo')), 25, 10, 0.3, 1)
+    system = SystemData('Sol', None)
+    magnate.markets = OrderedDict()
+    for name in ('Earth', 'Mars'):
+        location = LocationData(name, 'planet', system)
+        location.destinations = tuple(n for n in ('Earth', 'Mars') if n != name)
+        commodities = OrderedDict((('Grain', Commodity(magnate.pubpen, grain)),))
+        magnate.markets[name] = Market(magnate, location, commodities)
+    magnate.travel_graph = TravelGraph({'Sol': {'Earth': 2, 'Mars': 3}})
+    # Stands in for the PriceTicker which the tests publish world.tick for
+    magnate.price_ticker = SimpleNamespace()
+    return magnate
+
+
+class TestScopedPubPen:
+    def test_scope(self, loop):
+        scoped = ScopedPubPen(PubPen(loop), 3)
+        assert scoped.scope('query.user.info') == 'session.3.query.user.info'
+        assert scoped.scope('market.Earth.purchased') == 'session.3.market.Earth.purchased'
+        assert scoped.scope('market.Earth.update') == 'market.Earth.update'
+        assert scoped.scope('world.tick') == 'world.tick'
+        assert ScopedPubPen(PubPen(loop)).scope('user.info') == 'user.info'
+
+    def test_publish_and_publisher(self, loop):
+        pubpen = PubPen(loop)
+        scoped = ScopedPubPen(pubpen, 3)
+        scoped_recorder = Recorder()
+        global_recorder = Recorder()
+        scoped.subscribe('user.info', scoped_recorder.record)
+        pubpen.subscribe('user.info', global_recorder.record)
+
+        scoped.publish('user.info', 1)
+        publisher(scoped, 'user.{}', 'info')(2)
+        pubpen.publish('user.info', 3)
+        _run(loop)
+        assert scoped_recorder.events == [(1,), (2,)]
+        assert global_recorder.events == [(3,)]
+
+    def test_close(self, loop):
+        pubpen = PubPen(loop)
+        scoped = ScopedPubPen(pubpen, 3)
+        recorder = Recorder()
+        scoped.subscribe('user.info', recorder.record)
+        scoped.close()
+        assert 'session.3.user.info' not in pubpen._event_handlers
+        scoped.publish('user.info', 1)
+        _run(loop)
+        assert recorder.events == []
+
+
+class TestSessionRegistry:
+    def test_create_and_remove(self, loop):
+        pubpen = PubPen(loop)
+        registry = SessionRegistry()
+        first = registry.create(pubpen)
+        second = registry.create(pubpen)
+        assert first.session_id != second.session_id
+        assert len(registry) == 2
+        assert registry[first.session_id] is first
+        assert registry.remove(first.session_id) is first
+        assert first.session_id not in registry
+        assert registry.get(first.session_id) is None
+        assert list(registry) == [second]
+
+
+class TestDispatcherSessions:
+    def test_sessions_are_isolated(self, loop, magnate):
+        dispatcher = Dispatcher(magnate, magnate.markets)
+        alice = dispatcher.open_session()
+        bob = dispatcher.open_session()
+        alice.pubpen.publish('action.user.login_attempt', 'toshio-alice', 'pw')
+        bob.pubpen.publish('action.user.login_attempt', 'toshio-bob', 'pw')
+        _run(loop)
+        assert alice.user.username == 'toshio-alice'
+        assert bob.user.username == 'toshio-bob'
+        assert dispatcher.user is None and magnate.user is None
+
+        infos = Recorder()
+        purchases = Recorder()
+        bob_purchases = Recorder()
+        alice.pubpen.subscribe('user.info', infos.record)
+        alice.pubpen.subscribe('market.Earth.purchased', purchases.record)
+        bob.pubpen.subscribe('market.Earth.purchased', bob_purchases.record)
+
+        alice.pubpen.publish('query.user.info')
+        price = magnate.markets['Earth'].commodities['Grain'].price
+        alice.pubpen.publish('action.user.order', Order('Earth', 'Grain', price, hold_quantity=2))
+        _run(loop)
+        # Only alice's user answered and only alice bought
+        assert infos.events == [('toshio-alice', 500, 'Earth')]
+        assert purchases.events == [('Grain', 2)]
+        assert bob_purchases.events == []
+        assert alice.user.cash == 500 - 2 * price
+        assert bob.user.cash == 500
+
+        bob.pubpen.publish('action.ship.movement_attempt', 'Mars')
+        _run(loop)
+        assert bob.user.ship.location.name == 'Mars'
+        assert alice.user.ship.location.name == 'Earth'
+
+    def test_close_session(self, loop, magnate):
+        dispatcher = Dispatcher(magnate, magnate.markets)
+        session = dispatcher.open_session()
+        dispatcher.close_session(session.session_id)
+        assert session.session_id not in dispatcher.sessions
+        session.pubpen.publish('action.user.login_attempt', 'toshio', 'pw')
+        _run(loop)
+        assert session.user is None
+
+    def test_login_failure(self, loop, magnate):
+        dispatcher = Dispatcher(magnate, magnate.markets)
+        session = dispatcher.open_session()
+        failures = Recorder()
+        session.pubpen.subscribe('user.login_failure', failures.record)
+        session.pubpen.publish('action.user.login_attempt', 'alice', 'pw')
+        _run(loop)
+        assert session.user is None
+        assert len(failures.events) == 1
+
+    def test_one_login_at_a_time(self, loop, magnate):
+        dispatcher = Dispatcher(magnate, magnate.markets)
+        session = dispatcher.open_session()
+        failures = Recorder()
+        session.pubpen.subscribe('user.login_failure', failures.record)
+        session.pubpen.publish('action.user.login_attempt', 'toshio', 'pw')
+        session.pubpen.publish('action.user.login_attempt', 'toshio-other', 'pw')
+        _run(loop)
+        assert session.user.username == 'toshio'
+        assert failures.events == [('A login is already in progress',)]
+        assert not dispatcher._logins
+
+        # Once logged in, the session cannot log in again
+        session.pubpen.publish('action.user.login_attempt', 'toshio-other', 'pw')
+        _run(loop)
+        assert session.user.username == 'toshio'
+        assert failures.events[1:] == [('Already logged in',)]
+        assert not dispatcher._logins
+
+    @pytest.mark.parametrize('order', (
+        Order('Earth', 'Grain', 10, hold_quantity=-1000),
+        Order('Earth', 'Grain', 10, hold_quantity=-1000, buy=False),
+        Order('Earth', 'Grain', 10, hold_quantity=1, warehouse_quantity=-1),
+        Order('Earth', 'Grain', 10),
+        Order('Earth', 'Grain', 0, hold_quantity=1),
+        Order('Earth', 'Grain', -10, hold_quantity=1, buy=False),
+        Order('Earth', 'Gold', 10, hold_quantity=1),
+        Order('Nowhere', 'Grain', 10, hold_quantity=1),
+        ('Earth', 'Grain', 10),
+    ))
+    def test_invalid_order(self, loop, magnate, order):
+        dispatcher = Dispatcher(magnate, magnate.markets)
+        session = dispatcher.open_session()
+        session.pubpen.publish('action.user.login_attempt', 'toshio', 'pw')
+        _run(loop)
+        failures = Recorder()
+        session.pubpen.subscribe('user.order_failure', failures.record)
+
+        session.pubpen.publish('action.user.order', order)
+        _run(loop)
+        assert len(failures.events) == 1
+        assert session.user.cash == 500
+        assert session.user.ship.manifest == {}
+
+    def test_journal(self, loop, magnate, tmp_path):
+        magnate.journal = OrderJournal(str(tmp_path / 'orders'), sync=False)
+        dispatcher = Dispatcher(magnate, magnate.markets)
+        session = dispatcher.open_session()
+        session.pubpen.publish('action.user.login_attempt', 'toshio', 'pw')
+        _run(loop)
+        price = magnate.markets['Earth'].commodities['Grain'].price
+        session.pubpen.publish('action.user.order', Order('Earth', 'Grain', price + 5,
+                                                          hold_quantity=2))
+        session.pubpen.publish('action.ship.movement_attempt', 'Mars')
+        _run(loop)
+        magnate.journal.close()
+        # The journal has the price which was paid rather than the price on the order
+        assert read_journal(magnate.journal.path) == [
+            ('order', 'toshio', Order('Earth', 'Grain', price, hold_quantity=2)),
+            ('move', 'toshio', 'Mars')]
+
+
+class TestDispatcherFleets:
+    def _login(self, loop, magnate):
+        dispatcher = Dispatcher(magnate, magnate.markets)
+        session = dispatcher.open_session()
+        session.pubpen.publish('action.user.login_attempt', 'toshio', 'pw')
+        _run(loop)
+        return dispatcher, session
+
+    def test_trade(self, loop, magnate):
+        dispatcher, session = self._login(loop, magnate)
+        infos = Recorder()
+        session.pubpen.subscribe('fleet.Haulers.info', infos.record)
+
+        session.pubpen.publish('action.fleet.create', 'Haulers')
+        session.pubpen.publish('action.fleet.buy_ships', 'Haulers', 'Passenger', 2)
+        session.pubpen.publish('action.fleet.order', 'Haulers', 'Grain', 'Earth', 'Mars')
+        _run(loop)
+        fleet = session.user.fleets['Haulers']
+        assert infos.events == [(0, {}, 0, {}), (2, {'Earth': 2}, 0, {})]
+        assert session.user.cash == 500 - 2 * 100
+        assert fleet.order == TradeOrder('Grain', 'Earth', 'Mars')
+
+        # $300 buys 100 Grain which fills the first ship
+        magnate.markets['Earth'].commodities['Grain'].price = 3
+        magnate.pubpen.publish('world.tick', 1)
+        _run(loop)
+        assert session.user.cash == 0
+        assert list(fleet.cargo[0]) == [100, 0]
+        assert list(fleet.destination) == [1, 0]
+        assert dispatcher.user is None
+
+    @pytest.mark.parametrize('event, args', (
+        ('action.fleet.create', ('Haulers',)),
+        ('action.fleet.create', ('',)),
+        ('action.fleet.create', ('Haul.ers',)),
+        ('action.fleet.create', (7,)),
+        ('action.fleet.buy_ships', ('Clippers', 'Passenger', 1)),
+        ('action.fleet.buy_ships', ('Haulers', 'Dreadnought', 1)),
+        ('action.fleet.buy_ships', ('Haulers', 'Passenger', 0)),
+        ('action.fleet.buy_ships', ('Haulers', 'Passenger', -1)),
+        ('action.fleet.buy_ships', ('Haulers', 'Passenger', 6)),
+        ('action.fleet.order', ('Clippers', 'Grain', 'Earth', 'Mars')),
+        ('action.fleet.order', ('Haulers', 'Gold', 'Earth', 'Mars')),
+        ('action.fleet.order', ('Haulers', 'Grain', 'Earth', 'Venus')),
+        ('action.fleet.order', ('Haulers', 'Grain', 'Earth', None)),
+    ))
+    def test_failure(self, loop, magnate, event, args):
+        _, session = self._login(loop, magnate)
+        session.pubpen.publish('action.fleet.create', 'Haulers')
+        _run(loop)
+        failures = Recorder()
+        for failure in ('fleet.create_failure', 'fleet.purchase_failure', 'fleet.order_failure'):
+            session.pubpen.subscribe(failure, failures.record)
+
+        session.pubpen.publish(event, *args)
+        _run(loop)
+        assert len(failures.events) == 1
+        assert session.user.cash == 500
+        assert list(session.user.fleets) == ['Haulers']
+        fleet = session.user.fleets['Haulers']
+        assert len(fleet) == 0
+        assert fleet.order is None
+
+    @pytest.mark.parametrize('event, args, failure', (
+        ('action.fleet.create', ('Clippers',), 'fleet.create_failure'),
+        ('action.fleet.buy_ships', ('Haulers', 'Passenger', 1), 'fleet.purchase_failure'),
+        ('action.fleet.order', ('Haulers', 'Grain', 'Earth', 'Mars'), 'fleet.order_failure'),
+    ))
+    def test_world_does_not_tick(self, loop, magnate, event, args, failure):
+        _, session = self._login(loop, magnate)
+        session.pubpen.publish('action.fleet.create', 'Haulers')
+        _run(loop)
+        magnate.price_ticker = None
+        failures = Recorder()
+        session.pubpen.subscribe(failure, failures.record)
+
+        session.pubpen.publish(event, *args)
+        _run(loop)
+        assert len(failures.events) == 1
+        assert session.user.cash == 500
+        assert list(session.user.fleets) == ['Haulers']
+        fleet = session.user.fleets['Haulers']
+        assert len(fleet) == 0
+        assert fleet.order is None
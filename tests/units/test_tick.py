@@ -0,0 +1,129 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from pubmarine import PubPen
+
+from magnate.market import Commodity, CommodityData, LocationData, Market, SystemData
+from magnate.rng import RandomSource
+from magnate.tick import PriceTicker, SystemPriceTable, price_system
+
+
+EVENTS = [{'type': 'sale', 'adjustment': 5, 'msg': 'cheap'},
+          {'type': 'shortage', 'adjustment': 7, 'msg': 'dear'}]
+
+
+@pytest.fixture
+def magnate():
+    loop = asyncio.new_event_loop()
+    magnate = SimpleNamespace(pubpen=PubPen(loop), random_source=RandomSource(42),
+                              price_history=None)
+
+    commodity_data = (CommodityData('Grain', frozenset(('food', 'cargo')), 25, 10, 0.3, 1, EVENTS),
+                      CommodityData('Ore', frozenset(('metal', 'cargo')), 200, 50, 0.1, 1, []))
+    markets = OrderedDict()
+    for system_name, location_names in (('Sol', ('Earth', 'Mars')), ('Centauri', ('Proxima',))):
+        system = SystemData(system_name, None)
+        for name in location_names:
+            location = LocationData(name, 'planet', system)
+            commodities = OrderedDict((c.name, Commodity(magnate.pubpen, c))
+                                      for c in commodity_data)
+            markets[name] = Market(magnate, location, commodities)
+    magnate.markets = markets
+
+    yield magnate
+    loop.close()
+
+
+class TestSystemPriceTable:
+    def test_from_markets(self, magnate):
+        table = SystemPriceTable.from_markets(m for m in magnate.markets.values()
+                                              if m.location.system.name == 'Sol')
+        assert table.keys == (('Earth', 'Grain'), ('Earth', 'Ore'),
+                              ('Mars', 'Grain'), ('Mars', 'Ore'))
+        assert list(table.mean_prices) == [25, 200, 25, 200]
+        assert list(table.sale_offsets) == [0, 1, 1, 2, 2]
+        assert list(table.sale_adjustments) == [5, 5]
+        assert list(table.shortage_adjustments) == [7, 7]
+
+    def test_price_system_reproducible(self, magnate):
+        table = SystemPriceTable.from_markets(magnate.markets.values())
+        stream_class = magnate.random_source.stream_class
+        assert price_system(table, stream_class, 1) == price_system(table, stream_class, 1)
+
+
+class TestPriceTicker:
+    def test_tick_updates_prices(self, magnate):
+        ticker = PriceTicker(magnate, magnate.markets)
+        assert list(ticker.tables) == ['Sol', 'Centauri']
+        assert ticker.executor is None
+
+        for market in magnate.markets.values():
+            for commodity in market.commodities.values():
+                commodity.price = -1
+
+        magnate.pubpen.loop.run_until_complete(ticker.tick())
+        for market in magnate.markets.values():
+            for commodity in market.commodities.values():
+                assert commodity.price >= 1
+
+    def test_parallel_matches_inline(self, magnate):
+        inline = PriceTicker(magnate, magnate.markets)
+        magnate.pubpen.loop.run_until_complete(inline.tick())
+        expected = {(loc, name): c.price for loc, m in magnate.markets.items()
+                    for name, c in m.commodities.items()}
+
+        parallel = PriceTicker(magnate, magnate.markets, workers=2)
+        try:
+            assert parallel.executor is not None
+            magnate.pubpen.loop.run_until_complete(parallel.tick())
+        finally:
+            parallel.stop()
+
+        prices = {(loc, name): c.price for loc, m in magnate.markets.items()
+                  for name, c in m.commodities.items()}
+        assert prices == expected
+
+    def test_ticks_do_not_overlap(self, magnate):
+        loop = magnate.pubpen.loop
+        ticker = PriceTicker(magnate, magnate.markets)
+        running = []
+        overlaps = []
+
+        async def slow_tick():
+            overlaps.append(len(running))
+            running.append(True)
+            # Each tick takes longer than the interval between ticks
+            await asyncio.sleep(0.03)
+            running.pop()
+        ticker.tick = slow_tick
+
+        ticker.start(0.01)
+        try:
+            loop.run_until_complete(asyncio.sleep(0.2))
+        finally:
+            ticker.stop()
+        assert len(overlaps) >= 2
+        assert overlaps == [0] * len(overlaps)
+
+    def test_failed_tick(self, magnate):
+        loop = magnate.pubpen.loop
+        ticker = PriceTicker(magnate, magnate.markets)
+        ticks = []
+
+        async def failing_tick():
+            ticks.append(True)
+            raise ValueError('Bad tick')
+        ticker.tick = failing_tick
+
+        ticker.start(0.01)
+        try:
+            loop.run_until_complete(asyncio.sleep(0.1))
+        finally:
+            ticker.stop()
+        # The ticks carry on after a failure
+        assert len(ticks) >= 2
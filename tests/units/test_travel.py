@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+import pytest
+
+from magnate.travel import Route, TravelGraph, orbit_distance
+
+
+SYSTEMS = OrderedDict((
+    ('Sol', OrderedDict((('Sun', 0), ('Earth', 3), ('Luna', 3), ('Mars', 4), ('Pluto', 9)))),
+    ('Alpha', OrderedDict((('Alpha Gate', 0), ('Alpha Prime', 2)))),
+    ('Beta', OrderedDict((('Beta Gate', 1), ('Beta Prime', 5)))),
+    ('Gamma', OrderedDict((('Gamma Prime', 1),))),
+))
+
+LINKS = (('Pluto', 'Alpha Gate', 10), ('Alpha Gate', 'Beta Gate', 10), ('Sun', 'Beta Gate', 30))
+
+
+@pytest.fixture
+def graph():
+    return TravelGraph(SYSTEMS, LINKS)
+
+
+@pytest.mark.parametrize('orbit, other, expected', (
+    (0, 4, 4),
+    (4, 0, 4),
+    (3, 3, 1),
+))
+def test_orbit_distance(orbit, other, expected):
+    assert orbit_distance(orbit, other) == expected
+
+
+def test_destinations(graph):
+    assert graph.destinations('Earth') == ('Sun', 'Luna', 'Mars', 'Pluto')
+    assert graph.destinations('Gamma Prime') == ()
+    # Moving back and forth reuses the same tuples
+    assert graph.destinations('Earth') is graph.destinations('Earth')
+
+
+@pytest.mark.parametrize('origin, destination, expected', (
+    ('Earth', 'Earth', Route(('Earth',), 0)),
+    ('Earth', 'Mars', Route(('Earth', 'Mars'), 1)),
+    ('Earth', 'Luna', Route(('Earth', 'Luna'), 1)),
+    ('Pluto', 'Sun', Route(('Pluto', 'Sun'), 9)),
+    # Leaves from a gateway
+    ('Pluto', 'Alpha Prime', Route(('Pluto', 'Alpha Gate', 'Alpha Prime'), 12)),
+    # Via Alpha is shorter than the direct lane from Sun
+    ('Earth', 'Beta Prime', Route(('Earth', 'Pluto', 'Alpha Gate', 'Beta Gate', 'Beta Prime'),
+                                  30)),
+    ('Sun', 'Beta Gate', Route(('Sun', 'Pluto', 'Alpha Gate', 'Beta Gate'), 29)),
+    ('Sun', 'Beta Prime', Route(('Sun', 'Pluto', 'Alpha Gate', 'Beta Gate', 'Beta Prime'), 33)),
+    ('Beta Prime', 'Mars', Route(('Beta Prime', 'Beta Gate', 'Alpha Gate', 'Pluto', 'Mars'), 29)),
+))
+def test_route(graph, origin, destination, expected):
+    assert graph.route(origin, destination) == expected
+    assert graph.distance(origin, destination) == expected.distance
+
+
+def test_unreachable(graph):
+    assert graph.route('Earth', 'Gamma Prime') is None
+    assert graph.distance('Gamma Prime', 'Earth') is None
@@ -0,0 +1,101 @@
+# The idiom for unittests is to use classes for organization
+# pylint: disable=no-self-use
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from magnate import wire
+from magnate.market import Commodity, CommodityData, CommodityType
+from magnate.order import Order, OrderStatusType
+from magnate.price_history import PriceBucket
+from magnate.ship import ManifestEntry
+
+
+VALUES = (
+    None, True, False, 0, -1, 2 ** 63 - 1, -2 ** 63, 2 ** 100, 1.5, '', 'Earth', 'Ünïcode',
+    b'\x00\x01', [1, [2, 3]], (1, 'a'), frozenset(('a', 'b')), OrderedDict((('a', 1), (2, None))),
+    CommodityType.food, OrderStatusType.finalized,
+    ManifestEntry('Grain', 10, 12.5),
+    Order('Earth', 'Grain', 10, hold_quantity=5, buy=False),
+    [PriceBucket(0, 10, 1, 5, 2.5, 3)],
+)
+
+
+class TestValues:
+    @pytest.mark.parametrize('value', VALUES)
+    def test_round_trip(self, value):
+        assert wire.decode_value(wire.encode_value(value)) == value
+
+    def test_commodity(self):
+        commodity = Commodity(None, CommodityData('Grain', frozenset(('food', 'cargo')), 25, 10,
+                                                  0.3, 1))
+        commodity.price = 30
+        decoded = wire.decode_value(wire.encode_value(commodity))
+        assert decoded.name == 'Grain'
+        assert decoded.price == 30
+        assert decoded.type == frozenset((CommodityType.food, CommodityType.cargo))
+        assert decoded.hold_space == 1
+
+    def test_unknown_type(self):
+        with pytest.raises(wire.WireError):
+            wire.encode_value(object())
+
+    @pytest.mark.parametrize('data', (b'', b'x', b'i\x00', b'N\x00', b's\x00\x00\x00\x05ab'))
+    def test_invalid_data(self, data):
+        with pytest.raises(wire.WireError):
+            wire.decode_value(data)
+
+
+class TestMessages:
+    def test_publish(self):
+        frame = wire.encode_message(wire.PUBLISH, 'query.routes.best', (3,), {'anywhere': True})
+        length, = wire.FRAME_HEADER.unpack_from(frame)
+        assert length == len(frame) - wire.FRAME_HEADER.size
+        assert wire.decode_message(frame[wire.FRAME_HEADER.size:]) == \
+            (wire.PUBLISH, 'query.routes.best', (3,), {'anywhere': True})
+
+    def test_subscribe(self):
+        frame = wire.encode_message(wire.SUBSCRIBE, 'ship.moved')
+        assert wire.decode_message(frame[wire.FRAME_HEADER.size:]) == \
+            (wire.SUBSCRIBE, 'ship.moved', (), {})
+
+    def test_invalid_kind(self):
+        with pytest.raises(wire.WireError):
+            wire.decode_message(b'\x09\x00\x00\x00\x00')
+
+    @pytest.mark.parametrize('args, kwargs', (
+        ((), [('anywhere', True)]),
+        (5, {}),
+        ([3], {}),
+        ((), {1: True}),
+    ))
+    def test_invalid_arguments(self, args, kwargs):
+        payload = bytearray((wire.PUBLISH,))
+        wire.encode_str('query.routes.best', payload)
+        payload += wire.encode_value(args) + wire.encode_value(kwargs)
+        with pytest.raises(wire.WireError):
+            wire.decode_message(payload)
+
+    def test_read_message(self):
+        loop = asyncio.new_event_loop()
+        try:
+            reader = asyncio.StreamReader(loop=loop)
+            reader.feed_data(wire.encode_message(wire.PUBLISH, 'ship.moved', ('Mars', 'Earth')))
+            reader.feed_data(wire.encode_message(wire.UNSUBSCRIBE, 'ship.moved'))
+            assert loop.run_until_complete(wire.read_message(reader)) == \
+                (wire.PUBLISH, 'ship.moved', ('Mars', 'Earth'), {})
+            assert loop.run_until_complete(wire.read_message(reader))[0] == wire.UNSUBSCRIBE
+        finally:
+            loop.close()
+
+    def test_frame_too_large(self):
+        loop = asyncio.new_event_loop()
+        try:
+            reader = asyncio.StreamReader(loop=loop)
+            reader.feed_data(wire.FRAME_HEADER.pack(wire.MAX_FRAME_SIZE + 1))
+            with pytest.raises(wire.WireError):
+                loop.run_until_complete(wire.read_message(reader))
+        finally:
+            loop.close()